@@ -0,0 +1,239 @@
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, Optional
+import numpy as np
+from channel_schema import SCHEMA
+from sample import Sample
+
+##############################
+# Alert Engine
+##############################
+# Rules are compiled into flat NumPy arrays so that one sample is checked
+# against every rule with a handful of vector operations, however many rules
+# there are. Each rule reduces to a "signal" per sample:
+#   ThresholdRule     -> the channel value
+#   RateOfChangeRule  -> change of the channel over the last `seconds`
+#   CrossChannelRule  -> a weighted sum of channels (e.g. HIGH - LOW cell volt)
+# and the signal is compared against min/max limits. An alert is raised when
+# the signal has been outside the limits for `duration` seconds, and cleared
+# once it is back inside by at least `hysteresis`, so values hovering around a
+# limit do not flap.
+
+# Critical limits shown as warnings in the live panel, declared in channels.json.
+CRITICAL_THRESHOLDS = SCHEMA.thresholds
+
+
+@dataclass
+class ThresholdRule:
+    """Alert when a channel leaves [min, max]."""
+    channel: str
+    min: Optional[float] = None
+    max: Optional[float] = None
+    hysteresis: float = 0.0
+    duration: float = 0.0
+    severity: str = "warning"
+    name: str = ""
+
+
+@dataclass
+class RateOfChangeRule:
+    """Alert when a channel rises by more than `max_rise` (or falls by more than `max_fall`) within `seconds`."""
+    channel: str
+    seconds: float
+    max_rise: Optional[float] = None
+    max_fall: Optional[float] = None
+    hysteresis: float = 0.0
+    duration: float = 0.0
+    severity: str = "warning"
+    name: str = ""
+
+
+@dataclass
+class CrossChannelRule:
+    """Alert when a weighted sum of channels, e.g. {"a": 1, "b": -1} for a - b, leaves [min, max]."""
+    name: str
+    weights: Dict[str, float]
+    min: Optional[float] = None
+    max: Optional[float] = None
+    hysteresis: float = 0.0
+    duration: float = 0.0
+    severity: str = "warning"
+
+
+@dataclass
+class AlertEvent:
+    """An alert being raised or cleared."""
+    timestamp: float
+    rule: str
+    channel: str
+    value: float
+    state: str  # "raised" or "cleared"
+    severity: str
+    message: str
+
+    def __str__(self):
+        return self.message
+
+
+def default_rules():
+    """Critical limits with a little hysteresis, plus trend and cross-channel checks."""
+    rules = []
+    for channel, limits in CRITICAL_THRESHOLDS.items():
+        span = limits["max"] - limits["min"]
+        rules.append(ThresholdRule(channel, limits["min"], limits["max"],
+                                   hysteresis=0.02 * span, duration=2.0, severity="critical"))
+    rules.append(RateOfChangeRule("battery_cell_HIGH_temp", seconds=10.0, max_rise=1.0,
+                                  hysteresis=0.2, name="Cell temperature rising fast"))
+    rules.append(RateOfChangeRule("motor_temp", seconds=10.0, max_rise=3.0,
+                                  hysteresis=0.5, name="Motor temperature rising fast"))
+    rules.append(CrossChannelRule("Cell voltage imbalance",
+                                  {"battery_cell_HIGH_volt": 1.0, "battery_cell_LOW_volt": -1.0},
+                                  max=0.3, hysteresis=0.05, duration=5.0))
+    return rules
+
+
+class AlertEngine:
+    """Evaluates all rules on every sample, vectorized over rules and channels."""
+
+    def __init__(self, keys, rules=None):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.aligned = self.keys == SCHEMA.keys  # a Sample's row then is the sample vector
+        self.listeners = []
+        self.eval_count = 0
+        self.eval_seconds = 0.0
+        self.set_rules(default_rules() if rules is None else rules)
+
+    def add_listener(self, callback):
+        """Call `callback(event)` for every raised or cleared alert."""
+        self.listeners.append(callback)
+
+    def set_rules(self, rules):
+        """Compile the rules into arrays. Resets all alert state."""
+        self.rules = list(rules)
+        n = len(self.rules)
+        self.names = []
+        self.channel_names = []
+        self.rule_channel = np.full(n, -1, dtype=np.intp)  # -1 for cross-channel rules
+        self.low = np.full(n, -np.inf)
+        self.high = np.full(n, np.inf)
+        self.hysteresis = np.zeros(n)
+        self.duration = np.zeros(n)
+
+        threshold_rules, cross_rules, rate_groups = [], [], {}
+        for i, rule in enumerate(self.rules):
+            if isinstance(rule, CrossChannelRule):
+                cross_rules.append(i)
+                channel = ""
+                low, high = rule.min, rule.max
+                name = rule.name
+            elif isinstance(rule, RateOfChangeRule):
+                rate_groups.setdefault(float(rule.seconds), []).append(i)
+                channel = rule.channel
+                low = None if rule.max_fall is None else -rule.max_fall
+                high = rule.max_rise
+                name = rule.name or f"{rule.channel} rate of change"
+            else:
+                threshold_rules.append(i)
+                channel = rule.channel
+                low, high = rule.min, rule.max
+                name = rule.name or f"{rule.channel} out of range"
+            if channel:
+                self.rule_channel[i] = self.index[channel]
+            if low is not None:
+                self.low[i] = low
+            if high is not None:
+                self.high[i] = high
+            self.hysteresis[i] = rule.hysteresis
+            self.duration[i] = rule.duration
+            self.names.append(name)
+            self.channel_names.append(channel)
+
+        self.threshold_idx = np.array(threshold_rules, dtype=np.intp)
+        self.threshold_channels = self.rule_channel[self.threshold_idx]
+
+        self.cross_idx = np.array(cross_rules, dtype=np.intp)
+        self.cross_weights = np.zeros((len(cross_rules), len(self.keys)))
+        for row, i in enumerate(cross_rules):
+            for key, weight in self.rules[i].weights.items():
+                self.cross_weights[row, self.index[key]] = weight
+
+        # One history of sample vectors per distinct rate window; the oldest
+        # entry kept is the most recent sample at least `seconds` old.
+        self.rate_groups = []
+        for seconds, idx in rate_groups.items():
+            idx = np.array(idx, dtype=np.intp)
+            self.rate_groups.append((seconds, idx, self.rule_channel[idx], deque()))
+
+        self.signal = np.zeros(n)
+        self.active = np.zeros(n, dtype=bool)
+        self.since = np.full(n, np.nan)
+        self.channel_active = np.zeros(len(self.keys), dtype=bool)
+
+    def update(self, values, timestamp=None):
+        """Evaluate every rule for one sample (a dict of channel values) and return the new AlertEvents."""
+        if timestamp is None:
+            timestamp = time.time()
+        start = time.perf_counter()
+        if self.aligned and isinstance(values, Sample):
+            sample = np.array(values.row, dtype=float)
+        else:
+            sample = np.fromiter((values[key] for key in self.keys), dtype=float, count=len(self.keys))
+
+        signal = self.signal
+        if self.threshold_idx.size:
+            signal[self.threshold_idx] = sample[self.threshold_channels]
+        if self.cross_idx.size:
+            signal[self.cross_idx] = self.cross_weights @ sample
+        for seconds, idx, channels, history in self.rate_groups:
+            history.append((timestamp, sample))
+            while len(history) > 1 and timestamp - history[1][0] >= seconds:
+                history.popleft()
+            signal[idx] = sample[channels] - history[0][1][channels]
+
+        with np.errstate(invalid="ignore"):
+            entering = (signal < self.low) | (signal > self.high)
+            inside = (signal >= self.low + self.hysteresis) & (signal <= self.high - self.hysteresis)
+        # Once active, stay active until the signal is back inside by the hysteresis margin
+        violating = np.where(self.active, ~inside, entering)
+        self.since = np.where(violating, np.where(np.isnan(self.since), timestamp, self.since), np.nan)
+        active = violating & (timestamp - self.since >= self.duration)
+
+        changed = np.flatnonzero(active != self.active)
+        self.active = active
+        if changed.size:
+            raised_channels = self.rule_channel[active & (self.rule_channel >= 0)]
+            self.channel_active = np.bincount(raised_channels, minlength=len(self.keys)) > 0
+        events = [self._make_event(i, timestamp) for i in changed]
+
+        self.eval_seconds += time.perf_counter() - start
+        self.eval_count += 1
+        for event in events:
+            for callback in self.listeners:
+                callback(event)
+        return events
+
+    def _make_event(self, i, timestamp):
+        rule = self.rules[i]
+        value = float(self.signal[i])
+        state = "raised" if self.active[i] else "cleared"
+        if state == "raised":
+            limit = self.high[i] if value > self.high[i] else self.low[i]
+            message = f"⚠️ {self.names[i]}: {value:.2f} (limit {limit:g})"
+        else:
+            message = f"✔ {self.names[i]} cleared: {value:.2f}"
+        return AlertEvent(timestamp, self.names[i], self.channel_names[i], value, state, rule.severity, message)
+
+    def is_active(self, channel):
+        """True if any single-channel rule on `channel` is currently raised."""
+        i = self.index.get(channel)
+        return i is not None and bool(self.channel_active[i])
+
+    def active_alerts(self):
+        return [self.names[i] for i in np.flatnonzero(self.active)]
+
+    @property
+    def mean_eval_us(self):
+        """Average evaluation time per sample in microseconds."""
+        return 1e6 * self.eval_seconds / self.eval_count if self.eval_count else 0.0
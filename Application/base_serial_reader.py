@@ -1,40 +1,114 @@
+import os
+import time
+from channel_schema import SCHEMA
+from derived_metrics import DerivedMetricsEngine, default_metrics
+from rolling_stats import RollingStatistics
+from alerts import AlertEngine
+from history_store import HistoryStore, MappedHistoryStore
+from link_analytics import LinkAnalytics
+from lap_tracker import LapTracker
+from sample import Sample
+from sensor_faults import FaultDetector
+from range_estimator import ConsumptionModel, RangeRefit
+
+# Number of samples shown in the graphs
+HISTORY_SAMPLES = 100
+# Folder for the memory-mapped full-session history; unset keeps only the in-memory tail
+HISTORY_DIR = os.environ.get("HUST_HISTORY_DIR")
+
 ##############################
 # Base Serial Reader
 ##############################
 class BaseSerialReader:
     def __init__(self):
-        # List of all variables sent by the LoRa packet.
+        # All channels, in schema order: the values sent in the LoRa packet,
+        # the receiver's RSSI, then the derived channels (power, energy,
+        # efficiency) which are stored, plotted and logged like every other one.
         # Note: distance_travelled will be used as a continuously updated number,
         # not a graph.
-        self.available_data = [
-            "velocity",
-            "distance_travelled",
-            "battery_volt",
-            "battery_current",
-            "battery_cell_LOW_volt",
-            "battery_cell_HIGH_volt",
-            "battery_cell_AVG_volt",
-            "battery_cell_LOW_temp",
-            "battery_cell_HIGH_temp",
-            "battery_cell_AVG_temp",
-            "battery_cell_ID_HIGH_temp",
-            "battery_cell_ID_LOW_temp",
-            "BMS_temp",
-            "motor_current",
-            "motor_temp",
-            "motor_controller_temp",
-            "MPPT1_watt",
-            "MPPT2_watt",
-            "MPPT3_watt",
-            "MPPT_total_watt",
-            "rssi"
-        ]
-        # Build a history for each variable (100 samples), initially all zeros.
-        self.history = { key: [0.0] * 100 for key in self.available_data }
-        self.latest_values = { key: 0.0 for key in self.available_data }
+        self.available_data = list(SCHEMA.keys)
+        # Consumption by speed band, cruise speed and solar input, behind the
+        # remaining time and range channels
+        self.range_model = ConsumptionModel()
+        self.derived_metrics = DerivedMetricsEngine(default_metrics(self.range_model))
+        # History of every channel, written only by the reader thread. Other
+        # threads read it through snapshots (store.snapshot()), never directly.
+        # With HISTORY_DIR set, the whole session is also kept on disk and
+        # snapshots can read any sample of it.
+        if HISTORY_DIR:
+            self.store = MappedHistoryStore(self.available_data, HISTORY_DIR)
+        else:
+            self.store = HistoryStore(self.available_data)
+        # Refits the range model's power curve from the history (started by the GUI)
+        self.range_refit = RangeRefit(self.store, self.range_model)
+        # Number of samples shown in the graphs.
+        self.history_samples = HISTORY_SAMPLES
+        # The newest sample (a Sample: reads like a dict of every channel).
+        # Replaced as a whole (never modified in place) so a reference taken by
+        # another thread always holds one complete sample.
+        self.latest_values = Sample.zeros()
+        # Rolling min/max/mean/variance per channel. The "History" window covers
+        # as many samples as the graphs show.
+        self.stats = RollingStatistics(self.available_data)
+        self.stats.add_window("History", samples=self.history_samples)
+        # Radio link statistics (loss, jitter, RSSI/SNR distributions)
+        self.link = LinkAnalytics()
+        # Lap and stint segmentation, with per-lap aggregates
+        self.lap_tracker = LapTracker()
+        # Alert rules (limits with hysteresis, trends, cross-channel checks),
+        # evaluated on every sample in the ingest thread.
+        self.alerts = AlertEngine(self.available_data)
+        # Implausible values (missing, padding, jumps, outliers, stuck sensors)
+        # are held at the last valid value and flagged in the sample's mask.
+        self.faults = FaultDetector(self.available_data)
         self.running = False
         self.selected_port = None
 
+    def store_sample(self, values, timestamp=None):
+        """
+        Store one received sample (arrived at `timestamp`, default now): check
+        it for sensor faults, update the link statistics, compute the derived
+        channels, update latest values, statistics, laps and history, then
+        check alerts. `values` is a dict of the channels received, or a
+        sequence aligned with SCHEMA.measured_keys; NaN marks a value that did
+        not arrive. Channels not received keep their previous value.
+        """
+        now = time.time() if timestamp is None else timestamp
+        latest = self.latest_values.copy()
+        latest.timestamp = now
+        latest.assign(values)
+        fault_events = self.faults.check(latest, now)
+        latest["packet_loss"], latest["link_jitter"] = self.link.on_packet(now, latest["rssi"], latest["snr"])
+        self.derived_metrics.update(latest, now)
+        self.stats.update(latest, now)
+        self.lap_tracker.update(latest, now)
+        self.store.append(latest.row, now, latest.invalid)
+        self.latest_values = latest  # publish
+        for event in fault_events + self.alerts.update(latest, now):
+            self.on_alert(event)
+
+    def load_history(self, rows, timestamps):
+        """
+        Restore previously logged samples (rows aligned with available_data,
+        NaN for blanks), e.g. from the CSV log. Must be called before the
+        reader is started.
+        """
+        self.stats.reset()
+        self.faults.reset()
+        sample = None
+        for row, timestamp in zip(rows, timestamps):
+            sample = Sample(list(row), timestamp)
+            self.faults.check(sample, timestamp)  # faults in old samples are flagged, not reported
+            self.store.append(sample.row, timestamp, sample.invalid)
+            self.stats.update(sample, timestamp, publish=False)
+        self.stats.publish()
+        if sample is not None:
+            self.latest_values = sample
+
+    def on_alert(self, event):
+        """Called from the ingest thread for every raised or cleared alert."""
+        print(f"[DEBUG] Alert {event.state}: {event.message}")
+
     def start(self):
         pass
 
@@ -0,0 +1,1355 @@
+"""
+Benchmarks for the data pipeline, run offline without hardware or a GUI.
+
+Usage (from the Application folder):
+    python benchmarks.py                 # run everything
+    python benchmarks.py alerts          # run one benchmark
+"""
+import argparse
+import random
+import time
+from base_serial_reader import BaseSerialReader
+
+
+def synthetic_samples(count, keys, seed=1):
+    """Random-walk samples for every channel, reproducible through `seed`."""
+    rng = random.Random(seed)
+    current = {key: rng.uniform(0.0, 100.0) for key in keys}
+    for _ in range(count):
+        for key in keys:
+            current[key] += rng.uniform(-1.0, 1.0)
+        yield dict(current)
+
+
+##############################
+# Alert engine
+##############################
+def bench_alerts(rule_count=500, sample_count=5000):
+    from alerts import AlertEngine, ThresholdRule, RateOfChangeRule, CrossChannelRule
+    keys = BaseSerialReader().available_data
+    rng = random.Random(2)
+    rules = []
+    for i in range(rule_count):
+        a, b = rng.sample(keys, 2)
+        kind = i % 3
+        if kind == 0:
+            rules.append(ThresholdRule(a, 20.0, 80.0, hysteresis=1.0, duration=2.0))
+        elif kind == 1:
+            rules.append(RateOfChangeRule(a, seconds=rng.choice([5.0, 10.0, 30.0]), max_rise=5.0, max_fall=5.0))
+        else:
+            rules.append(CrossChannelRule(f"{a} - {b}", {a: 1.0, b: -1.0}, min=-30.0, max=30.0, hysteresis=1.0))
+
+    engine = AlertEngine(keys, rules)
+    samples = list(synthetic_samples(sample_count, keys))
+    events = 0
+    start = time.perf_counter()
+    for i, sample in enumerate(samples):
+        events += len(engine.update(sample, i * 0.1))
+    elapsed = time.perf_counter() - start
+    print(f"alerts: {rule_count} rules x {sample_count} samples: "
+          f"{1e6 * elapsed / sample_count:.1f} us/sample "
+          f"(engine-measured {engine.mean_eval_us:.1f} us), {events} events")
+
+
+##############################
+# Snapshot handoff (stress test)
+##############################
+def bench_snapshots(seconds=3.0, readers=3, capacity=256, window=100):
+    """
+    A fast writer fills rows where every column holds the row's sequence
+    number; concurrent readers check that every row they get is whole and
+    that rows are consecutive up to the snapshot index. Expired snapshots
+    (writer lapped the reader) are allowed and counted; torn rows are not.
+    """
+    import threading
+    import numpy as np
+    from history_store import HistoryStore, SnapshotExpired
+
+    keys = BaseSerialReader().available_data
+    store = HistoryStore(keys, capacity)
+    stop = threading.Event()
+    results = []
+
+    def writer():
+        seq = 0
+        while not stop.is_set():
+            store.append([float(seq)] * len(keys), float(seq))
+            seq += 1
+
+    def reader():
+        reads = torn = expired = 0
+        while not stop.is_set():
+            snapshot = store.snapshot()
+            try:
+                rows = snapshot.window(window)
+            except SnapshotExpired:
+                expired += 1
+                continue
+            reads += 1
+            n = min(window, snapshot.count)
+            if n == 0:
+                continue
+            rows = rows[window - n:]
+            expected = np.arange(snapshot.count - n, snapshot.count, dtype=float)
+            if not (np.all(rows == rows[:, :1]) and np.array_equal(rows[:, 0], expected)):
+                torn += 1
+        results.append((reads, torn, expired))
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    time.sleep(seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+    reads = sum(r[0] for r in results)
+    torn = sum(r[1] for r in results)
+    expired = sum(r[2] for r in results)
+    print(f"snapshots: {store.count} rows written, {reads} window reads by {readers} readers, "
+          f"{expired} expired, {torn} torn")
+    if torn:
+        raise SystemExit("snapshots: torn rows observed")
+
+
+##############################
+# Data-rate controller (link simulation)
+##############################
+def bench_ratecontrol(duration=3600.0, seeds=(1, 2, 3)):
+    """
+    Simulated laps with every fixed SF/BW setting and with the controller.
+    The controller must keep loss within twice its target and deliver more
+    packets than any fixed setting losing no more than it does.
+    """
+    from lora_link import LinkSimulator, SETTINGS
+    from rate_controller import RateController
+
+    def average(results):
+        return {key: sum(r[key] for r in results) / len(results) for key in ("throughput", "loss_pct", "changes")}
+
+    fixed = {}
+    for setting in SETTINGS:
+        fixed[setting] = average([LinkSimulator(seed=seed).run(duration, setting=setting) for seed in seeds])
+    controllers = [RateController() for _ in seeds]
+    controlled = average([LinkSimulator(seed=seed).run(duration, controller=controller)
+                          for seed, controller in zip(seeds, controllers)])
+
+    loss_limit = 2.0 * controllers[0].loss_target
+    reliable = {setting: r for setting, r in fixed.items() if r["loss_pct"] <= controlled["loss_pct"]}
+    best_setting = max(reliable, key=lambda setting: reliable[setting]["throughput"])
+    best_any = max(fixed, key=lambda setting: fixed[setting]["throughput"])
+    best = reliable[best_setting]
+    print(f"ratecontrol: controller {controlled['throughput']:.3f} packets/s at {controlled['loss_pct']:.1f} % loss "
+          f"({controlled['changes']:.0f} changes/run); best fixed with no more loss: "
+          f"SF{best_setting[0]}/{best_setting[1] // 1000} kHz {best['throughput']:.3f} packets/s "
+          f"({best['loss_pct']:.1f} %); best fixed overall: SF{best_any[0]}/{best_any[1] // 1000} kHz "
+          f"{fixed[best_any]['throughput']:.3f} packets/s ({fixed[best_any]['loss_pct']:.1f} %)")
+    if controlled["throughput"] <= best["throughput"] or controlled["loss_pct"] > loss_limit:
+        raise SystemExit("ratecontrol: controller no better than a fixed setting")
+
+
+##############################
+# SD-card import (scaling)
+##############################
+def bench_sdimport(files=8, lines=50000):
+    """Import synthetic SD-card logs with one worker and with every core; reports files/s, rows/s and speedup."""
+    import os
+    import tempfile
+    from channel_schema import SCHEMA
+    from sd_import import import_directory
+
+    with tempfile.TemporaryDirectory() as directory:
+        rng = random.Random(3)
+        for n in range(1, files + 1):
+            with open(os.path.join(directory, f"log_{n}.txt"), "w") as f:
+                for _ in range(lines):
+                    f.write(" ".join(f"{rng.uniform(0.0, 100.0):.2f}" for _ in range(SCHEMA.payload_count)) + " \n")
+        timings = {}
+        for workers in sorted({1, os.cpu_count() or 1}):
+            start = time.perf_counter()
+            results = import_directory(directory, os.path.join(directory, f"out_{workers}"), workers, start=0.0)
+            timings[workers] = time.perf_counter() - start
+            rows = sum(result["rows"] for result in results)
+            print(f"sdimport: {workers} workers: {files / timings[workers]:.1f} files/s, "
+                  f"{rows / timings[workers]:.0f} rows/s")
+        if len(timings) > 1:
+            print(f"sdimport: speedup {timings[1] / timings[max(timings)]:.2f}x on {max(timings)} cores")
+
+
+##############################
+# Memory-mapped history (soak)
+##############################
+def resident_mb():
+    """Current resident set size in MB (Linux), else the peak so far."""
+    try:
+        import os
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1e6
+    except (OSError, ValueError, AttributeError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e3
+
+
+def bench_soak(hours=10.0, rate=2.0, segment_rows=4096):
+    """
+    A long session through the full ingest path with the mapped history,
+    reading the graph window and a random stretch of the past as it goes.
+    Resident memory must stay flat after warm-up, and every past read must
+    return the samples written.
+    """
+    import tempfile
+    import numpy as np
+    from history_store import MappedHistoryStore, OPEN_SEGMENTS
+
+    samples = int(hours * 3600 * rate)
+    rng = random.Random(4)
+    with tempfile.TemporaryDirectory() as directory:
+        reader = BaseSerialReader()
+        reader.on_alert = lambda event: None
+        reader.store = MappedHistoryStore(reader.available_data, directory, segment_rows=segment_rows)
+        checkpoints = []
+        start = time.perf_counter()
+        for i in range(samples):
+            reader.store_sample({"velocity": 50.0 + (i % 100) * 0.1, "distance_travelled": i / 3600.0}, i / rate)
+            if i % 1000 == 999:
+                snapshot = reader.store.snapshot()
+                snapshot.window(reader.history_samples)
+                first = rng.randrange(0, snapshot.count - 500)
+                timestamps, rows = snapshot.range(first, first + 500, ["distance_travelled"])
+                if not np.allclose(timestamps, np.arange(first, first + 500) / rate) \
+                        or not np.allclose(rows[:, 0], np.arange(first, first + 500) / 3600.0):
+                    raise SystemExit(f"soak: wrong samples read back from {first}")
+            if i % (samples // 10) == 0:
+                checkpoints.append(resident_mb())
+        elapsed = time.perf_counter() - start
+        reader.store.close()
+
+    growth = max(checkpoints[1:]) - checkpoints[1]
+    in_memory = samples * (len(reader.available_data) + 1) * 8 / 1e6
+    print(f"soak: {samples} samples ({hours:g} h at {rate:g} Hz) in {elapsed:.1f} s; "
+          f"RSS {' '.join(f'{mb:.0f}' for mb in checkpoints)} MB, growth after warm-up {growth:.1f} MB "
+          f"(the session itself is {in_memory:.0f} MB)")
+    allowed = (OPEN_SEGMENTS + 1) * segment_rows * (len(reader.available_data) + 1) * 8 / 1e6 + 8.0
+    if growth > allowed:
+        raise SystemExit(f"soak: resident memory grew by {growth:.1f} MB (allowed {allowed:.1f} MB)")
+
+
+##############################
+# Cold start
+##############################
+STARTUP_SCRIPT = """
+import os, sys, time
+began = time.perf_counter()
+if not os.environ.get("DISPLAY"):
+    os.environ["QT_QPA_PLATFORM"] = "offscreen"
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+from mock_serial_reader import MockSerialReader
+from plot_app import PlotApp
+imported = time.perf_counter()
+window = PlotApp(MockSerialReader())
+window.show()
+app.processEvents()
+shown = time.perf_counter()
+while not window.startup_done:
+    app.processEvents()
+    time.sleep(0.001)
+ready = time.perf_counter()
+print(imported - began, shown - began, ready - began)
+"""
+
+
+def bench_startup(top=8):
+    """
+    Start the dashboard (mock reader) in fresh interpreters: the time until the
+    window is shown and until graphs and history are loaded, and the slowest
+    imports on the way. The window must show within a second.
+    """
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=here)
+    with tempfile.TemporaryDirectory() as directory:  # no log to recover, and no files left behind
+        result = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=directory, env=env,
+                                capture_output=True, text=True)
+        if result.returncode:
+            raise SystemExit(f"startup: failed\n{result.stderr}")
+        imported, shown, ready = (float(value) for value in result.stdout.split()[-3:])
+        profile = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=directory,
+                                 env=env, capture_output=True, text=True).stderr
+
+    # Import time (self, in ms) per top-level package
+    packages = {}
+    for line in profile.splitlines():
+        parts = line.split("|")
+        if line.startswith("import time:") and len(parts) == 3 and parts[1].strip().isdigit():
+            package = parts[2].strip().split(".")[0]
+            packages[package] = packages.get(package, 0.0) + int(parts[0].split(":")[1]) / 1000.0
+    imports = sorted(((ms, name) for name, ms in packages.items()), reverse=True)
+    print(f"startup: imports {imported * 1000:.0f} ms, window shown {shown * 1000:.0f} ms, "
+          f"graphs and history ready {ready * 1000:.0f} ms")
+    print("startup: slowest imports before the window shows: "
+          + ", ".join(f"{name} {ms:.0f} ms" for ms, name in imports[:top]))
+    if shown >= 1.0:
+        raise SystemExit(f"startup: window took {shown:.2f} s to show")
+
+
+##############################
+# Serial hotplug
+##############################
+def bench_hotplug(cycles=3, packets=20, outage=0.5):
+    """
+    Unplug and replug a receiver emulated with pty devices (a symlink that
+    appears and disappears, like a USB serial device node). The reader must
+    notice, reconnect by itself and keep one history across the outages.
+    """
+    import os
+    import tempfile
+    if not hasattr(os, "openpty"):
+        print("hotplug: needs pty devices, skipped")
+        return
+    from PyQt5.QtCore import Qt
+    from channel_schema import SCHEMA
+    from port_monitor import PortMonitor, list_serial_ports
+    from serial_reader import SerialReader
+
+    packet = ("LoRa data: " + " ".join(["1.5"] * SCHEMA.payload_count) + "\nKalman RSSI: -80\n").encode()
+
+    def wait_for(condition, what, timeout=15.0):
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            if time.perf_counter() > deadline:
+                raise SystemExit(f"hotplug: timed out waiting for {what}")
+            time.sleep(0.01)
+
+    with tempfile.TemporaryDirectory() as directory:
+        port = os.path.join(directory, "ttyHUST0")
+
+        def plug():
+            master, slave = os.openpty()
+            os.symlink(os.ttyname(slave), port)
+            return master, slave
+
+        def unplug(fds):
+            os.remove(port)
+            for fd in fds:
+                os.close(fd)
+
+        reader = SerialReader()
+        states = []
+        reader.connectionChanged.connect(states.append, Qt.DirectConnection)
+        monitor = PortMonitor(interval=0.1, enumerate_ports=lambda: list_serial_ports(os.path.join(directory, "tty*")))
+        monitor.portsChanged.connect(reader.on_ports_changed, Qt.DirectConnection)
+        monitor.start()
+        fds = plug()
+        reader.set_port(port)
+        reader.start()
+        latencies = []
+        try:
+            for cycle in range(cycles):
+                for _ in range(packets):
+                    os.write(fds[0], packet)
+                wait_for(lambda: reader.store.count == (cycle + 1) * packets, "packets")
+                unplug(fds)
+                wait_for(lambda: states.count(False) == cycle + 1, "the disconnect")
+                time.sleep(outage)
+                fds = plug()
+                replugged = time.perf_counter()
+                wait_for(lambda: reader.reconnects == cycle + 1, "the reconnect")
+                latencies.append(time.perf_counter() - replugged)
+            for _ in range(packets):
+                os.write(fds[0], packet)
+            wait_for(lambda: reader.store.count == (cycles + 1) * packets, "packets after the last reconnect")
+        finally:
+            reader.stop()
+            monitor.stop()
+            unplug(fds)
+
+    print(f"hotplug: {cycles} unplug/replug cycles, {reader.store.count} packets kept in one history; "
+          f"reconnected {max(latencies) * 1000:.0f} ms (worst) after replug, "
+          f"downtime {reader.downtime:.1f} s")
+
+
+##############################
+# Database outbox
+##############################
+class FakeDatabase:
+    """
+    Stands in for the MySQL server behind network.upload_outbox: stores each
+    batch atomically, skips sample ids it already has, and can be made
+    unreachable or lose the acknowledgement of a stored batch.
+    """
+
+    def __init__(self, latency=0.02):
+        self.latency = latency  # s per round trip
+        self.reachable = True
+        self.drop_acks = 0      # the next this many stored batches report failure anyway
+        self.stored = {}        # sample id -> entry
+        self.duplicates = 0
+        self.batches = 0
+
+    def upload(self, entries):
+        time.sleep(self.latency)
+        if not self.reachable:
+            raise ConnectionError("server unreachable")
+        for entry in entries:
+            if entry.sample_id in self.stored:
+                self.duplicates += 1
+            else:
+                self.stored[entry.sample_id] = entry
+        self.batches += 1
+        if self.drop_acks:
+            self.drop_acks -= 1
+            raise ConnectionError("connection lost before the acknowledgement")
+
+
+def bench_outbox(samples=20000, batch_size=1000):
+    """
+    Queue samples while the fake server is unreachable, then bring it back,
+    restart the sync worker halfway through the drain and lose one
+    acknowledgement. Every sample must arrive exactly once.
+    """
+    import os
+    import tempfile
+    from outbox import Outbox, OutboxSync
+
+    keys = BaseSerialReader().available_data
+    server = FakeDatabase()
+    server.reachable = False
+
+    def wait_for(condition, what, timeout=60.0):
+        deadline = time.perf_counter() + timeout
+        while not condition():
+            if time.perf_counter() > deadline:
+                raise SystemExit(f"outbox: timed out waiting for {what}")
+            time.sleep(0.01)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "outbox.db")
+        outbox = Outbox(path)
+        sync = OutboxSync(outbox, server.upload, batch_size, idle_interval=0.05, retry_delay=0.05, retry_max_delay=0.2,
+                          prepare=None)
+        sync.start()
+        start = time.perf_counter()
+        ids = [outbox.append_sample(values, i / 2.0)
+               for i, values in enumerate(synthetic_samples(samples, keys))]
+        append_us = (time.perf_counter() - start) / samples * 1e6
+        wait_for(lambda: sync.backlog == samples, "the backlog count")
+        if server.stored:
+            raise SystemExit("outbox: entries reached an unreachable server")
+
+        # Server back: drain half, then restart the worker on a fresh connection to the same file
+        server.reachable = True
+        start = time.perf_counter()
+        wait_for(lambda: sync.drained >= samples // 2, "half the backlog")
+        sync.stop()
+        outbox.close()
+        outbox = Outbox(path)
+        resumed_backlog = outbox.backlog()
+        server.drop_acks = 1
+        sync = OutboxSync(outbox, server.upload, batch_size, idle_interval=0.05, retry_delay=0.05, retry_max_delay=0.2,
+                          prepare=None)
+        sync.start()
+        wait_for(lambda: outbox.backlog() == 0 and len(server.stored) == samples, "the drain")
+        elapsed = time.perf_counter() - start
+        sync.stop()
+        outbox.close()
+
+    if set(server.stored) != set(ids):
+        raise SystemExit("outbox: the server does not hold exactly the samples queued")
+    print(f"outbox: {samples} samples queued offline at {append_us:.0f} us each; drained in {elapsed:.2f} s "
+          f"({samples / elapsed:.0f} samples/s, {server.batches} batches) across a worker restart "
+          f"({resumed_backlog} left at restart); {server.duplicates} duplicate(s) from the lost acknowledgement skipped")
+
+
+##############################
+# Telemetry codec
+##############################
+def bench_codec(samples=200000, repeats=3):
+    """
+    Compress the session log shipped with the app and a long synthetic
+    session (random walks at the declared precision, with gaps). Every value
+    must come back exactly at its declared precision; reports the ratio
+    against the CSV log and zlib, how many channels never change, and
+    encode/decode speed in MB/s of raw float64 samples, for the codec and
+    for zlib on the CSV text.
+
+    The shipped log is a bench recording in which every channel reads 0.0,
+    so it measures the codec's fixed cost per channel and block, where zlib
+    does better; the synthetic session is the one with moving values.
+    """
+    import io
+    import os
+    import zlib
+    import numpy as np
+    from telemetry_codec import BLOCK_ROWS, Codec, read_csv_log, read_frames, write_frame
+
+    keys = BaseSerialReader().available_data
+    codec = Codec(keys)
+    rows = np.array([[values[key] for key in keys] for values in synthetic_samples(samples, keys, seed=5)])
+    rows = np.rint(rows * codec.scales) / codec.scales
+    rng = np.random.default_rng(5)
+    rows[rng.random(rows.shape) < 0.001] = np.nan  # dropped fields
+    sessions = [("synthetic", keys, 1.7e9 + np.arange(samples) * 0.5, rows)]
+    shipped = os.path.join(os.path.dirname(os.path.abspath(__file__)), "can_data_log.csv")
+    if os.path.exists(shipped):
+        sessions.insert(0, ("can_data_log.csv",) + read_csv_log(shipped))
+
+    for name, session_keys, timestamps, rows in sessions:
+        codec = Codec(session_keys)
+        text = "".join(",".join([str(t)] + ["" if np.isnan(v) else str(v) for v in row]) + "\n"
+                       for t, row in zip(timestamps.tolist(), rows.tolist())).encode()
+        raw = (rows.size + len(timestamps)) * 8
+        encode = decode = float("inf")
+        for _ in range(repeats):
+            out = io.BytesIO()
+            start = time.perf_counter()
+            for first in range(0, len(rows), BLOCK_ROWS):
+                write_frame(out, codec.encode_block(timestamps[first:first + BLOCK_ROWS], rows[first:first + BLOCK_ROWS]))
+            encode = min(encode, time.perf_counter() - start)
+            data = out.getvalue()
+            start = time.perf_counter()
+            decoded = [codec.decode_block(block) for block in read_frames(io.BytesIO(data))]
+            decode = min(decode, time.perf_counter() - start)
+        times = np.concatenate([block[0] for block in decoded])
+        values = np.concatenate([block[1] for block in decoded])
+        expected = np.rint(rows * codec.scales) / codec.scales
+        if not (np.array_equal(np.isnan(values), np.isnan(rows))
+                and np.array_equal(np.nan_to_num(values), np.nan_to_num(expected))
+                and np.array_equal(times, np.rint(timestamps * 1000) / 1000)):
+            raise SystemExit(f"codec: {name} did not round-trip at the declared precision")
+        start = time.perf_counter()
+        zipped = zlib.compress(text, 6)
+        zlib_encode = time.perf_counter() - start
+        start = time.perf_counter()
+        zlib.decompress(zipped)
+        zlib_decode = time.perf_counter() - start
+        with np.errstate(invalid="ignore"):
+            constant = int(np.sum(np.nanmax(rows, axis=0) == np.nanmin(rows, axis=0)))
+        print(f"codec: {name}: {len(rows)} samples, {constant} of {len(session_keys)} channels constant, "
+              f"CSV {len(text) / 1e6:.2f} MB -> {len(data) / 1e6:.3f} MB "
+              f"({len(text) / len(data):.1f}x; zlib {len(text) / len(zipped):.1f}x, raw float64 {raw / len(data):.1f}x); "
+              f"encode {raw / encode / 1e6:.0f} MB/s, decode {raw / decode / 1e6:.0f} MB/s "
+              f"(zlib {raw / zlib_encode / 1e6:.0f} and {raw / zlib_decode / 1e6:.0f} MB/s)")
+
+
+##############################
+# Per-sample cost
+##############################
+def bench_samples(samples=20000, kept=2000, rate=2.0):
+    """
+    Time and memory per sample through the ingest path, at `rate` Hz of
+    sample time (so the rolling windows hold what they would on the car).
+    After a warm-up that fills the 10-minute window, reports the time per
+    sample without tracing, the transient allocation peak while storing one
+    sample, and the memory each published sample keeps alive while something
+    holds on to it (tracemalloc).
+    """
+    import tracemalloc
+    from channel_schema import SCHEMA
+
+    reader = BaseSerialReader()
+    reader.on_alert = lambda event: None
+    # As the serial reader passes them: a dict of the measured channels
+    inputs = list(synthetic_samples(2000, SCHEMA.measured_keys, seed=6))
+    clock = iter(i / rate for i in range(10 ** 9))
+    for i in range(int(600 * rate) + 100):
+        reader.store_sample(inputs[i % len(inputs)], next(clock))
+    start = time.perf_counter()
+    for i in range(samples):
+        reader.store_sample(inputs[i % len(inputs)], next(clock))
+    per_sample = (time.perf_counter() - start) / samples * 1e6
+
+    tracemalloc.start()
+    peaks = 0
+    for i in range(kept):
+        before = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        reader.store_sample(inputs[i % len(inputs)], next(clock))
+        peaks += tracemalloc.get_traced_memory()[1] - before
+    # Memory kept per sample: with every published sample held (like queued GUI updates), minus without
+    growth = []
+    for hold in (False, True):
+        published = []
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(kept):
+            reader.store_sample(inputs[i % len(inputs)], next(clock))
+            if hold:
+                published.append(reader.latest_values)
+        growth.append(tracemalloc.get_traced_memory()[0] - before)
+    tracemalloc.stop()
+    print(f"samples: ingest {per_sample:.1f} us/sample; transient peak {peaks / kept / 1024:.1f} KB/sample; "
+          f"{(growth[1] - growth[0]) / kept:.0f} bytes kept per published sample")
+
+
+##############################
+# Live HTTP server
+##############################
+def bench_liveserver(pollers=200, streams=50, seconds=5.0, rate=10.0):
+    """
+    Many phones at once: `pollers` keep-alive clients polling /api/latest
+    (every fifth request /api/history) as fast as they are answered, and
+    `streams` Server-Sent Event clients, while samples arrive at `rate` Hz.
+    Reports request latency percentiles, throughput, the cache hit ratio and
+    the events each stream client received.
+    """
+    import asyncio
+    import threading
+    import numpy as np
+    from channel_schema import SCHEMA
+    from live_server import LiveServer
+
+    reader = BaseSerialReader()
+    reader.on_alert = lambda event: None
+    inputs = list(synthetic_samples(1000, SCHEMA.measured_keys, seed=7))
+    for i in range(2000):
+        reader.store_sample(inputs[i % len(inputs)], time.time() - 2000 / rate + i / rate)
+    server = LiveServer(reader, "127.0.0.1", 0)
+    if not server.start():
+        raise SystemExit("liveserver: could not start the server")
+
+    producing = threading.Event()
+    producing.set()
+
+    def produce():
+        i = 0
+        while producing.is_set():
+            reader.store_sample(inputs[i % len(inputs)])
+            i += 1
+            time.sleep(1.0 / rate)
+
+    async def request(reader_stream, writer, target):
+        writer.write(f"GET {target} HTTP/1.1\r\nHost: x\r\n\r\n".encode())
+        await writer.drain()
+        length = 0
+        while True:
+            line = await reader_stream.readline()
+            if line in (b"\r\n", b""):
+                break
+            if line.lower().startswith(b"content-length:"):
+                length = int(line.split(b":")[1])
+        await reader_stream.readexactly(length)
+
+    async def poller(number, deadline, latencies):
+        stream, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        n = 0
+        while time.perf_counter() < deadline:
+            target = "/api/history?keys=velocity,battery_volt&seconds=600" if n % 5 == 4 else "/api/latest"
+            start = time.perf_counter()
+            await request(stream, writer, target)
+            latencies.append(time.perf_counter() - start)
+            n += 1
+        writer.close()
+
+    async def listener(deadline, received):
+        stream, writer = await asyncio.open_connection("127.0.0.1", server.port)
+        writer.write(b"GET /api/stream HTTP/1.1\r\nHost: x\r\n\r\n")
+        await writer.drain()
+        events = 0
+        try:
+            while True:
+                line = await asyncio.wait_for(stream.readline(), max(deadline - time.perf_counter(), 0.01))
+                if line.startswith(b"id: "):
+                    events += 1
+        except asyncio.TimeoutError:
+            pass
+        received.append(events)
+        writer.close()
+
+    async def run():
+        deadline = time.perf_counter() + seconds
+        latencies, received = [], []
+        await asyncio.gather(*[listener(deadline, received) for _ in range(streams)],
+                             *[poller(i, deadline, latencies) for i in range(pollers)])
+        return latencies, received
+
+    producer = threading.Thread(target=produce, daemon=True)
+    first = reader.store.count
+    producer.start()
+    latencies, received = asyncio.run(run())
+    producing.clear()
+    producer.join()
+    produced = reader.store.count - first
+    server.stop()
+
+    latencies = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    hit_ratio = server.cache_hits / max(server.cache_hits + server.cache_misses, 1)
+    print(f"liveserver: {pollers} pollers + {streams} streams for {seconds:g} s: {len(latencies)} requests "
+          f"({len(latencies) / seconds:.0f}/s), latency p50 {p50:.1f} ms, p95 {p95:.1f} ms, p99 {p99:.1f} ms, "
+          f"max {latencies.max():.1f} ms; cache hits {hit_ratio:.0%}; "
+          f"stream events per client {min(received)}-{max(received)} of {produced} samples")
+
+
+##############################
+# Computed graphs
+##############################
+def bench_graphs(redraws=500, windows=(100, 2000)):
+    """
+    One redraw of four graphs that share sub-expressions (the built-in
+    power trade-off plus three user graphs over battery power): each graph
+    reading its own window and evaluating its expressions separately, against
+    the compiled graph set, which reads one window per sample index and
+    computes each distinct sub-expression once. Run for the live window and a
+    long one.
+    """
+    import numpy as np
+    from channel_schema import SCHEMA
+    from graph_spec import GraphSet, load_graph_spec
+
+    spec = load_graph_spec()
+    spec["graphs"] = [graph for graph in spec["graphs"] if graph["name"] == "Power trade-off"] + [
+        {"name": "Battery power", "unit": "W", "series": ["battery_volt * battery_current"]},
+        {"name": "Solar share", "unit": "%",
+         "series": ["100 * MPPT_total_watt / max(abs(battery_volt * battery_current), 1)"]},
+        {"name": "Surplus", "unit": "W",
+         "series": ["max(MPPT_total_watt - battery_volt * battery_current, 0)",
+                    "min(MPPT_total_watt - battery_volt * battery_current, 0)"]},
+    ]
+    graphs = GraphSet(spec)
+    reader = BaseSerialReader()
+    reader.on_alert = lambda event: None
+    for values in synthetic_samples(max(windows), SCHEMA.measured_keys, seed=7):
+        reader.store_sample(values)
+    snapshot = reader.store.snapshot()
+
+    # Separately: per graph, a window of its channels and every expression evaluated from scratch
+    namespace = {"max": np.maximum, "min": np.minimum, "abs": np.abs}
+    separate_graphs = []
+    for graph, entry in zip(graphs.graphs.values(), spec["graphs"]):
+        texts = [item if isinstance(item, str) else item["expr"] for item in entry["series"]]
+        texts += [item["expr"] for item in entry.get("annotations", [])]
+        separate_graphs.append((graph.channels, [compile(text, "<graph>", "eval") for text in texts]))
+    expressions = sum(len(e) for _, e in separate_graphs)
+
+    for window in windows:
+        start = time.perf_counter()
+        for _ in range(redraws):
+            for keys, compiled in separate_graphs:
+                rows = snapshot.window(window, keys)
+                columns = dict(namespace, **{key: rows[:, i] for i, key in enumerate(keys)})
+                separate = [eval(code, {"__builtins__": {}}, columns) for code in compiled]
+        separate_ms = (time.perf_counter() - start) / redraws * 1e3
+
+        start = time.perf_counter()
+        for _ in range(redraws):
+            graphs._live = None  # a new sample index every redraw
+            evaluation = graphs.live(snapshot, window)
+            shared = [evaluation.series(graph) + [evaluation(a.node) for a in graph.annotations]
+                      for graph in graphs.graphs.values()]
+        shared_ms = (time.perf_counter() - start) / redraws * 1e3
+        assert np.allclose(separate[-1], shared[-1][-1])
+        print(f"graphs: {window} samples, {len(graphs.graphs)} graphs, {expressions} expressions -> "
+              f"{len(evaluation.values)} distinct nodes; redraw {separate_ms:.3f} ms evaluated separately "
+              f"vs {shared_ms:.3f} ms compiled and shared")
+
+
+##############################
+# Dashboard windows
+##############################
+DASHBOARDS_SCRIPT = """
+import gc, os, sys, time, tracemalloc, weakref
+os.environ["QT_QPA_PLATFORM"] = "offscreen"
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
+app = QApplication(sys.argv)
+from mock_serial_reader import MockSerialReader
+from plot_app import PlotApp
+reader = MockSerialReader()
+window = PlotApp(reader)
+window.show()
+while not window.startup_done:
+    app.processEvents()
+passes = int(sys.argv[1])
+
+def cpu_per_pass():
+    start = time.process_time()
+    for _ in range(passes):
+        reader.update()
+        window.update_all_graphs()
+        app.processEvents()
+    return (time.process_time() - start) / passes * 1000
+
+def open_dashboards():
+    dashboards = []
+    for _ in range(2):
+        window.open_dashboard()
+        dashboards.append(window.render_scheduler.windows[-1])
+        dashboards[-1].graph_panel.add_graph()
+    app.processEvents()
+    return dashboards
+
+def close(dashboards):
+    for dashboard in dashboards:
+        dashboard.close()
+    # Closed windows are deleted from the running event loop
+    QTimer.singleShot(50, app.quit)
+    app.exec_()
+    gc.collect()
+
+results = [cpu_per_pass()]
+dashboards = open_dashboards()
+results.append(cpu_per_pass())
+for dashboard in dashboards:
+    dashboard.showMinimized()
+app.processEvents()
+results.append(cpu_per_pass())
+close(dashboards)
+del dashboard, dashboards
+results.append(cpu_per_pass())
+
+# Memory held while open and after closing (a second pair of windows, after the first warmed caches up)
+tracemalloc.start()
+gc.collect()
+before = tracemalloc.get_traced_memory()[0]
+dashboards = open_dashboards()
+figures = [weakref.ref(figure) for dashboard in dashboards for figure in dashboard.graph_panel.figures]
+opened = tracemalloc.get_traced_memory()[0]
+close(dashboards)
+del dashboards
+gc.collect()
+closed = tracemalloc.get_traced_memory()[0]
+alive = sum(figure() is not None for figure in figures)
+print(*results, (opened - before) / 2 / 1024, (closed - before) / 1024, alive, len(figures))
+"""
+
+
+def bench_dashboards(passes=40):
+    """
+    The main window (two graphs) plus two extra dashboard windows (two graphs
+    each), fed by the mock reader: CPU per redraw pass with only the main
+    window, with all three showing, with the two dashboards minimized and
+    after closing them; the Python memory a dashboard window holds while open
+    and what is left after closing (tracemalloc), and whether its figures are freed.
+    """
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=here)
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run([sys.executable, "-c", DASHBOARDS_SCRIPT, str(passes)], cwd=directory, env=env,
+                                capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(f"dashboards: failed\n{result.stderr}")
+    main, three, minimized, closed, per_window, left, alive, figures = (
+        float(value) for value in result.stdout.split()[-8:])
+    print(f"dashboards: CPU per redraw {main:.1f} ms main window only, {three:.1f} ms with two dashboards, "
+          f"{minimized:.1f} ms with them minimized, {closed:.1f} ms after closing them")
+    print(f"dashboards: {per_window:.0f} KB per open dashboard window, {left:.0f} KB left after closing both; "
+          f"{alive:.0f} of {figures:.0f} figures still alive")
+
+
+##############################
+# Visibility-aware rendering
+##############################
+CULLING_SCRIPT = """
+import os, sys, time
+os.environ["QT_QPA_PLATFORM"] = "offscreen"
+from PyQt5.QtWidgets import QApplication
+app = QApplication(sys.argv)
+from mock_serial_reader import MockSerialReader
+from plot_app import PlotApp
+reader = MockSerialReader()
+main_window = PlotApp(reader)
+main_window.show()
+while not main_window.startup_done:
+    app.processEvents()
+# A dashboard window of four graphs (no side panel, so its height is free); the main window stays minimized
+main_window.showMinimized()
+main_window.open_dashboard()
+window = main_window.render_scheduler.windows[-1]
+panel = window.graph_panel
+for _ in range(3):
+    panel.add_graph()
+passes = int(sys.argv[1])
+is_shown = panel.is_shown
+
+def cpu_per_pass(cull=True):
+    if not cull:
+        panel.is_shown = lambda graph_id: True
+    for _ in range(5):
+        app.processEvents()
+    shown = sum(is_shown(graph_id) for graph_id in range(1, 5))
+    start = time.process_time()
+    for _ in range(passes):
+        reader.update()
+        if cull:
+            main_window.update_all_graphs()
+        else:
+            window.render(reader.store.snapshot())  # as before: every graph on every sample
+        app.processEvents()
+    panel.is_shown = is_shown
+    return (time.process_time() - start) / passes * 1000, shown
+
+results = []
+window.resize(1000, 1400)  # all four graphs fit
+results += cpu_per_pass()
+window.resize(1000, 690)   # two on screen, two scrolled out of view
+results += cpu_per_pass(cull=False)
+results += cpu_per_pass()
+window.showMinimized()
+results += cpu_per_pass(cull=False)
+results += cpu_per_pass()
+print(*results)
+"""
+
+
+def bench_culling(passes=30):
+    """
+    CPU per redraw of a dashboard window with four graphs (mock reader): all
+    on screen, with two scrolled out of view, and minimized; the last two with
+    and without culling (every graph drawn on every sample, as before).
+    """
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=here)
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run([sys.executable, "-c", CULLING_SCRIPT, str(passes)], cwd=directory, env=env,
+                                capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(f"culling: failed\n{result.stderr}")
+    values = [float(value) for value in result.stdout.split()[-10:]]
+    (all_ms, _, scrolled_before, _, scrolled_ms, scrolled_shown,
+     minimized_before, _, minimized_ms, _) = values
+    print(f"culling: 4 graphs on screen {all_ms:.1f} ms per redraw")
+    print(f"culling: {scrolled_shown:.0f} of 4 on screen, the rest scrolled out: "
+          f"{scrolled_before:.1f} ms drawing all, {scrolled_ms:.1f} ms culled")
+    print(f"culling: window minimized: {minimized_before:.1f} ms drawing all, {minimized_ms:.1f} ms culled")
+
+
+##############################
+# Export
+##############################
+def bench_export(samples=200000, rate=10.0):
+    """
+    Export of a long range (every channel, `samples` rows from the mapped
+    history) in each format: throughput, file size and the peak memory traced
+    while exporting, which is bounded by the chunk size rather than the range.
+    """
+    import os
+    import tempfile
+    import tracemalloc
+    import numpy as np
+    from channel_schema import SCHEMA
+    from exporter import CHUNK_ROWS, FORMATS, export_range
+    from history_store import MappedHistoryStore
+
+    keys = SCHEMA.measured_keys
+    with tempfile.TemporaryDirectory() as directory:
+        store = MappedHistoryStore(keys, directory)
+        inputs = [np.array([values[key] for key in keys]) for values in synthetic_samples(1000, keys, seed=8)]
+        for i in range(samples):
+            store.append(inputs[i % len(inputs)], 1.7e9 + i / rate)
+        snapshot = store.snapshot()
+        in_memory = samples * len(keys) * 8 / 1e6
+        for name, extension in FORMATS.items():
+            path = os.path.join(directory, "export" + extension)
+            start = time.perf_counter()
+            rows = export_range(snapshot, keys, 1.7e9, 1.7e9 + samples / rate, path)
+            elapsed = time.perf_counter() - start
+            size = os.path.getsize(path)
+            if rows != samples:
+                raise SystemExit(f"export: {name} wrote {rows} of {samples} rows")
+            # Tracing slows allocation down, so memory is measured on a second run
+            tracemalloc.start()
+            export_range(snapshot, keys, 1.7e9, 1.7e9 + samples / rate, path)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print(f"export: {name}: {rows} rows x {len(keys)} channels in {elapsed:.2f} s -> "
+                  f"{size / 1e6:.1f} MB at {size / 1e6 / elapsed:.1f} MB/s "
+                  f"({rows / elapsed / 1e3:.0f}k rows/s); peak {peak / 1e6:.1f} MB traced "
+                  f"(range {in_memory:.0f} MB, chunks of {CHUNK_ROWS} rows)")
+        store.close()
+
+
+##############################
+# Sensor faults
+##############################
+def bench_faults(samples=20000, rate=1.0, episodes=200):
+    """
+    Ingest of random-walk samples (steps a sensor could make) with faults
+    injected (one-sample spikes of 10% of the range on channels checked for
+    outliers, stuck sensors, zero-padded and cut-off payloads): the share of
+    fault episodes flagged on the right channel, the share of clean values
+    flagged, and the time per sample with and without the detector.
+    """
+    import math
+    from channel_schema import SCHEMA
+
+    rng = random.Random(9)
+    payload = SCHEMA.payload_keys
+    stuck_keys = [key for key in SCHEMA.measured_keys if "stuck" in (SCHEMA.by_key[key].faults or {})]
+    outlier_keys = [key for key in SCHEMA.measured_keys
+                    if SCHEMA.by_key[key].type == "float" and (SCHEMA.by_key[key].faults or {}).get("z") != 0]
+    # A random walk per channel with steps the sensor could plausibly make (synthetic_samples ignores units)
+    steps = {key: min(0.005 * SCHEMA.by_key[key].max_expected,
+                      0.25 * (SCHEMA.by_key[key].faults or {}).get("max_rate", math.inf) / rate)
+             for key in SCHEMA.measured_keys}
+    current = {key: rng.uniform(0.2, 0.8) * SCHEMA.by_key[key].max_expected for key in SCHEMA.measured_keys}
+    inputs = []
+    for _ in range(samples):
+        for key, step in steps.items():
+            current[key] += rng.uniform(-step, step)
+        inputs.append(dict(current))
+    injected = {}  # (sample, channel) -> kind
+    kinds = ["spike", "stuck", "zero pad", "missing"]
+    found = {kind: [0, 0] for kind in kinds}  # kind -> [episodes flagged, episodes]
+    plan = []
+    busy = {}  # channel -> (first, last) sample ranges of its episodes, kept apart so they do not mask each other
+    for n in range(episodes):
+        kind = kinds[n % len(kinds)]
+        while True:
+            start = rng.randrange(100, samples - 1000)
+            key = rng.choice(outlier_keys if kind == "spike" else stuck_keys)
+            cells = payload[-6:] if kind in ("zero pad", "missing") else [key]
+            length = int((SCHEMA.by_key[key].faults["stuck"] + 60) * rate) if kind == "stuck" else 1
+            if not any(first - 50 <= start + length and start <= last + 50
+                       for cell in cells for first, last in busy.get(cell, [])):
+                break
+        for cell in cells:
+            busy.setdefault(cell, []).append((start, start + length))
+        if kind == "spike":
+            inputs[start] = dict(inputs[start])
+            inputs[start][key] += rng.choice([-1, 1]) * 0.1 * SCHEMA.by_key[key].max_expected
+            cells = [(start, key)]
+        elif kind == "stuck":
+            for i in range(start + 1, start + length):
+                inputs[i] = dict(inputs[i], **{key: inputs[start][key]})
+            cells = [(i, key) for i in range(start, start + length)]
+        else:
+            cut = rng.randrange(2, 7)
+            inputs[start] = dict(inputs[start], **{key: 0.0 if kind == "zero pad" else math.nan
+                                                   for key in payload[-cut:]})
+            cells = [(start, key) for key in payload[-cut:]]
+        plan.append((kind, cells))
+        for cell in cells:
+            injected[cell] = kind
+
+    def run(detect):
+        reader = BaseSerialReader()
+        reader.on_alert = lambda event: None
+        if not detect:
+            reader.faults.check = lambda sample, timestamp: []
+        flagged = set()
+        start = time.perf_counter()
+        for i, values in enumerate(inputs):
+            reader.store_sample(values, i / rate)
+            if reader.latest_values.invalid:
+                flagged.update((i, key) for key in SCHEMA.measured_keys if not reader.latest_values.is_valid(key))
+        return (time.perf_counter() - start) / samples * 1e6, flagged, reader
+
+    without = min(run(False)[0] for _ in range(2))
+    with_detector, flagged, reader = min((run(True) for _ in range(2)), key=lambda result: result[0])
+    for kind, cells in plan:
+        found[kind][1] += 1
+        found[kind][0] += any(cell in flagged for cell in cells)
+    clean = samples * len(SCHEMA.measured_keys) - len(injected)
+    false = len([cell for cell in flagged if cell not in injected])
+    print(f"faults: {samples} samples x {len(SCHEMA.measured_keys)} channels; flagged "
+          + ", ".join(f"{kind} {hit}/{total}" for kind, (hit, total) in found.items())
+          + f" episodes; {false} of {clean} clean values flagged ({false / clean:.3%}); "
+          f"ingest {without:.1f} us/sample without the detector, {with_detector:.1f} us with it")
+
+
+##############################
+# Range estimation
+##############################
+def bench_range(pack_wh=5000.0, refit_every=30):
+    """
+    Replays of drives from a nearly full pack until it is empty, with a known
+    power curve, pit stops and solar input drifting with cloud:
+      steady  one race pace (70 km/h): predicted time and distance left
+              against what the replay actually reached
+      stints  paces changing between 50 and 90 km/h every 10-25 min:
+              predicted against the true time and distance left if the car
+              went on as the estimate assumes (its cruise speed for the
+              recent share of the time, standing the rest) under the sun
+              that actually followed (the future pace is the strategist's
+              choice, not something to predict)
+    next to the naive estimate (energy left over the session Wh/km), with the
+    error of the energy left; then the cost per sample of the range channels
+    and the time of a refit.
+    """
+    import math
+    import numpy as np
+    from channel_schema import SCHEMA
+    from derived_metrics import DerivedMetricsEngine, default_metrics
+    from history_store import HistoryStore
+    from range_estimator import ConsumptionModel, RangeRefit, OPEN_CIRCUIT, MAX_HOURS
+
+    cells, resistance = 38, 0.08  # series cells, pack resistance (ohm)
+    IDLE = 40.0                   # W used while standing
+
+    def load(speed):
+        return 250.0 + 6.0 * speed + 0.0022 * speed ** 3  # W
+
+    def drive(paces, seed):
+        rng = random.Random(seed)
+        energy = 0.95 * pack_wh
+        speed = target = distance = 0.0
+        cloud = 1.0
+        inputs, truth = [], []  # sample dicts; (distance, true energy left, solar) per sample
+        t = stint_end = 0
+        while energy > 0.0:
+            if t >= stint_end:
+                stopping = stint_end and rng.random() < 0.25
+                target = 0.0 if stopping else rng.choice(paces)
+                stint_end = t + (120 if stopping else rng.randint(600, 1500))
+            speed = max(0.0, speed + 0.05 * (target - speed) + (rng.uniform(-1.0, 1.0) if target else 0.0))
+            cloud = min(1.0, max(0.3, cloud + rng.uniform(-0.01, 0.01)))
+            solar = 700.0 * cloud * (0.6 + 0.4 * math.sin(t / 20000.0))
+            power = (load(speed) * rng.uniform(0.95, 1.05) if speed > 1.0 else IDLE) - solar
+            volt = cells * float(np.interp(energy / pack_wh, OPEN_CIRCUIT[1], OPEN_CIRCUIT[0]))
+            current = power / volt
+            volt -= current * resistance
+            distance += speed / 3600.0
+            energy -= power / 3600.0
+            inputs.append({"velocity": speed, "distance_travelled": distance, "battery_volt": volt,
+                           "battery_current": current, "battery_cell_AVG_volt": volt / cells,
+                           "MPPT_total_watt": solar})
+            truth.append((distance, max(energy, 0.0), solar))
+            t += 1
+        return inputs, truth
+
+    def replay(inputs, metrics, store=None, refit=None, model=None, held=None):
+        """Run the derived channels over a drive; with `model`, append its (cruise, share moving) to `held`."""
+        engine = DerivedMetricsEngine(metrics)
+        outputs = []
+        elapsed = 0.0
+        for i, values in enumerate(inputs):
+            values = dict(values)
+            start = time.perf_counter()
+            engine.update(values, float(i))
+            elapsed += time.perf_counter() - start
+            outputs.append(values)
+            if model is not None:
+                held.append((model.cruise, model.moving_share))
+            if store is not None:
+                store.append(SCHEMA.row(values), float(i))
+                if i % refit_every == 0:
+                    refit.refit()
+        return outputs, elapsed / len(inputs) * 1e6
+
+    def hold(cruise, share, energy, solar):
+        """
+        Hours `energy` lasts moving at `cruise` for `share` of the time and
+        standing the rest, under `solar` (W per second, the last held on).
+        """
+        used = share * load(cruise) + (1.0 - share) * IDLE
+        cumulative = np.cumsum(used - solar) / 3600.0
+        reached = np.flatnonzero(cumulative >= energy)
+        if len(reached):
+            return min(MAX_HOURS, (reached[0] + 1) / 3600.0)
+        drain = used - solar[-1]
+        if drain <= 0.0:
+            return MAX_HOURS
+        return min(MAX_HOURS, len(solar) / 3600.0 + (energy - cumulative[-1]) / drain)
+
+    for name, paces, seed in [("steady", [70.0], 11), ("stints", [50.0, 60.0, 70.0, 80.0, 90.0], 12)]:
+        inputs, truth = drive(paces, seed)
+        solar_series = np.array([solar for _, _, solar in truth])
+        model = ConsumptionModel()
+        store = HistoryStore(SCHEMA.keys)
+        refit = RangeRefit(store, model)
+        held = []
+        outputs, _ = replay(inputs, default_metrics(model), store, refit, model, held)
+        errors = {"range": [], "time": [], "naive range": [], "energy": []}
+        for i in range(len(inputs) // 10, len(inputs) * 9 // 10, 60):
+            values = outputs[i]
+            if not values["time_remaining"]:
+                continue
+            distance, energy, solar = truth[i]
+            if name == "steady":
+                hours_left = (len(inputs) - i) / 3600.0
+                range_left = truth[-1][0] - distance
+            else:
+                cruise, share = held[i]
+                hours_left = hold(cruise, share, energy, solar_series[i + 1:])
+                range_left = hours_left * cruise * share
+            naive = values["remaining_energy"] / values["energy_per_km"] if values["energy_per_km"] > 0 else 0.0
+            errors["range"].append(abs(values["range_remaining"] / range_left - 1.0))
+            errors["time"].append(abs(values["time_remaining"] / hours_left - 1.0))
+            errors["naive range"].append(abs(naive / range_left - 1.0))
+            errors["energy"].append(abs(values["remaining_energy"] / energy - 1.0))
+        print(f"range: {name}: {len(inputs) / 3600.0:.1f} h, {truth[-1][0]:.0f} km on {0.95 * pack_wh:.0f} Wh; "
+              f"fit P(v) = {model.fit[0]:.0f} + {model.fit[1]:.2f} v + {model.fit[2]:.5f} v^3 "
+              f"(true 250 + 6.00 v + 0.00220 v^3); median error from 10% to 90% of the drive: "
+              + ", ".join(f"{key} {np.median(values):.1%}" for key, values in errors.items()))
+
+    plain_us = min(replay(inputs, default_metrics()[:-4])[1] for _ in range(2))
+    full_us = min(replay(inputs, default_metrics())[1] for _ in range(2))
+    durations = []
+    for _ in range(20):
+        refit.refit()
+        durations.append(refit.duration * 1e3)
+    print(f"range: derived channels {plain_us:.1f} us/sample without the range channels, {full_us:.1f} us with them; "
+          f"refit of {refit.samples} samples {np.median(durations):.2f} ms")
+
+##############################
+# Batched sample signals
+##############################
+SIGNALS_SCRIPT = """
+import os, sys, threading, time
+os.environ["QT_QPA_PLATFORM"] = "offscreen"
+results = sys.stdout
+sys.stdout = open(os.devnull, "w")  # the reader prints every line it reads
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
+app = QApplication(sys.argv)
+from channel_schema import SCHEMA
+from plot_app import PlotApp
+from sample_batch import SampleBatcher
+from serial_reader import SerialReader
+
+class FakeSerial:
+    # The receiver: lines appended by the sender thread, read by the reader thread
+    def __init__(self):
+        self.lines = []
+        self.lock = threading.Lock()
+        self.is_open = True
+    @property
+    def in_waiting(self):
+        return len(self.lines)
+    def readline(self):
+        with self.lock:
+            return self.lines.pop(0)
+    def close(self):
+        pass
+
+reader = SerialReader()
+window = PlotApp(reader)
+window.show()
+while not window.startup_done:
+    app.processEvents()
+reader.on_alert = lambda event: None
+reader.ser = FakeSerial()
+handled = [0]
+depths, shown_after = [], []
+waiting = []  # arrival times of the samples handled but not drawn yet
+
+on_new_samples = window.on_new_samples
+def on_samples(batch):
+    # Batches sent but not handled yet, this one included
+    depths.append(reader.batcher.batches - handled[0])
+    handled[0] += 1
+    waiting.extend(sample.timestamp for sample in batch.samples)
+    on_new_samples(batch)
+reader.samplesReceived.disconnect()
+reader.samplesReceived.connect(on_samples)
+render = window.render
+def render_and_measure(snapshot):
+    render(snapshot)
+    now = time.time()
+    shown_after.extend(now - arrived for arrived in waiting)
+    waiting.clear()
+window.render = render_and_measure
+
+def send(rate, seconds):
+    payload = " ".join(["12.5"] * SCHEMA.payload_count)
+    start = time.perf_counter()
+    for i in range(int(rate * seconds)):
+        time.sleep(max(0.0, start + i / rate - time.perf_counter()))
+        with reader.ser.lock:
+            reader.ser.lines += [f"LoRa data: {payload}".encode() + b"\\n", b"RSSI: -70\\n", b"SNR: 9\\n",
+                                 b"Kalman RSSI: -70\\n"]
+
+out = []
+for rate in (1, 10, 100):
+    for batched in (False, True):
+        reader.batcher = SampleBatcher(reader.samplesReceived.emit) if batched else \\
+            SampleBatcher(reader.samplesReceived.emit, max_samples=1, interval=0.0)
+        handled[0] = 0
+        depths.clear(); shown_after.clear(); waiting.clear()
+        reader.running = True
+        reader.thread = threading.Thread(target=reader.read_serial_data, daemon=True)
+        reader.thread.start()
+        seconds = max(5.0, 12.0 / rate)
+        sender = threading.Thread(target=send, args=(rate, seconds), daemon=True)
+        sender.start()
+        began = time.process_time()
+        while sender.is_alive() or reader.ser.lines or handled[0] < reader.batcher.batches:
+            app.processEvents()
+            time.sleep(0.001)
+        QTimer.singleShot(100, app.quit)
+        app.exec_()  # the last redraw
+        cpu = time.process_time() - began
+        reader.running = False
+        reader.thread.join()
+        shown_after.sort()
+        out += [rate, int(batched), reader.batcher.samples, reader.batcher.batches, max(depths),
+                sum(depths) / len(depths), 1e3 * sum(shown_after) / len(shown_after),
+                1e3 * shown_after[int(0.99 * (len(shown_after) - 1))], cpu / seconds * 100]
+results.write(" ".join(str(value) for value in out) + "\\n")
+"""
+
+
+def bench_signals():
+    """
+    The real reader thread and main window, fed 1, 10 and 100 packets/s
+    through a fake serial port, with one queued signal per packet (batches of
+    one, as before) and with batches: events sent to the GUI, the event-loop
+    queue depth (batches sent and not handled yet, seen at each slot call),
+    the latency from a packet's arrival to the redraw that shows it, and the
+    CPU used (reader, GUI and sender together).
+    """
+    import os
+    import subprocess
+    import sys
+    import tempfile
+
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = dict(os.environ, PYTHONPATH=here)
+    with tempfile.TemporaryDirectory() as directory:
+        result = subprocess.run([sys.executable, "-c", SIGNALS_SCRIPT], cwd=directory, env=env,
+                                capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(f"signals: failed\n{result.stderr}")
+    values = [float(value) for value in result.stdout.split()]
+    for i in range(0, len(values), 9):
+        rate, batched, samples, events, max_depth, mean_depth, mean_ms, p99_ms, cpu = values[i:i + 9]
+        print(f"signals: {rate:3.0f} packets/s {'batched  ' if batched else 'per packet'}: {samples:.0f} samples in "
+              f"{events:.0f} events; queue depth max {max_depth:.0f}, mean {mean_depth:.1f}; arrival to redraw "
+              f"mean {mean_ms:.0f} ms, p99 {p99_ms:.0f} ms; CPU {cpu:.0f}%")
+
+
+BENCHMARKS = {
+    "alerts": bench_alerts,
+    "snapshots": bench_snapshots,
+    "ratecontrol": bench_ratecontrol,
+    "sdimport": bench_sdimport,
+    "soak": bench_soak,
+    "startup": bench_startup,
+    "hotplug": bench_hotplug,
+    "outbox": bench_outbox,
+    "codec": bench_codec,
+    "samples": bench_samples,
+    "liveserver": bench_liveserver,
+    "graphs": bench_graphs,
+    "dashboards": bench_dashboards,
+    "culling": bench_culling,
+    "export": bench_export,
+    "faults": bench_faults,
+    "range": bench_range,
+    "signals": bench_signals,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run data pipeline benchmarks.")
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run (default: all): {', '.join(BENCHMARKS)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    for name in args.names or BENCHMARKS:
+        BENCHMARKS[name]()
@@ -0,0 +1,119 @@
+import json
+import os
+import struct
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+##############################
+# Channel Schema
+##############################
+# Every channel the application knows about is declared once, in
+# channels.json: its position in the LoRa payload, type, scale, unit, expected
+# range, warning thresholds and database column. The schema is loaded and
+# compiled once at startup into index maps, aligned lists and prepared SQL so
+# the per-sample code only does list indexing. Adding a CAN channel means
+# adding a line to channels.json (in payload order) and to the firmware.
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "channels.json")
+
+# Where a channel's value comes from
+SOURCE_PAYLOAD = "payload"    # sent by the car, in payload order
+SOURCE_RECEIVER = "receiver"  # measured by the receiver (e.g. RSSI)
+SOURCE_LINK = "link"          # computed by LinkAnalytics from packet arrivals
+SOURCE_DERIVED = "derived"    # computed by DerivedMetricsEngine
+
+STRUCT_CODES = {"float": "f", "int": "i"}
+
+
+@dataclass
+class Channel:
+    """Declaration of one channel, as read from the schema file."""
+    key: str
+    display_name: str
+    unit: str
+    category: str
+    description: str = ""
+    source: str = SOURCE_PAYLOAD
+    type: str = "float"
+    scale: float = 1.0
+    max_expected: float = 100.0
+    thresholds: Optional[Dict[str, float]] = None
+    db: Optional[Dict[str, str]] = None
+    decimals: int = 2  # precision the firmware sends and logs it at; stored losslessly at this precision
+    faults: Optional[Dict[str, float]] = None  # plausibility limits for the fault detector (sensor_faults.py)
+
+
+class ChannelSchema:
+    """A loaded schema, compiled into the lookups used by the rest of the application."""
+
+    def __init__(self, channels: List[Channel]):
+        self.channels = list(channels)
+        self.keys = [channel.key for channel in self.channels]
+        if len(set(self.keys)) != len(self.keys):
+            raise ValueError("Duplicate channel keys in schema")
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.by_key = {channel.key: channel for channel in self.channels}
+
+        # Payload layout: the order the car sends values in
+        payload = [channel for channel in self.channels if channel.source == SOURCE_PAYLOAD]
+        self.payload_keys = [channel.key for channel in payload]
+        self.payload_count = len(payload)
+        self.payload_index = [self.index[key] for key in self.payload_keys]
+        self.payload_scales = [channel.scale for channel in payload]
+        self.payload_scaled = any(scale != 1.0 for scale in self.payload_scales)
+        self.payload_struct = struct.Struct("<" + "".join(STRUCT_CODES[channel.type] for channel in payload))
+
+        # Channels with a measured value (payload + receiver), as opposed to computed ones
+        self.measured_keys = [channel.key for channel in self.channels
+                              if channel.source in (SOURCE_PAYLOAD, SOURCE_RECEIVER)]
+        self.link_keys = [channel.key for channel in self.channels if channel.source == SOURCE_LINK]
+        self.derived_keys = [channel.key for channel in self.channels if channel.source == SOURCE_DERIVED]
+
+        # Aligned with self.keys
+        self.max_expected = [channel.max_expected for channel in self.channels]
+        self.decimals = [channel.decimals for channel in self.channels]
+        self.thresholds = {channel.key: dict(channel.thresholds) for channel in self.channels if channel.thresholds}
+        self.faults = {channel.key: dict(channel.faults) for channel in self.channels if channel.faults}
+
+        # One prepared INSERT per database table: (sql, channel indices in column order)
+        tables = {}
+        for i, channel in enumerate(self.channels):
+            if channel.db:
+                tables.setdefault(channel.db["table"], []).append((channel.db["column"], i))
+        # db_inserts_at takes the sample time (epoch seconds) as the first parameter, for imports.
+        self.db_inserts = []
+        self.db_inserts_at = []
+        for table, columns in tables.items():
+            names = ", ".join(column for column, _ in columns)
+            placeholders = ", ".join(["%s"] * len(columns))
+            indices = [i for _, i in columns]
+            sql = f"INSERT INTO `{table}` (timestamp, {names}) VALUES (NOW(), {placeholders})"
+            self.db_inserts.append((sql, indices))
+            sql = f"INSERT INTO `{table}` (timestamp, {names}) VALUES (FROM_UNIXTIME(%s), {placeholders})"
+            self.db_inserts_at.append((sql, indices))
+
+    def parse_payload(self, parts):
+        """Convert the payload strings (exactly payload_count of them) to scaled values, in payload order."""
+        values = [float(p) for p in parts]
+        if self.payload_scaled:
+            values = [value * scale for value, scale in zip(values, self.payload_scales)]
+        return values
+
+    def unpack_payload(self, data):
+        """Decode a binary payload laid out as payload_struct."""
+        return self.parse_payload(self.payload_struct.unpack(data))
+
+    def row(self, values):
+        """A dict of channel values as a list aligned with self.keys."""
+        return [values.get(key, 0.0) for key in self.keys]
+
+
+def load_schema(path=SCHEMA_PATH):
+    """Load and compile a schema file."""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return ChannelSchema([Channel(**entry) for entry in data["channels"]])
+
+
+# Compiled once at import; every component shares this instance.
+SCHEMA = load_schema(os.environ.get("HUST_CHANNEL_SCHEMA", SCHEMA_PATH))
@@ -0,0 +1,146 @@
+from PyQt5.QtWidgets import QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton
+from PyQt5.QtCore import QObject, QTimer, QEvent, Qt
+from history_store import SnapshotExpired
+from graph_panel import GraphPanel, MAX_GRAPHS, TIME_INTERVALS
+
+##############################
+# Render Scheduler
+##############################
+# The main window and any additional dashboard windows are all redrawn by one
+# scheduler. Redraw requests (a new sample, a changed setting) are coalesced
+# into one pass per event-loop iteration, and each pass reads one snapshot of
+# the shared history store for every window, so windows showing the same
+# graph type share its window read and expressions (GraphSet.live).
+#
+# A minimized window is skipped and marked stale; it is drawn once, from the
+# current state, when it is restored. A closed window is deleted with its
+# figures, so the cost of drawing follows what is on screen, not how many
+# windows were opened.
+
+
+class RenderScheduler(QObject):
+    """Redraws every registered window from one snapshot per pass, skipping minimized ones."""
+
+    def __init__(self, store, history_loader, parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.windows = []
+        self.stale = set()
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.render)
+        history_loader.windowReady.connect(self.update_scrolled_graphs)
+
+    def add(self, window):
+        """Register a window with render(snapshot) and update_scrolled_graphs() methods."""
+        self.windows.append(window)
+        window.installEventFilter(self)
+
+    def remove(self, window):
+        if window in self.windows:
+            self.windows.remove(window)
+            window.removeEventFilter(self)
+        self.stale.discard(window)
+
+    def request(self):
+        """Redraw at the next pass of the event loop (requests until then are merged)."""
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def render(self):
+        self.timer.stop()
+        snapshot = self.store.snapshot()
+        for window in list(self.windows):
+            # Graphs within a window are culled by the window itself (GraphPanel.render)
+            if window.isMinimized() or not window.isVisible():
+                self.stale.add(window)
+                continue
+            try:
+                window.render(snapshot)
+            except SnapshotExpired as e:
+                print(f"[DEBUG] Skipping redraw: {e}")
+                continue
+
+    def update_scrolled_graphs(self):
+        """Scrolled-back history has been loaded: redraw the graphs showing it."""
+        for window in self.windows:
+            if window.isMinimized():
+                self.stale.add(window)
+            else:
+                window.update_scrolled_graphs()
+
+    def eventFilter(self, window, event):
+        # Catch up once on what a window missed while it was minimized
+        if event.type() == QEvent.WindowStateChange and window in self.stale and not window.isMinimized():
+            self.stale.discard(window)
+            try:
+                window.render(self.store.snapshot())
+            except SnapshotExpired as e:
+                print(f"[DEBUG] Skipping redraw: {e}")
+            window.update_scrolled_graphs()
+        return False
+
+
+class DashboardWindow(QMainWindow):
+    """An additional window of graphs, with its own layout, over the main window's data."""
+
+    def __init__(self, serial_reader, graph_set, history_loader, render_scheduler, number,
+                 dark_mode=False, parent=None):
+        super().__init__(parent)
+        # Deleted when closed, taking its figures with it
+        self.setAttribute(Qt.WA_DeleteOnClose)
+        self.setWindowTitle(f"HUST - Dashboard {number}")
+        self.setGeometry(150, 150, 1000, 800)
+        self.render_scheduler = render_scheduler
+
+        central_widget = QWidget()
+        self.setCentralWidget(central_widget)
+        layout = QVBoxLayout(central_widget)
+
+        buttons_container = QWidget()
+        buttons_container.setObjectName("graph_buttons_container")
+        buttons_layout = QHBoxLayout(buttons_container)
+        buttons_layout.setSpacing(15)
+        buttons_layout.setContentsMargins(15, 8, 15, 8)
+        time_interval_label = QLabel("Time Interval:")
+        time_interval_label.setStyleSheet("font-weight: bold;")
+        self.time_unit_dropdown = QComboBox()
+        self.time_unit_dropdown.addItems(list(TIME_INTERVALS))
+        self.time_unit_dropdown.setMinimumWidth(80)
+        self.add_graph_button = QPushButton("+ Add Graph")
+        self.add_graph_button.setStyleSheet("color: white;")
+        self.remove_graph_button = QPushButton("- Remove Graph")
+        self.remove_graph_button.setStyleSheet("color: white;")
+        buttons_layout.addWidget(time_interval_label)
+        buttons_layout.addWidget(self.time_unit_dropdown)
+        buttons_layout.addSpacing(20)
+        buttons_layout.addWidget(self.remove_graph_button)
+        buttons_layout.addWidget(self.add_graph_button)
+        buttons_layout.addStretch()
+        layout.addWidget(buttons_container)
+
+        self.graph_panel = GraphPanel(serial_reader, graph_set, history_loader)
+        self.graph_panel.set_dark_mode(dark_mode)
+        self.graph_panel.graphsChanged.connect(self.update_graph_buttons)
+        self.time_unit_dropdown.currentTextChanged.connect(self.graph_panel.set_time_interval)
+        self.add_graph_button.clicked.connect(self.graph_panel.add_graph)
+        self.remove_graph_button.clicked.connect(self.graph_panel.remove_graph)
+        layout.addWidget(self.graph_panel, 1)
+        self.graph_panel.add_graph()
+
+        render_scheduler.add(self)
+
+    def render(self, snapshot):
+        self.graph_panel.render(snapshot)
+
+    def update_scrolled_graphs(self):
+        self.graph_panel.update_scrolled_graphs()
+
+    def update_graph_buttons(self, count):
+        self.add_graph_button.setDisabled(count >= MAX_GRAPHS)
+        self.remove_graph_button.setDisabled(count <= 1)
+
+    def closeEvent(self, event):
+        self.render_scheduler.remove(self)
+        super().closeEvent(event)
@@ -0,0 +1,303 @@
+import math
+import time
+import numpy as np
+from range_estimator import (
+    ConsumptionModel, hours_left, state_of_charge, PACK_WH, MAX_HOURS, MIN_CELL_VOLT, REST_CURRENT, REST_SECONDS
+)
+
+##############################
+# Derived Metrics
+##############################
+# Channels computed from the received channels, one sample at a time. Every
+# metric keeps only the state it needs (previous value, running total), so the
+# cost per sample stays constant no matter how long the session runs.
+# Every metric can also run over a whole batch of samples at once with NumPy
+# (update_batch), for imports and offline analysis; a batch continues from the
+# same state as sample-by-sample updates would.
+# Sign convention follows the car: battery current, and so battery power, is
+# positive while the pack is discharging (power out) and negative while it is
+# being charged (power in), by the panels or by regenerative braking.
+# The range channels (recent consumption, energy, time and range left) share
+# one range_estimator.ConsumptionModel.
+
+
+class DerivedMetric:
+    """A channel computed incrementally from other channels."""
+    key = ""
+    inputs = ()  # channels update() reads, for the per-sample fallback of update_batch (empty: all)
+
+    def update(self, values, dt):
+        """Return the new value given the current channel values and seconds since the last sample."""
+        raise NotImplementedError
+
+    def update_batch(self, columns, dt):
+        """
+        Return the values for a batch of samples, given `columns` (key -> array)
+        and `dt` (array of seconds since the previous sample). Metrics without
+        a vectorized version fall back to one update per sample.
+        """
+        keys = list(self.inputs or columns)
+        rows = zip(*(columns[key].tolist() for key in keys))
+        return np.array([self.update(dict(zip(keys, row)), step) for row, step in zip(rows, dt.tolist())])
+
+    def reset(self):
+        pass
+
+
+class BatteryPower(DerivedMetric):
+    """Instantaneous battery power (W)."""
+    key = "battery_power"
+
+    def update(self, values, dt):
+        return values["battery_volt"] * values["battery_current"]
+
+    def update_batch(self, columns, dt):
+        return columns["battery_volt"] * columns["battery_current"]
+
+
+class NetPower(DerivedMetric):
+    """Solar input minus battery power (W); positive when the panels cover the load."""
+    key = "net_power"
+
+    def update(self, values, dt):
+        return values["MPPT_total_watt"] - values["battery_power"]
+
+    def update_batch(self, columns, dt):
+        return columns["MPPT_total_watt"] - columns["battery_power"]
+
+
+class EnergyIntegrator(DerivedMetric):
+    """Cumulative energy (Wh) of a power channel, integrated with the trapezoidal rule."""
+
+    def __init__(self, key, source, sign=1.0):
+        self.key = key
+        self.source = source
+        self.sign = sign  # -1.0 integrates the negative part of the source
+        self.reset()
+
+    def reset(self):
+        self.total = 0.0
+        self.previous = None
+
+    def update(self, values, dt):
+        power = max(0.0, self.sign * values[self.source])
+        if self.previous is not None:
+            self.total += (self.previous + power) * 0.5 * dt / 3600.0
+        self.previous = power
+        return self.total
+
+    def update_batch(self, columns, dt):
+        power = np.maximum(0.0, self.sign * columns[self.source])
+        previous = np.empty_like(power)
+        previous[1:] = power[:-1]
+        previous[0] = power[0] if self.previous is None else self.previous
+        totals = self.total + np.cumsum((previous + power) * 0.5 * dt / 3600.0)
+        self.total = float(totals[-1])
+        self.previous = float(power[-1])
+        return totals
+
+
+class EnergyPerDistance(DerivedMetric):
+    """Net battery energy used per distance driven since the session started (Wh/km)."""
+    key = "energy_per_km"
+    min_distance = 0.01  # km, avoid dividing by (almost) zero at standstill
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.start_distance = None
+
+    def update(self, values, dt):
+        distance = values["distance_travelled"]
+        if self.start_distance is None or distance < self.start_distance:
+            self.start_distance = distance
+        driven = distance - self.start_distance
+        if driven < self.min_distance:
+            return 0.0
+        used = values["battery_energy_out"] - values["battery_energy_in"]
+        return used / driven
+
+    def update_batch(self, columns, dt):
+        distance = columns["distance_travelled"]
+        start = distance[0] if self.start_distance is None else min(self.start_distance, distance[0])
+        starts = np.minimum.accumulate(np.concatenate(([start], distance)))[1:]
+        self.start_distance = float(starts[-1])
+        driven = distance - starts
+        used = columns["battery_energy_out"] - columns["battery_energy_in"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(driven < self.min_distance, 0.0, used / driven)
+
+
+class RecentConsumption(DerivedMetric):
+    """Energy the car used per distance over the recent distance, solar included (Wh/km); feeds the model."""
+    key = "recent_consumption"
+    inputs = ("velocity", "distance_travelled", "battery_power", "MPPT_total_watt")
+
+    def __init__(self, model):
+        self.model = model
+
+    def reset(self):
+        self.model.reset()
+
+    def update(self, values, dt):
+        self.model.update(values["velocity"], values["distance_travelled"], values["battery_power"],
+                          values["MPPT_total_watt"], dt)
+        return self.model.recent_per_km()
+
+    def update_batch(self, columns, dt):
+        model = self.model
+        inputs = zip(*(columns[key].tolist() for key in self.inputs), dt.tolist())
+        recent, drain, pace = [], [], []
+        for velocity, distance, power, solar, step in inputs:
+            model.update(velocity, distance, power, solar, step)
+            recent.append(model.recent_per_km())
+            watts = model.drain()
+            drain.append(math.nan if watts is None else watts)
+            pace.append(model.pace())
+        model.batch_drain, model.batch_pace = np.array(drain), np.array(pace)
+        return np.array(recent)
+
+
+class RemainingEnergy(DerivedMetric):
+    """
+    Energy left in the pack (Wh): the state of charge read off the cell
+    voltage when the pack last rested (or the first reading), less the net
+    battery energy used since. 0 until a cell voltage has been received.
+    """
+    key = "remaining_energy"
+    inputs = ("battery_cell_AVG_volt", "battery_current", "battery_energy_out", "battery_energy_in")
+
+    def __init__(self, capacity=PACK_WH):
+        self.capacity = capacity
+        self.reset()
+
+    def reset(self):
+        self.anchor = None  # (energy left, net energy used) when the state of charge was last read
+        self.resting = 0.0  # s the pack has been resting
+
+    def update(self, values, dt):
+        return self.step(values["battery_cell_AVG_volt"], values["battery_current"],
+                         values["battery_energy_out"] - values["battery_energy_in"], dt)
+
+    def update_batch(self, columns, dt):
+        used = columns["battery_energy_out"] - columns["battery_energy_in"]
+        inputs = zip(columns["battery_cell_AVG_volt"].tolist(), columns["battery_current"].tolist(),
+                     used.tolist(), dt.tolist())
+        return np.array([self.step(*sample) for sample in inputs])
+
+    def step(self, cell_volt, current, used, dt):
+        """Energy left given the cell voltage, current, net energy used so far and seconds since the last sample."""
+        if cell_volt >= MIN_CELL_VOLT:
+            self.resting = self.resting + dt if abs(current) < REST_CURRENT else 0.0
+            if self.anchor is None or self.resting >= REST_SECONDS:
+                self.anchor = (state_of_charge(cell_volt) * self.capacity, used)
+                self.resting = -math.inf  # read once per rest
+        if self.anchor is None:
+            return 0.0
+        energy, at = self.anchor
+        return min(self.capacity, max(0.0, energy - (used - at)))
+
+
+class TimeRemaining(DerivedMetric):
+    """Hours the remaining energy lasts driving and stopping as recently, with the current solar input."""
+    key = "time_remaining"
+    inputs = ("remaining_energy",)
+
+    def __init__(self, model):
+        self.model = model
+
+    def update(self, values, dt):
+        return hours_left(values["remaining_energy"], self.model.drain())
+
+    def update_batch(self, columns, dt):
+        energy, drain = columns["remaining_energy"], self.model.batch_drain
+        with np.errstate(divide="ignore", invalid="ignore"):
+            hours = np.where(drain <= energy / MAX_HOURS, MAX_HOURS, energy / drain)
+        hours[np.isnan(drain) | (energy <= 0.0)] = 0.0
+        return hours
+
+
+class RangeRemaining(DerivedMetric):
+    """Distance (km) the car covers at its average speed, stops included, in the time remaining."""
+    key = "range_remaining"
+    inputs = ("time_remaining",)
+
+    def __init__(self, model):
+        self.model = model
+
+    def update(self, values, dt):
+        return values["time_remaining"] * self.model.pace()
+
+    def update_batch(self, columns, dt):
+        return columns["time_remaining"] * self.model.batch_pace
+
+
+def default_metrics(model=None):
+    """
+    The derived channels shown by the dashboard, in dependency order. The
+    range channels use `model` (a new ConsumptionModel by default).
+    """
+    model = ConsumptionModel() if model is None else model
+    return [
+        BatteryPower(),
+        NetPower(),
+        EnergyIntegrator("battery_energy_out", "battery_power"),
+        EnergyIntegrator("battery_energy_in", "battery_power", sign=-1.0),
+        EnergyIntegrator("solar_energy", "MPPT_total_watt"),
+        EnergyPerDistance(),
+        RecentConsumption(model),
+        RemainingEnergy(),
+        TimeRemaining(model),
+        RangeRemaining(model),
+    ]
+
+
+class DerivedMetricsEngine:
+    """Runs the registered metrics on each new sample and writes the results back as channels."""
+
+    def __init__(self, metrics=None):
+        self.metrics = list(default_metrics() if metrics is None else metrics)
+        self.last_time = None
+
+    @property
+    def keys(self):
+        return [metric.key for metric in self.metrics]
+
+    def register(self, metric):
+        """Add a metric; it may depend on any metric registered before it."""
+        self.metrics.append(metric)
+
+    def update(self, values, timestamp=None):
+        """Compute every metric for this sample, storing the results in `values`."""
+        if timestamp is None:
+            timestamp = time.monotonic()
+        dt = 0.0 if self.last_time is None else max(0.0, timestamp - self.last_time)
+        self.last_time = timestamp
+        for metric in self.metrics:
+            values[metric.key] = metric.update(values, dt)
+        return values
+
+    def update_batch(self, columns, timestamps):
+        """
+        Compute every metric for a batch of samples in time order, storing the
+        result arrays in `columns` (key -> array). Continues from the state left
+        by earlier updates, so consecutive batches give the same results as
+        sample-by-sample updates.
+        """
+        timestamps = np.asarray(timestamps, dtype=float)
+        if not len(timestamps):
+            return columns
+        dt = np.empty_like(timestamps)
+        dt[1:] = np.diff(timestamps)
+        dt[0] = 0.0 if self.last_time is None else timestamps[0] - self.last_time
+        np.maximum(dt, 0.0, out=dt)
+        self.last_time = float(timestamps[-1])
+        for metric in self.metrics:
+            columns[metric.key] = metric.update_batch(columns, dt)
+        return columns
+
+    def reset(self):
+        self.last_time = None
+        for metric in self.metrics:
+            metric.reset()
@@ -0,0 +1,184 @@
+import datetime
+import os
+import tempfile
+import threading
+import time
+import zipfile
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal
+from history_store import SnapshotExpired
+from telemetry_codec import Codec, LogWriter, declared_decimals
+
+##############################
+# Data Export
+##############################
+# Writes a time range of the history store, for a chosen set of channels, to
+# a file in a background thread: CSV (the layout of can_data_log.csv, with
+# millisecond timestamps), the compressed columnar log format of
+# telemetry_codec.py (.htl: blocks of bit-packed columns, readable with
+# telemetry_codec.read_log) or a NumPy .npz (arrays "timestamps", "values" and
+# "keys", for numpy.load). Values the fault detector flagged are exported as
+# missing, like the application's own log: empty CSV fields, NaN otherwise.
+#
+# The range is read from one snapshot CHUNK_ROWS rows at a time and each chunk
+# is written before the next is read, so memory stays bounded whatever the
+# size of the session (the .npz timestamps are spooled to a temporary file
+# while the values are written). Progress is reported after every chunk, and
+# a cancelled export stops at the next chunk and removes its partial file.
+
+CHUNK_ROWS = 8192  # about 1.5 MB of values with the default channels
+FORMATS = {"CSV": ".csv", "Columnar (.htl)": ".htl", "NumPy (.npz)": ".npz"}
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+class CsvExportWriter:
+    def __init__(self, path, keys, count):
+        self.file = open(path, "w", newline="")
+        self.file.write(",".join(["timestamp"] + list(keys)) + "\n")
+        # Each channel at the precision it is sent with
+        self.formats = [f"%.{declared_decimals(key)}f" for key in keys]
+        self.line = "%s," + ",".join(self.formats) + "\n"
+
+    def write(self, timestamps, rows):
+        if not len(timestamps):
+            return
+        # Local time, like the application's own log
+        offset = datetime.datetime.fromtimestamp(timestamps[0]).astimezone().utcoffset().total_seconds()
+        times = np.datetime_as_string(np.rint((timestamps + offset) * 1000.0).astype("datetime64[ms]"), unit="ms")
+        line = self.line
+        complete = np.isfinite(rows).all(axis=1).tolist()
+        self.file.write("".join([line % (time_text, *row) if ok else self.line_with_gaps(time_text, row)
+                                 for time_text, row, ok in zip(times.tolist(), rows.tolist(), complete)]))
+
+    def line_with_gaps(self, time_text, row):
+        """A row with missing values (NaN) left as empty fields."""
+        return ",".join([time_text] + ["" if not np.isfinite(value) else fmt % value
+                                       for fmt, value in zip(self.formats, row)]) + "\n"
+
+    def close(self):
+        self.file.close()
+
+
+class ColumnarExportWriter:
+    def __init__(self, path, keys, count):
+        self.writer = LogWriter(path, Codec(keys))
+
+    def write(self, timestamps, rows):
+        self.writer.write(timestamps, rows)
+
+    def close(self):
+        self.writer.close()
+
+
+class NpzExportWriter:
+    """Streams "values" into the archive, then "timestamps" from a temporary file, then "keys"."""
+
+    def __init__(self, path, keys, count):
+        self.keys = np.array(keys)
+        self.zip = zipfile.ZipFile(path, "w", zipfile.ZIP_STORED, allowZip64=True)
+        self.values = self.zip.open("values.npy", "w", force_zip64=True)
+        np.lib.format.write_array_header_2_0(
+            self.values, {"descr": "<f8", "fortran_order": False, "shape": (count, len(keys))})
+        self.timestamps = tempfile.TemporaryFile(dir=os.path.dirname(os.path.abspath(path)))
+        np.lib.format.write_array_header_2_0(
+            self.timestamps, {"descr": "<f8", "fortran_order": False, "shape": (count,)})
+
+    def write(self, timestamps, rows):
+        self.values.write(memoryview(np.ascontiguousarray(rows, dtype="<f8")).cast("B"))
+        self.timestamps.write(memoryview(np.ascontiguousarray(timestamps, dtype="<f8")).cast("B"))
+
+    def close(self):
+        self.values.close()
+        self.timestamps.seek(0)
+        with self.zip.open("timestamps.npy", "w", force_zip64=True) as entry:
+            while True:
+                data = self.timestamps.read(1 << 20)
+                if not data:
+                    break
+                entry.write(data)
+        self.timestamps.close()
+        with self.zip.open("keys.npy", "w") as entry:
+            np.lib.format.write_array(entry, self.keys)
+        self.zip.close()
+
+
+WRITERS = {".csv": CsvExportWriter, ".htl": ColumnarExportWriter, ".npz": NpzExportWriter}
+
+
+def export_range(snapshot, keys, start, end, path, progress=None, cancelled=None, chunk_rows=CHUNK_ROWS):
+    """
+    Write the samples between `start` and `end` (epoch seconds, inclusive) for
+    `keys` to `path`, in the format given by its extension. Calls
+    progress(rows done, rows in total) after each chunk; stops with
+    ExportCancelled when cancelled() returns True. Returns the rows written.
+    """
+    first = snapshot.search(start)
+    last = snapshot.search(np.nextafter(end, np.inf))
+    count = max(last - first, 0)
+    if os.path.exists(path):
+        os.remove(path)
+    writer = WRITERS[os.path.splitext(path)[1].lower()](path, keys, count)
+    try:
+        for chunk_first in range(first, last, chunk_rows):
+            if cancelled is not None and cancelled():
+                raise ExportCancelled()
+            timestamps, rows = snapshot.range(chunk_first, min(chunk_first + chunk_rows, last), keys, gaps=True)
+            if len(timestamps) != min(chunk_rows, last - chunk_first):
+                raise SnapshotExpired("part of the range is no longer held")
+            writer.write(timestamps, rows)
+            if progress is not None:
+                progress(chunk_first + len(timestamps) - first, count)
+        writer.close()
+    except BaseException:
+        writer.close()
+        os.remove(path)
+        raise
+    return count
+
+
+class Exporter(QObject):
+    """Runs one export at a time in a background thread, reporting through signals."""
+    progress = pyqtSignal(int, int)    # rows written, rows in total
+    finished = pyqtSignal(str)         # summary
+    failed = pyqtSignal(str)           # reason (also on cancel)
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self.thread = None
+        self.cancel_event = threading.Event()
+
+    @property
+    def running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def start(self, keys, start, end, path):
+        if self.running:
+            return False
+        self.cancel_event.clear()
+        self.thread = threading.Thread(target=self._run, args=(list(keys), start, end, path), daemon=True)
+        self.thread.start()
+        return True
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _run(self, keys, start, end, path):
+        began = time.perf_counter()
+        try:
+            rows = export_range(self.store.snapshot(), keys, start, end, path,
+                                progress=self.progress.emit, cancelled=self.cancel_event.is_set)
+        except ExportCancelled:
+            self.failed.emit("Export cancelled.")
+            return
+        except (OSError, SnapshotExpired) as e:
+            print(f"[DEBUG] Export failed: {e}")
+            self.failed.emit(f"Export failed: {e}")
+            return
+        elapsed = max(time.perf_counter() - began, 1e-9)
+        size = os.path.getsize(path)
+        self.finished.emit(f"Exported {rows} samples to {os.path.basename(path)} "
+                           f"({size / 1e6:.1f} MB, {size / 1e6 / elapsed:.1f} MB/s).")
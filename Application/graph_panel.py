@@ -0,0 +1,441 @@
+import datetime
+import numpy as np
+from PyQt5.QtWidgets import QVBoxLayout, QHBoxLayout, QWidget, QComboBox, QLabel, QCheckBox, QScrollArea, QFrame
+from PyQt5.QtCore import QEvent, QTimer, pyqtSignal
+from scrollback import GraphView, ZOOM_STEP, DEFAULT_SPAN, to_plot_time, from_plot_time
+
+##############################
+# Graph Panel
+##############################
+# A column of graphs, each with its graph type dropdown and "Follow live"
+# checkbox, drawn from the reader's shared history store. The main window and
+# every additional dashboard window (dashboard.py) hold one panel each; all of
+# them share the reader, the compiled graph set and the history loader, so a
+# panel only adds its own figures.
+#
+# The graphs scroll when they do not fit, and only graphs with some part on
+# screen are drawn: one scrolled out of view (or in a hidden window) is only
+# marked stale, and is drawn once, from the current state, when it comes back
+# into view.
+
+# matplotlib takes longer to import than everything else together; it is
+# imported in the background while the window is already showing (see
+# load_matplotlib), and these names are filled in then.
+FigureCanvas = Figure = mdates = mticker = None
+
+MAX_GRAPHS = 4
+GRAPH_MIN_HEIGHT = 280  # pixels per graph (with its dropdown) before the panel scrolls
+# Seconds per sample for the time axis, by the "Time Interval" choice
+TIME_INTERVALS = {"2 s": 2, "1 min": 60}
+
+
+def load_matplotlib():
+    """Import the matplotlib modules the graphs use (once; safe to call from any thread)."""
+    global FigureCanvas, Figure, mdates, mticker
+    if mticker is None:
+        from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
+        import matplotlib.figure
+        import matplotlib.dates
+        import matplotlib.ticker
+        FigureCanvas, Figure, mdates = FigureCanvasQTAgg, matplotlib.figure.Figure, matplotlib.dates
+        mticker = matplotlib.ticker
+
+
+class GraphPanel(QWidget):
+    """A column of up to MAX_GRAPHS graphs over the shared history store."""
+    graphsChanged = pyqtSignal(int)  # number of graphs, after one is added or removed
+
+    def __init__(self, serial_reader, graph_set, history_loader, parent=None):
+        super().__init__(parent)
+        self.serial_reader = serial_reader
+        self.graph_set = graph_set
+        self.history_loader = history_loader
+        self.dark_mode = False
+        self.sample_interval = TIME_INTERVALS["2 s"]
+        self.scroll_area = QScrollArea()
+        self.scroll_area.setWidgetResizable(True)
+        self.scroll_area.setFrameShape(QFrame.NoFrame)
+        self.graphs_widget = QWidget()
+        self.graphs_layout = QVBoxLayout(self.graphs_widget)
+        self.graphs_layout.setContentsMargins(0, 0, 0, 0)
+        self.scroll_area.setWidget(self.graphs_widget)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.scroll_area)
+        # Graphs coming into view are brought up to date
+        self.scroll_area.verticalScrollBar().valueChanged.connect(self.catch_up)
+        self.scroll_area.viewport().installEventFilter(self)
+        self.graphs_widget.installEventFilter(self)
+
+        # Graph containers for individual graphs with their dropdowns
+        self.graph_containers = []
+        self.graph_dropdowns = []
+        self.figures = []
+        self.axes = []
+        self.canvases = []
+        # Live or scrolled-back view of each graph; scrolled ranges are loaded in the background
+        self.graph_views = []
+        self.follow_checkboxes = []
+        # Graphs not drawn since their data changed, because they were out of view
+        self.stale = set()
+
+    def is_shown(self, graph_id):
+        """Whether any part of a graph is on screen (not scrolled out of view, hidden or minimized)."""
+        canvas = self.canvases[graph_id - 1]
+        return canvas.isVisible() and not canvas.window().isMinimized() and not canvas.visibleRegion().isEmpty()
+
+    def render(self, snapshot):
+        """Redraw the live graphs on screen from `snapshot` (scrolled-back graphs are redrawn when their data is loaded)."""
+        for i in range(1, len(self.graph_dropdowns) + 1):
+            if self.graph_views[i - 1].follow_live:
+                if self.is_shown(i):
+                    self.stale.discard(i)
+                    self.update_graph(i, snapshot)
+                else:
+                    self.stale.add(i)
+
+    def catch_up(self):
+        """Draw the stale graphs that are on screen again, once, from the current state."""
+        shown = [graph_id for graph_id in sorted(self.stale) if self.is_shown(graph_id)]
+        if shown:
+            snapshot = self.serial_reader.store.snapshot()
+            for graph_id in shown:
+                self.stale.discard(graph_id)
+                self.update_graph(graph_id, snapshot)
+
+    def eventFilter(self, widget, event):
+        # Resizing (the window, or graphs added or removed) can bring graphs into view;
+        # checked once the layout has placed them
+        if event.type() == QEvent.Resize:
+            QTimer.singleShot(0, self.catch_up)
+        return False
+
+    def set_time_interval(self, text):
+        self.sample_interval = TIME_INTERVALS.get(text, TIME_INTERVALS["2 s"])
+        self.render(self.serial_reader.store.snapshot())
+
+    def set_dark_mode(self, dark_mode):
+        self.dark_mode = dark_mode
+        plot_style = self.get_plot_style()
+        for figure in self.figures:
+            figure.patch.set_facecolor(plot_style['figure_bg'])
+
+    def get_plot_colors(self):
+        """Get the appropriate color palette based on current theme."""
+        if self.dark_mode:
+            # Lighter colors for dark background
+            return ['#60a5fa', '#93c5fd', '#7fb3d3', '#5b9bd5', '#3e81f0', '#a4c8e8', '#b0d4ff']
+        else:
+            # Darker colors for light background
+            return ['#1e3a8a', '#2563eb', '#3b82f6', '#4472c4', '#2d6fc7', '#5b9bd5', '#6366f1']
+
+    def _add_annotation(self, ax, text, y_pos, plot_style):
+        """Helper method to add styled annotations to plots."""
+        ax.annotate(text, xy=(0.05, y_pos), xycoords='axes fraction', fontsize=10,
+                   horizontalalignment='left', verticalalignment='top',
+                   bbox=dict(boxstyle="round,pad=0.3", edgecolor=plot_style['annotation_edge'],
+                            facecolor=plot_style['annotation_bg'], linewidth=1.5),
+                   color=plot_style['annotation_text'])
+
+    def get_plot_style(self):
+        """Get the plot styling parameters based on current theme."""
+        if self.dark_mode:
+            return {
+                'bg_color': '#2d4a7c',
+                'spine_color': '#7fb3d3',
+                'tick_color': '#b0c4de',
+                'title_color': '#e0e8f5',
+                'label_color': '#e0e8f5',
+                'legend_bg': '#2d4a7c',
+                'legend_edge': '#7fb3d3',
+                'legend_text': '#e0e8f5',
+                'annotation_bg': '#3a5a8c',
+                'annotation_edge': '#7fb3d3',
+                'annotation_text': '#e0e8f5',
+                'default_line': '#60a5fa',
+                'figure_bg': '#1a206c'
+            }
+        else:
+            return {
+                'bg_color': '#f0f7ff',
+                'spine_color': '#4472c4',
+                'tick_color': '#1a206c',
+                'title_color': '#1a206c',
+                'label_color': '#1a206c',
+                'legend_bg': '#e8f0ff',
+                'legend_edge': '#4472c4',
+                'legend_text': '#1a206c',
+                'annotation_bg': '#d4e4f7',
+                'annotation_edge': '#4472c4',
+                'annotation_text': '#1a206c',
+                'default_line': '#2563eb',
+                'figure_bg': '#e8f0ff'
+            }
+
+    def update_graph(self, graph_id, snapshot=None):
+        # Read from one consistent snapshot of the history (a new one if not given).
+        if snapshot is None:
+            snapshot = self.serial_reader.store.snapshot()
+
+        # Seconds per sample on the time axis
+        sample_interval = self.sample_interval
+
+        # A graph scrolled back in time is drawn from the loaded history instead
+        if not self.graph_views[graph_id - 1].follow_live:
+            self.draw_scrollback(graph_id)
+            return
+
+        # Get the current time (for graphing, we don't require rounding here).
+        now = datetime.datetime.now()
+
+        # Select the appropriate axis and dropdown based on graph_id
+        ax = self.axes[graph_id - 1]
+        canvas = self.canvases[graph_id - 1]
+        selected_var = self.graph_dropdowns[graph_id - 1].currentText()
+
+        ax.clear()
+
+        graph = self.graph_set.get(selected_var)
+        # Graphs drawn from the same snapshot share one window read and every common sub-expression
+        evaluation = self.graph_set.live(snapshot, self.serial_reader.history_samples)
+        data = evaluation.series(graph)
+        ylabel = graph.ylabel
+
+        # Add annotations
+        plot_style = self.get_plot_style()
+        for i, annotation in enumerate(graph.annotations):
+            text = annotation.template.format(value=evaluation.latest(annotation.node))
+            self._add_annotation(ax, text, 0.95 - i * 0.1, plot_style)
+
+        # Get theme-appropriate colors and styling
+        blue_colors = self.get_plot_colors()
+
+        # Plot the data
+        times = [now - datetime.timedelta(seconds=(len(data[0]) - 1 - i) * sample_interval)
+                 for i in range(len(data[0]))]
+        x = mdates.date2num(times)
+        if len(data) > 1:
+            for i, (series, values) in enumerate(zip(graph.series, data)):
+                ax.plot(x, values, '-', label=series.label, color=blue_colors[i % len(blue_colors)], linewidth=2)
+            ax.legend(loc='best', framealpha=0.9, facecolor=plot_style['legend_bg'], 
+                     edgecolor=plot_style['legend_edge'], labelcolor=plot_style['legend_text'])
+        else:
+            ax.plot(x, data[0], '-', color=plot_style['default_line'], linewidth=2)
+
+        # Set fixed y-axis limits based on data type
+        self._set_y_axis_limits(ax, selected_var, graph, data)
+
+        self._style_axes(ax, ylabel)
+        canvas.draw()
+
+    def draw_scrollback(self, graph_id):
+        """Draw a graph's scrolled-back time range from whatever the history loader has ready."""
+        view = self.graph_views[graph_id - 1]
+        ax = self.axes[graph_id - 1]
+        canvas = self.canvases[graph_id - 1]
+        graph = self.graph_set.get(self.graph_dropdowns[graph_id - 1].currentText())
+        timestamps, rows = self.history_loader.request(graph.channels, view.start, view.end, canvas.width())
+        # Expressions are evaluated on the loaded (decimated) rows of their channels
+        data = self.graph_set.rows(graph, rows).series(graph)
+        ax.clear()
+        plot_style = self.get_plot_style()
+        blue_colors = self.get_plot_colors()
+        x = to_plot_time(timestamps)
+        for i, (series, values) in enumerate(zip(graph.series, data)):
+            color = blue_colors[i % len(blue_colors)] if len(data) > 1 else plot_style['default_line']
+            ax.plot(x, values, '-', label=series.label, color=color, linewidth=2)
+        if len(data) > 1:
+            ax.legend(loc='best', framealpha=0.9, facecolor=plot_style['legend_bg'],
+                      edgecolor=plot_style['legend_edge'], labelcolor=plot_style['legend_text'])
+        ax.set_xlim(*to_plot_time([view.start, view.end]))
+        if not len(timestamps):
+            text = "Loading..." if self.history_loader.queued else "No data in this range"
+            self._add_annotation(ax, text, 0.95, plot_style)
+        self._style_axes(ax, graph.ylabel)
+        canvas.draw()
+
+    def update_scrolled_graphs(self):
+        for i, view in enumerate(self.graph_views):
+            if not view.follow_live:
+                if self.is_shown(i + 1):
+                    self.draw_scrollback(i + 1)
+                else:
+                    self.stale.add(i + 1)
+
+    def set_follow_live(self, graph_id, follow):
+        view = self.graph_views[graph_id - 1]
+        if follow == view.follow_live:
+            return
+        if not follow:
+            # Leave the live view at the newest sample, showing about what it showed
+            snapshot = self.serial_reader.store.snapshot()
+            view.end = snapshot.timestamps(1)[0] if snapshot.count else datetime.datetime.now().timestamp()
+            view.span = DEFAULT_SPAN
+        view.follow_live = follow
+        checkbox = self.follow_checkboxes[graph_id - 1]
+        checkbox.blockSignals(True)
+        checkbox.setChecked(follow)
+        checkbox.blockSignals(False)
+        self.update_graph(graph_id)
+
+    def on_graph_scroll(self, graph_id, event):
+        """Mouse wheel: zoom the time axis around the cursor (leaves the live view)."""
+        if event.xdata is None:
+            return
+        self.set_follow_live(graph_id, False)
+        view = self.graph_views[graph_id - 1]
+        factor = 1.0 / ZOOM_STEP if event.button == 'up' else ZOOM_STEP
+        view.zoom(factor, from_plot_time(event.xdata, view.end))
+        self.draw_scrollback(graph_id)
+
+    def on_graph_press(self, graph_id, event):
+        """Left-button drag pans the time axis (leaves the live view)."""
+        if event.button != 1 or event.inaxes is None:
+            return
+        self.set_follow_live(graph_id, False)
+        view = self.graph_views[graph_id - 1]
+        view.drag_x, view.drag_end = event.x, view.end
+
+    def on_graph_motion(self, graph_id, event):
+        view = self.graph_views[graph_id - 1]
+        if view.drag_x is None:
+            return
+        width = self.axes[graph_id - 1].bbox.width or 1.0
+        view.end = view.drag_end - (event.x - view.drag_x) / width * view.span
+        self.draw_scrollback(graph_id)
+
+    def on_graph_release(self, graph_id, event):
+        self.graph_views[graph_id - 1].drag_x = None
+
+    def _style_axes(self, ax, ylabel):
+        """Style the plot based on current theme."""
+        plot_style = self.get_plot_style()
+        ax.set_facecolor(plot_style['bg_color'])
+        ax.spines['top'].set_visible(False)
+        ax.spines['right'].set_visible(False)
+        ax.spines['left'].set_color(plot_style['spine_color'])
+        ax.spines['bottom'].set_color(plot_style['spine_color'])
+        ax.tick_params(colors=plot_style['tick_color'])
+
+        # Title removed as requested
+        ax.set_xlabel("Time", color=plot_style['label_color'], fontsize=10)
+        ax.set_ylabel(ylabel, color=plot_style['label_color'], fontsize=10)
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
+        ax.xaxis.set_major_locator(mticker.MaxNLocator(4))
+
+    def _set_y_axis_limits(self, ax, selected_var, graph, data):
+        """Set fixed y-axis limits based on data type, expanding only if data exceeds limits."""
+        # The limits follow the plotted values themselves (flagged values are gaps)
+        max_expected = 0
+        current_max = 0
+        current_min = 0
+        for series, values in zip(graph.series, data):
+            max_expected = max(max_expected, series.max_expected)
+            finite = values[np.isfinite(values)]
+            if len(finite):
+                current_max = max(current_max, finite.max())
+                current_min = min(current_min, finite.min())
+
+        # Set y-axis limits
+        if current_max > max_expected:
+            # If current data exceeds expected max, expand the axis
+            y_max = current_max * 1.1  # Add 10% margin
+        else:
+            # Use the fixed expected maximum
+            y_max = max_expected
+
+        # Set minimum - allow negative values for power (can be negative when consuming)
+        if any(key in selected_var.lower() for key in ['power', 'watt', 'trade', 'temp', 'temperature']):
+            y_min = min(0, current_max * 0.1)
+        else:
+            y_min = 0
+        # Channels that are negative by nature (RSSI, SNR, charging power) extend below zero
+        if current_min < 0:
+            y_min = min(y_min, current_min * 1.1)
+
+        ax.set_ylim(y_min, y_max)
+
+    def add_graph(self):
+        if len(self.graph_dropdowns) >= MAX_GRAPHS:
+            return
+
+        # Create a container for this graph and its dropdown
+        graph_container = QWidget()
+        graph_container.setObjectName("graph_container")
+        graph_container.setMinimumHeight(GRAPH_MIN_HEIGHT)
+        container_layout = QVBoxLayout(graph_container)
+        container_layout.setContentsMargins(10, 10, 10, 10)
+        container_layout.setSpacing(5)
+
+        # Create dropdown selector for this graph
+        dropdown_layout = QHBoxLayout()
+        dropdown_layout.setContentsMargins(0, 0, 0, 0)
+        dropdown_layout.setSpacing(10)
+
+        graph_label = QLabel(f"Graph {len(self.graph_dropdowns) + 1}:")
+        graph_label.setStyleSheet("font-weight: bold;")
+
+        graph_dropdown = QComboBox()
+        graph_dropdown.addItems(self.graph_set.names)
+        graph_dropdown.setCurrentText("Velocity")
+        graph_dropdown.currentTextChanged.connect(lambda _, id=len(self.graph_dropdowns) + 1: self.update_graph(id))
+
+        # Wheel zooms and dragging pans back through the history; this returns to the live view
+        graph_id = len(self.graph_dropdowns) + 1
+        follow_checkbox = QCheckBox("Follow live")
+        follow_checkbox.setChecked(True)
+        follow_checkbox.toggled.connect(lambda checked, id=graph_id: self.set_follow_live(id, checked))
+
+        dropdown_layout.addWidget(graph_label)
+        dropdown_layout.addWidget(graph_dropdown)
+        dropdown_layout.addWidget(follow_checkbox)
+        dropdown_layout.addStretch()  # Push dropdown to the left
+
+        container_layout.addLayout(dropdown_layout)
+
+        # Create the figure and canvas; a Figure of its own (not pyplot's) is freed with its canvas
+        load_matplotlib()
+        figure = Figure()
+        ax = figure.add_subplot()
+        plot_style = self.get_plot_style()
+        figure.patch.set_facecolor(plot_style['figure_bg'])
+        canvas = FigureCanvas(figure)
+        canvas.mpl_connect('scroll_event', lambda event, id=graph_id: self.on_graph_scroll(id, event))
+        canvas.mpl_connect('button_press_event', lambda event, id=graph_id: self.on_graph_press(id, event))
+        canvas.mpl_connect('motion_notify_event', lambda event, id=graph_id: self.on_graph_motion(id, event))
+        canvas.mpl_connect('button_release_event', lambda event, id=graph_id: self.on_graph_release(id, event))
+
+        container_layout.addWidget(canvas)
+
+        # Store references
+        self.graph_containers.append(graph_container)
+        self.graph_dropdowns.append(graph_dropdown)
+        self.figures.append(figure)
+        self.axes.append(ax)
+        self.canvases.append(canvas)
+        self.graph_views.append(GraphView())
+        self.follow_checkboxes.append(follow_checkbox)
+
+        # Add the container to the panel
+        self.graphs_layout.addWidget(graph_container)
+        self.update_graph(graph_id)
+        self.graphsChanged.emit(len(self.graph_dropdowns))
+
+    def remove_graph(self):
+        if len(self.graph_dropdowns) <= 1:
+            return
+
+        # Remove the last graph container and all its components
+        graph_container = self.graph_containers.pop()
+        graph_dropdown = self.graph_dropdowns.pop()
+        figure = self.figures.pop()
+        ax = self.axes.pop()
+        canvas = self.canvases.pop()
+        self.graph_views.pop()
+        self.follow_checkboxes.pop()
+        self.stale.discard(len(self.graph_dropdowns) + 1)
+
+        # Remove the container from the layout
+        self.graphs_layout.removeWidget(graph_container)
+        graph_container.deleteLater()
+        self.graphsChanged.emit(len(self.graph_dropdowns))
@@ -0,0 +1,231 @@
+import ast
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import numpy as np
+from channel_schema import SCHEMA
+
+##############################
+# Graph Specification
+##############################
+# The graphs offered in each graph's dropdown are declared in graphs.json
+# (or the file named by HUST_GRAPH_SPEC): a name, the series to plot, an
+# optional unit and annotations. A series is a channel key or an expression
+# over channels, e.g. "battery_volt * battery_current - MPPT_total_watt".
+#
+# Expressions are parsed once at startup into a graph of nodes shared by every
+# graph: the same sub-expression (up to the order of + and * operands) is one
+# node wherever it appears. An Evaluation reads the channels it needs in one
+# window and computes each node at most once, as a NumPy operation over the
+# whole window; GraphSet.live keeps the Evaluation for the current sample
+# index, so every graph drawn in one update shares the work.
+
+GRAPH_SPEC_PATH = os.environ.get(
+    "HUST_GRAPH_SPEC", os.path.join(os.path.dirname(os.path.abspath(__file__)), "graphs.json"))
+
+BINARY_OPERATORS = {ast.Add: ("+", np.add), ast.Sub: ("-", np.subtract), ast.Mult: ("*", np.multiply),
+                    ast.Div: ("/", np.divide), ast.Pow: ("**", np.power)}
+COMMUTATIVE = {"+", "*"}
+# name -> (function, number of arguments)
+FUNCTIONS = {"abs": (np.abs, 1), "sqrt": (np.sqrt, 1), "exp": (np.exp, 1), "log": (np.log, 1),
+             "min": (np.minimum, 2), "max": (np.maximum, 2), "clip": (np.clip, 3), "where": (np.where, 3)}
+
+
+class Node:
+    """One channel, constant or operation; `key` is its canonical text, the same for equal sub-expressions."""
+    __slots__ = ("key", "channel", "constant", "function", "inputs")
+
+    def __init__(self, key, channel=None, constant=None, function=None, inputs=()):
+        self.key = key
+        self.channel = channel
+        self.constant = constant
+        self.function = function
+        self.inputs = inputs
+
+    def channels(self):
+        if self.channel is not None:
+            return {self.channel}
+        return set().union(*(child.channels() for child in self.inputs))
+
+
+class Compiler:
+    """Turns expression text into Nodes, reusing one Node per distinct sub-expression."""
+
+    def __init__(self, channels=SCHEMA.index):
+        self.known_channels = channels
+        self.nodes: Dict[str, Node] = {}
+
+    def compile(self, text):
+        try:
+            tree = ast.parse(text.strip(), mode="eval")
+        except SyntaxError as e:
+            raise ValueError(f"cannot parse '{text}': {e.msg}")
+        return self._node(tree.body, text)
+
+    def _intern(self, key, **kwargs):
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = Node(key, **kwargs)
+        return node
+
+    def _node(self, tree, text):
+        if isinstance(tree, ast.Name):
+            if tree.id not in self.known_channels:
+                raise ValueError(f"unknown channel '{tree.id}' in '{text}'")
+            return self._intern(tree.id, channel=tree.id)
+        if isinstance(tree, ast.Constant) and isinstance(tree.value, (int, float)) and not isinstance(tree.value, bool):
+            return self._intern(repr(float(tree.value)), constant=float(tree.value))
+        if isinstance(tree, ast.UnaryOp) and isinstance(tree.op, (ast.USub, ast.UAdd)):
+            operand = self._node(tree.operand, text)
+            if isinstance(tree.op, ast.UAdd):
+                return operand
+            if operand.constant is not None:
+                return self._intern(repr(-operand.constant), constant=-operand.constant)
+            return self._intern(f"(-{operand.key})", function=np.negative, inputs=(operand,))
+        if isinstance(tree, ast.BinOp) and type(tree.op) in BINARY_OPERATORS:
+            symbol, function = BINARY_OPERATORS[type(tree.op)]
+            inputs = (self._node(tree.left, text), self._node(tree.right, text))
+            keys = [child.key for child in inputs]
+            if symbol in COMMUTATIVE:
+                keys.sort()
+            return self._intern(f"({keys[0]}{symbol}{keys[1]})", function=function, inputs=inputs)
+        if isinstance(tree, ast.Call) and isinstance(tree.func, ast.Name) and not tree.keywords:
+            if tree.func.id not in FUNCTIONS:
+                raise ValueError(f"unknown function '{tree.func.id}' in '{text}' "
+                                 f"(available: {', '.join(sorted(FUNCTIONS))})")
+            function, arguments = FUNCTIONS[tree.func.id]
+            if len(tree.args) != arguments:
+                raise ValueError(f"{tree.func.id}() takes {arguments} argument{'s' if arguments > 1 else ''}, "
+                                 f"got {len(tree.args)} in '{text}'")
+            inputs = tuple(self._node(arg, text) for arg in tree.args)
+            return self._intern(f"{tree.func.id}({','.join(child.key for child in inputs)})",
+                                function=function, inputs=inputs)
+        raise ValueError(f"unsupported syntax '{ast.unparse(tree)}' in '{text}'")
+
+
+@dataclass
+class Series:
+    label: str
+    node: Node
+    max_expected: float = 0.0  # where the y axis starts before the data exceeds it
+
+
+@dataclass
+class Annotation:
+    node: Node
+    template: str  # str.format template with {value}
+
+
+@dataclass
+class GraphDefinition:
+    """One compiled graph: its series, y label and annotations, and every channel they read."""
+    name: str
+    series: List[Series]
+    ylabel: str
+    annotations: List[Annotation] = field(default_factory=list)
+    channels: List[str] = field(default_factory=list)
+
+
+class Evaluation:
+    """Node values over one set of channel columns, each node computed at most once."""
+
+    def __init__(self, columns):
+        self.columns = columns  # channel key -> 1-D array
+        self.values = {}
+
+    def __call__(self, node):
+        value = self.values.get(node.key)
+        if value is None:
+            if node.channel is not None:
+                value = self.columns[node.channel]
+            elif node.constant is not None:
+                value = node.constant
+            else:
+                with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+                    value = node.function(*[self(child) for child in node.inputs])
+            self.values[node.key] = value
+        return value
+
+    def latest(self, node):
+        """The newest value of a node (its last element)."""
+        return float(np.asarray(self(node)).reshape(-1)[-1])
+
+    def series(self, graph):
+        """Each series of `graph` as an array the length of the columns."""
+        length = len(next(iter(self.columns.values()))) if self.columns else 0
+        return [np.broadcast_to(np.asarray(self(series.node), dtype=np.float64), (length,))
+                for series in graph.series]
+
+
+class GraphSet:
+    """The compiled graphs of a spec, plus single-channel graphs compiled on demand."""
+
+    def __init__(self, spec, channels=SCHEMA.by_key):
+        self.channel_info = channels
+        self.compiler = Compiler(channels)
+        self.graphs: Dict[str, GraphDefinition] = {}
+        for entry in spec.get("graphs", []):
+            name = entry.get("name", "?")
+            try:
+                self.graphs[name] = self._compile(entry)
+            except (ValueError, KeyError, TypeError) as e:
+                print(f"[DEBUG] Skipping graph '{name}': {e}")
+        self.names = list(self.graphs)
+        self._update_channels()
+
+    def _update_channels(self):
+        # Every channel any graph reads: one window read covers all graphs
+        wanted = set().union(*(graph.channels for graph in self.graphs.values()))
+        self.channels = [key for key in self.channel_info if key in wanted]
+        self._live = None  # (snapshot count, window length, Evaluation)
+
+    def _compile(self, entry):
+        series = []
+        for item in entry["series"]:
+            if isinstance(item, str):
+                item = {"expr": item}
+            node = self.compiler.compile(item["expr"])
+            channel = self.channel_info.get(node.channel) if node.channel is not None else None
+            label = item.get("label") or (channel.display_name if channel else item["expr"])
+            max_expected = item.get("max_expected", channel.max_expected if channel else 0.0)
+            series.append(Series(label, node, float(max_expected)))
+        if not series:
+            raise ValueError("no series")
+        annotations = [Annotation(self.compiler.compile(item["expr"]), item["format"])
+                       for item in entry.get("annotations", [])]
+        first = self.channel_info.get(series[0].node.channel)
+        ylabel = entry.get("unit", first.unit if first else "")
+        channels = set().union(*(s.node.channels() for s in series), *(a.node.channels() for a in annotations))
+        return GraphDefinition(entry["name"], series, ylabel, annotations,
+                               [key for key in self.channel_info if key in channels])
+
+    def get(self, name) -> Optional[GraphDefinition]:
+        """A graph by name, or a graph of the single channel `name`."""
+        graph = self.graphs.get(name)
+        if graph is None and name in self.channel_info:
+            graph = self.graphs[name] = self._compile({"name": name, "series": [name]})
+            self._update_channels()
+        return graph
+
+    def live(self, snapshot, n):
+        """The Evaluation over the last `n` samples of `snapshot`, shared by every graph drawn from it."""
+        if self._live is not None and self._live[:2] == (snapshot.count, n):
+            return self._live[2]
+        window = snapshot.window(n, self.channels, gaps=True)  # flagged values are drawn as gaps
+        evaluation = Evaluation({key: window[:, i] for i, key in enumerate(self.channels)})
+        self._live = (snapshot.count, n, evaluation)
+        return evaluation
+
+    def rows(self, graph, rows):
+        """An Evaluation over history rows read for `graph.channels` (e.g. from the scrollback loader)."""
+        return Evaluation({key: rows[:, i] for i, key in enumerate(graph.channels)})
+
+
+def load_graph_spec(path=GRAPH_SPEC_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+def load_graphs(path=GRAPH_SPEC_PATH):
+    return GraphSet(load_graph_spec(path))
@@ -0,0 +1,277 @@
+import datetime
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+
+##############################
+# History Store
+##############################
+# A ring buffer holding one row per sample (all channels, in schema order),
+# written by a single thread (the reader) and read by any number of others.
+#
+# Publication works like a sequence lock without the lock: the writer fills
+# the next slot first and only then increments `count`, so rows below `count`
+# are always complete. A reader takes a Snapshot, which is nothing more than
+# the current `count`; every read through it copies just the rows it needs and
+# afterwards checks that the writer has not wrapped around onto them. The
+# writer never waits for readers, and readers never copy the whole history.
+#
+# MappedHistoryStore additionally keeps every row of the session in
+# memory-mapped files on disk, so any past sample can be read back while only
+# the ring buffer (the hot tail) and the segment being written stay resident.
+#
+# Each row also carries a validity bitmask (bit i set: channel i of the row
+# was flagged invalid by the fault detector, see sensor_faults.py), 8 bytes
+# per row. Reads with gaps=True return NaN for flagged values, which graphs
+# draw as gaps.
+
+HISTORY_CAPACITY = 4096  # rows kept; far more than a redraw reads, so wrap-around during a read is rare
+SEGMENT_ROWS = 1 << 16   # rows per mapped file (about 15 MB with the default channels)
+OPEN_SEGMENTS = 2        # completed segments kept mapped for reading
+MASK_BITS = 64           # channels a row's validity bitmask can flag (the first 64)
+
+
+class SnapshotExpired(Exception):
+    """The rows a snapshot refers to were overwritten while being read."""
+
+
+class HistoryStore:
+    def __init__(self, keys, capacity=HISTORY_CAPACITY):
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.capacity = capacity
+        self.rows = np.zeros((capacity, len(self.keys)))
+        self.timestamps = np.zeros(capacity)
+        self.masks = np.zeros(capacity, dtype=np.uint64)
+        self.count = 0  # number of published rows; also the sequence number of the next row
+
+    def append(self, row, timestamp, invalid=0):
+        """Write one row (values aligned with keys, `invalid` its bitmask). Only one thread may call this."""
+        slot = self.count % self.capacity
+        self.rows[slot] = row
+        self.timestamps[slot] = timestamp
+        self.masks[slot] = invalid
+        self.count += 1  # publish
+
+    def snapshot(self):
+        """A consistent view of every row published so far."""
+        return Snapshot(self, self.count)
+
+    def oldest(self, count):
+        """Sequence number of the oldest row still held, as of `count` published rows."""
+        return max(0, count - self.capacity)
+
+    def read_rows(self, first, last, columns):
+        """Copy rows first..last-1 (sequence numbers) of the given column indices."""
+        out = self.rows[np.ix_(np.arange(first, last) % self.capacity, columns)]
+        # The oldest row read is intact as long as the writer has not started on its slot again
+        if self.count - first >= self.capacity:
+            raise SnapshotExpired(f"rows from {first} overwritten while reading")
+        return out
+
+    def read_timestamps(self, first, last):
+        out = self.timestamps[np.arange(first, last) % self.capacity]
+        if self.count - first >= self.capacity:
+            raise SnapshotExpired("timestamps overwritten while reading")
+        return out
+
+    def read_masks(self, first, last):
+        out = self.masks[np.arange(first, last) % self.capacity]
+        if self.count - first >= self.capacity:
+            raise SnapshotExpired("masks overwritten while reading")
+        return out
+
+    def close(self):
+        pass
+
+
+class MappedHistoryStore(HistoryStore):
+    """
+    A history store that also writes every row to memory-mapped segment files
+    in `directory` (one float64 row per sample: timestamp, then the channels in
+    key order, then the validity bitmask stored as the bits of a float64). Reads of recent rows come from the ring buffer; older ones from
+    the files, through the page cache. Snapshots of it never expire.
+    """
+
+    def __init__(self, keys, directory, capacity=HISTORY_CAPACITY, segment_rows=SEGMENT_ROWS):
+        super().__init__(keys, capacity)
+        self.segment_rows = segment_rows
+        os.makedirs(directory, exist_ok=True)
+        self.prefix = os.path.join(directory, f"session_{datetime.datetime.now():%Y%m%d_%H%M%S}")
+        self.current = (-1, None)           # (number, writable map) of the segment being filled
+        self.open_segments = OrderedDict()  # segment number -> read-only map, least recently used first
+        self.open_lock = threading.Lock()   # readers only; the writer never waits
+
+    def segment_path(self, number):
+        return f"{self.prefix}_{number:05d}.bin"
+
+    def append(self, row, timestamp, invalid=0):
+        number, offset = divmod(self.count, self.segment_rows)
+        if number != self.current[0]:
+            # Start a new file; the finished one is unmapped here (readers map it again when needed)
+            self.current = (number, np.memmap(self.segment_path(number), dtype=np.float64, mode="w+",
+                                              shape=(self.segment_rows, len(self.keys) + 2)))
+        segment = self.current[1]
+        segment[offset, 0] = timestamp
+        segment[offset, 1:-1] = row
+        segment[offset:offset + 1, -1:].view(np.uint64)[0, 0] = invalid
+        super().append(row, timestamp, invalid)
+
+    def oldest(self, count):
+        return 0
+
+    def _segment(self, number):
+        current, segment = self.current
+        if number == current:
+            return segment
+        with self.open_lock:
+            segment = self.open_segments.pop(number, None)
+            if segment is None:
+                segment = np.memmap(self.segment_path(number), dtype=np.float64, mode="r",
+                                    shape=(self.segment_rows, len(self.keys) + 2))
+            self.open_segments[number] = segment
+            while len(self.open_segments) > OPEN_SEGMENTS:
+                self.open_segments.popitem(last=False)
+        return segment
+
+    def _read_mapped(self, first, last, columns):
+        parts = []
+        position = first
+        while position < last:
+            number, offset = divmod(position, self.segment_rows)
+            end = min(last, (number + 1) * self.segment_rows)
+            parts.append(self._segment(number)[offset:offset + end - position][:, columns])
+            position = end
+        if not parts:
+            return np.zeros((0, len(columns)))
+        return np.concatenate(parts)
+
+    def read_rows(self, first, last, columns):
+        if first >= self.count - self.capacity:
+            try:
+                return super().read_rows(first, last, columns)
+            except SnapshotExpired:
+                pass
+        return self._read_mapped(first, last, [column + 1 for column in columns])
+
+    def read_timestamps(self, first, last):
+        if first >= self.count - self.capacity:
+            try:
+                return super().read_timestamps(first, last)
+            except SnapshotExpired:
+                pass
+        return self._read_mapped(first, last, [0])[:, 0]
+
+    def read_masks(self, first, last):
+        if first >= self.count - self.capacity:
+            try:
+                return super().read_masks(first, last)
+            except SnapshotExpired:
+                pass
+        return self._read_mapped(first, last, [len(self.keys) + 1])[:, 0].view(np.uint64)
+
+    def close(self):
+        """Flush the files and cut the last one to the rows written. Only call once the readers have stopped."""
+        number, segment = self.current
+        if segment is None:
+            return
+        segment.flush()
+        self.current = (number, None)
+        del segment
+        with self.open_lock:
+            self.open_segments.clear()
+        rows = self.count - number * self.segment_rows
+        with open(self.segment_path(number), "r+b") as f:
+            f.truncate(rows * (len(self.keys) + 2) * 8)
+
+
+def blank_invalid(rows, masks, columns):
+    """Set the values whose bit is set in their row's mask to NaN, in place (`columns`: channel index per column)."""
+    if not masks.any():
+        return
+    columns = np.array(columns, dtype=np.uint64)
+    bits = np.where(columns < MASK_BITS, np.left_shift(np.uint64(1), columns % MASK_BITS), np.uint64(0))
+    rows[(masks[:, None] & bits) != 0] = np.nan
+
+
+class Snapshot:
+    """The store as of one sample index. Reads copy only what they return."""
+
+    def __init__(self, store, count):
+        self.store = store
+        self.count = count
+        self.keys = store.keys
+
+    def _read(self, n, columns, gaps=False):
+        available = min(n, self.count - self.store.oldest(self.count))
+        out = np.zeros((n, len(columns)))
+        if available:
+            out[n - available:] = self.store.read_rows(self.count - available, self.count, columns)
+            if gaps:
+                blank_invalid(out[n - available:], self.store.read_masks(self.count - available, self.count),
+                              columns)
+        return out
+
+    def window(self, n, keys=None, gaps=False):
+        """
+        The last `n` rows (oldest first) for `keys` (default all), zero-padded
+        before the first sample. With gaps=True, values flagged invalid are NaN.
+        """
+        keys = self.keys if keys is None else keys
+        return self._read(n, [self.store.index[key] for key in keys], gaps)
+
+    def series(self, key, n, gaps=False):
+        """The last `n` values of one channel."""
+        return self._read(n, [self.store.index[key]], gaps)[:, 0]
+
+    def masks(self, n):
+        """Validity bitmasks of the last `n` rows (zero before the first sample)."""
+        available = min(n, self.count - self.store.oldest(self.count))
+        out = np.zeros(n, dtype=np.uint64)
+        if available:
+            out[n - available:] = self.store.read_masks(self.count - available, self.count)
+        return out
+
+    def timestamps(self, n):
+        available = min(n, self.count - self.store.oldest(self.count))
+        out = np.zeros(n)
+        if available:
+            out[n - available:] = self.store.read_timestamps(self.count - available, self.count)
+        return out
+
+    def first(self):
+        """Sequence number of the oldest row this snapshot can read."""
+        return self.store.oldest(self.count)
+
+    def range(self, first, last, keys=None, gaps=False):
+        """
+        Rows with sequence numbers first..last-1 for `keys` (default all),
+        clipped to the rows the store still holds. Returns (timestamps, rows);
+        with gaps=True, values flagged invalid are NaN.
+        """
+        keys = self.keys if keys is None else keys
+        first = max(first, self.first())
+        last = min(last, self.count)
+        if last <= first:
+            return np.zeros(0), np.zeros((0, len(keys)))
+        columns = [self.store.index[key] for key in keys]
+        rows = self.store.read_rows(first, last, columns)
+        if gaps:
+            blank_invalid(rows, self.store.read_masks(first, last), columns)
+        return self.store.read_timestamps(first, last), rows
+
+    def search(self, timestamp):
+        """Sequence number of the first row at or after `timestamp` (rows are in time order)."""
+        lo, hi = self.first(), self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.store.read_timestamps(mid, mid + 1)[0] < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def latest(self):
+        """The newest sample as a dict (all zeros before the first sample)."""
+        return dict(zip(self.keys, self.window(1)[0].tolist()))
@@ -0,0 +1,257 @@
+"""
+Lap and stint segmentation of the telemetry stream.
+
+A lap ends each time the car has covered the configured lap length (on
+distance_travelled), or when a lap marker is set by hand (the L key in the
+dashboard); a marker also re-bases the distance count, so it doubles as the
+start/finish line. A stint ends when the car stands still (velocity below
+STOP_SPEED) for STOP_TIME seconds, e.g. a driver change, and the next one
+starts when it moves again.
+
+The tracker runs in the ingest thread with constant work per sample. It can
+also be run over logged data, giving the same laps as it would have live.
+
+Usage (from the Application folder):
+    python lap_tracker.py can_data_log.csv --lap-length 2.6
+    python lap_tracker.py imported/log_3.csv --lap-length 2.6 --out laps.csv
+"""
+import argparse
+import csv
+import datetime
+import os
+from dataclasses import dataclass, field
+from typing import Dict
+import numpy as np
+from channel_schema import SCHEMA
+
+LAP_LENGTH = 0.0    # km; 0 means laps are only ended by markers
+STOP_SPEED = 2.0    # km/h; slower than this counts as standing still
+STOP_TIME = 30.0    # s standing still that ends a stint
+
+TEMPERATURE_KEYS = [channel.key for channel in SCHEMA.channels if channel.unit == "°C"]
+ENERGY_KEYS = ("battery_energy_out", "battery_energy_in", "solar_energy")
+
+LAP_HEADER = ["lap", "stint", "start", "end", "time_s", "distance_km", "avg_speed", "max_speed",
+              "energy_out_wh", "energy_in_wh", "solar_wh", "ended_by"] + [f"{key}_peak" for key in TEMPERATURE_KEYS]
+
+
+@dataclass
+class LapStats:
+    """Aggregates of one lap (or of the lap in progress)."""
+    number: int
+    stint: int
+    start: float
+    end: float
+    distance: float = 0.0     # km
+    max_speed: float = 0.0    # km/h
+    energy_out: float = 0.0   # Wh
+    energy_in: float = 0.0    # Wh
+    solar: float = 0.0        # Wh
+    peak_temps: Dict[str, float] = field(default_factory=dict)
+    ended_by: str = ""        # "distance", "marker" or "" while in progress
+
+    @property
+    def time(self):
+        return self.end - self.start
+
+    @property
+    def avg_speed(self):
+        """km/h over the whole lap, stops included."""
+        return 3600.0 * self.distance / self.time if self.time > 0 else 0.0
+
+    def as_row(self):
+        start = datetime.datetime.fromtimestamp(self.start).replace(microsecond=0).isoformat()
+        end = datetime.datetime.fromtimestamp(self.end).replace(microsecond=0).isoformat()
+        return ([self.number, self.stint, start, end, round(self.time, 1), round(self.distance, 3),
+                 round(self.avg_speed, 2), round(self.max_speed, 2), round(self.energy_out, 2),
+                 round(self.energy_in, 2), round(self.solar, 2), self.ended_by]
+                + [round(self.peak_temps.get(key, 0.0), 1) for key in TEMPERATURE_KEYS])
+
+
+@dataclass
+class StintStats:
+    """Aggregates of one stint: the driving between two stops."""
+    number: int
+    start: float
+    end: float
+    laps: int = 0
+    distance: float = 0.0
+    energy_out: float = 0.0
+    energy_in: float = 0.0
+
+
+class LapTracker:
+    """Segments the sample stream into laps and stints. Only the ingest thread calls update()."""
+
+    def __init__(self, lap_length=LAP_LENGTH, stop_speed=STOP_SPEED, stop_time=STOP_TIME):
+        self.lap_length = lap_length  # may be changed at any time, e.g. from the GUI
+        self.stop_speed = stop_speed
+        self.stop_time = stop_time
+        self.marker = False  # set from any thread by mark(), consumed by update()
+        self.reset()
+
+    def reset(self):
+        # Completed laps and stints. Only ever appended to, so other threads can
+        # read them without locking (take a slice, e.g. tracker.laps[:]).
+        self.laps = []
+        self.stints = []
+        self.last_time = None
+        self.distance = 0.0           # km driven, unaffected by resets of the car's counter
+        self.last_distance = None     # the car's counter at the previous sample
+        self.last_energy = None
+        self.stopped_since = None
+        self.stop_energy = None       # stint energy totals when the current stop began
+        self.lap = None
+        self.lap_start_distance = 0.0
+        self.stint = None
+
+    def mark(self):
+        """Request a lap marker; the lap in progress ends at the next sample."""
+        self.marker = True
+
+    def update(self, values, now):
+        """Feed one sample (channel values by key, at time `now`)."""
+        counter = values["distance_travelled"]
+        speed = values["velocity"]
+        energy = [values.get(key, 0.0) for key in ENERGY_KEYS]
+        if self.last_time is None:
+            self.last_time, self.last_distance, self.last_energy = now, counter, energy
+            self._start_lap(now)
+
+        # Per-sample increments; a counter that went backwards (the car or the
+        # app restarted) counts from zero again
+        previous_distance = self.distance
+        step = counter - self.last_distance
+        self.distance += step if step >= 0 else counter
+        used = [e - last if e >= last else e for e, last in zip(energy, self.last_energy)]
+        previous_time = self.last_time
+        self.last_time, self.last_distance, self.last_energy = now, counter, energy
+
+        self._update_stint(speed, now, self.distance - previous_distance, used)
+
+        lap = self.lap
+        lap.end = now
+        lap.distance = self.distance - self.lap_start_distance
+        lap.max_speed = max(lap.max_speed, speed)
+        lap.energy_out += used[0]
+        lap.energy_in += used[1]
+        lap.solar += used[2]
+        for key in TEMPERATURE_KEYS:
+            value = values.get(key)
+            if value is not None and value > lap.peak_temps.get(key, float("-inf")):
+                lap.peak_temps[key] = value
+
+        if self.marker:
+            self.marker = False
+            self._end_lap(now, self.distance, "marker")
+        elif self.lap_length > 0:
+            while self.distance - self.lap_start_distance >= self.lap_length:
+                # Interpolate when the line was crossed between the last two samples
+                line = self.lap_start_distance + self.lap_length
+                moved = self.distance - previous_distance
+                fraction = (line - previous_distance) / moved if moved > 0 else 1.0
+                crossed = previous_time + min(max(fraction, 0.0), 1.0) * (now - previous_time)
+                self._end_lap(crossed, line, "distance")
+                self.lap.end = now
+                self.lap.distance = self.distance - line
+
+    def _start_lap(self, now):
+        # While stopped between stints, the lap belongs to the next stint
+        stint = self.stint.number if self.stint else len(self.stints) + 1
+        self.lap = LapStats(number=len(self.laps) + 1, stint=stint, start=now, end=now)
+
+    def _end_lap(self, end, distance, reason):
+        lap = self.lap
+        lap.end = end
+        lap.distance = distance - self.lap_start_distance
+        lap.ended_by = reason
+        self.laps.append(lap)
+        if self.stint is not None:
+            self.stint.laps += 1
+        self.lap_start_distance = distance
+        self._start_lap(end)
+
+    def _start_stint(self, now):
+        self.stint = StintStats(number=len(self.stints) + 1, start=now, end=now)
+
+    def _update_stint(self, speed, now, moved, used):
+        stint = self.stint
+        if speed >= self.stop_speed:
+            self.stopped_since = None
+            if stint is None:
+                self._start_stint(now)
+                stint = self.stint
+                if self.lap is not None:
+                    self.lap.stint = stint.number
+        elif self.stopped_since is None:
+            self.stopped_since = now
+            if stint is not None:
+                self.stop_energy = (stint.distance, stint.energy_out, stint.energy_in)
+        elif stint is not None and now - self.stopped_since >= self.stop_time:
+            # The stint ended when the car came to a halt
+            stint.end = self.stopped_since
+            stint.distance, stint.energy_out, stint.energy_in = self.stop_energy
+            self.stints.append(stint)
+            self.stint = None
+            return
+        if stint is not None:
+            stint.end = now
+            stint.distance += moved
+            stint.energy_out += used[0]
+            stint.energy_in += used[1]
+
+    def current_lap(self):
+        """The lap in progress (a copy), or None before the first sample."""
+        lap = self.lap
+        if lap is None:
+            return None
+        return LapStats(lap.number, lap.stint, lap.start, lap.end, lap.distance, lap.max_speed,
+                        lap.energy_out, lap.energy_in, lap.solar, dict(lap.peak_temps))
+
+
+def write_laps(path, laps):
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(LAP_HEADER)
+        writer.writerows(lap.as_row() for lap in laps)
+
+
+def track_log(path, tracker):
+    """Run `tracker` over a CSV log in the app's layout, chunk by chunk."""
+    from log_analytics import CHUNK_BYTES, read_chunk, parse_chunk
+    with open(path, "r", newline="") as f:
+        keys = next(csv.reader(f), [])[1:]
+    wanted = [key for key in ["velocity", "distance_travelled", *ENERGY_KEYS, *TEMPERATURE_KEYS] if key in keys]
+    columns = [keys.index(key) for key in wanted]
+    size = os.path.getsize(path)
+    for start in range(0, size, CHUNK_BYTES):
+        timestamps, values = parse_chunk(read_chunk(path, start, min(start + CHUNK_BYTES, size)), len(keys))
+        values = np.nan_to_num(values[:, columns])
+        for timestamp, row in zip(timestamps.tolist(), values.tolist()):
+            tracker.update(dict(zip(wanted, row)), timestamp)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Split logged telemetry into laps and stints.")
+    parser.add_argument("paths", nargs="+", help="CSV log files, in time order")
+    parser.add_argument("--lap-length", type=float, required=True, help="lap length in km")
+    parser.add_argument("--stop-speed", type=float, default=STOP_SPEED, help="km/h below which the car is stopped")
+    parser.add_argument("--stop-time", type=float, default=STOP_TIME, help="seconds stopped that end a stint")
+    parser.add_argument("--out", help="write the laps to this CSV file")
+    args = parser.parse_args()
+
+    tracker = LapTracker(args.lap_length, args.stop_speed, args.stop_time)
+    for path in args.paths:
+        track_log(path, tracker)
+
+    print(f"{'lap':>4} {'stint':>5} {'time':>8} {'km':>7} {'km/h':>6} {'Wh out':>8} {'Wh in':>7} {'solar':>7}")
+    for lap in tracker.laps:
+        minutes, seconds = divmod(lap.time, 60)
+        print(f"{lap.number:>4} {lap.stint:>5} {int(minutes):>4}:{seconds:04.1f} {lap.distance:>7.3f} "
+              f"{lap.avg_speed:>6.1f} {lap.energy_out:>8.1f} {lap.energy_in:>7.1f} {lap.solar:>7.1f}")
+    stints = tracker.stints + ([tracker.stint] if tracker.stint else [])
+    for stint in stints:
+        print(f"stint {stint.number}: {stint.laps} laps, {stint.distance:.2f} km, "
+              f"{(stint.end - stint.start) / 60:.1f} min, {stint.energy_out - stint.energy_in:.1f} Wh net")
+    if args.out:
+        write_laps(args.out, tracker.laps)
@@ -0,0 +1,161 @@
+import math
+from collections import deque
+from dataclasses import dataclass
+
+##############################
+# Link Analytics
+##############################
+# Radio link quality measured on the receiving side, one packet at a time:
+# RSSI/SNR distributions, inter-arrival jitter and packet loss. The payload
+# has no sequence number, so loss is inferred from gaps: the car sends one
+# packet every sendInterval seconds (LoRa_functions.cpp), so an arrival gap
+# of about k intervals means k - 1 packets were lost. All state is bounded
+# (fixed histogram bins, capped deques) so multi-hour sessions use constant
+# memory.
+
+SEND_INTERVAL = 1.0        # s, matches sendInterval in the sender firmware
+LOSS_WINDOW = 60.0         # s, window of the packet_loss channel
+MAX_MINUTE_SUMMARIES = 24 * 60
+
+
+class StreamingHistogram:
+    """Fixed-bin histogram with under/overflow bins and approximate percentiles."""
+
+    def __init__(self, low, high, bin_width):
+        self.low = low
+        self.bin_width = bin_width
+        self.bins = int(math.ceil((high - low) / bin_width))
+        self.counts = [0] * (self.bins + 2)  # [underflow, bins..., overflow]
+        self.count = 0
+
+    def add(self, value):
+        i = int((value - self.low) // self.bin_width) + 1
+        self.counts[min(max(i, 0), self.bins + 1)] += 1
+        self.count += 1
+
+    def bin_edges(self):
+        return [self.low + i * self.bin_width for i in range(self.bins + 1)]
+
+    def percentile(self, q):
+        """Value below which a fraction q of the samples fall (bin midpoint), or None when empty."""
+        if not self.count:
+            return None
+        target = q * self.count
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= target:
+                return self.low + (min(max(i, 1), self.bins) - 0.5) * self.bin_width
+        return self.low + (self.bins - 0.5) * self.bin_width
+
+
+@dataclass
+class MinuteSummary:
+    """Link statistics for one minute of the session."""
+    start: float  # epoch seconds, start of the minute
+    received: int = 0
+    lost: int = 0
+    rssi_sum: float = 0.0
+    rssi_min: float = math.inf
+    rssi_max: float = -math.inf
+    snr_sum: float = 0.0
+    jitter_ms: float = 0.0
+
+    @property
+    def loss_pct(self):
+        total = self.received + self.lost
+        return 100.0 * self.lost / total if total else 0.0
+
+    @property
+    def rssi_mean(self):
+        return self.rssi_sum / self.received if self.received else 0.0
+
+    @property
+    def snr_mean(self):
+        return self.snr_sum / self.received if self.received else 0.0
+
+    def as_row(self):
+        return [self.start, self.received, self.lost, round(self.loss_pct, 2),
+                round(self.rssi_mean, 2), round(self.rssi_min, 2) if self.received else "",
+                round(self.rssi_max, 2) if self.received else "", round(self.snr_mean, 2), round(self.jitter_ms, 1)]
+
+
+MINUTE_SUMMARY_HEADER = ["minute_start", "received", "lost", "loss_pct", "rssi_mean",
+                         "rssi_min", "rssi_max", "snr_mean", "jitter_ms"]
+
+
+class LinkAnalytics:
+    """Incremental link statistics, updated once per received packet."""
+
+    def __init__(self, expected_interval=SEND_INTERVAL):
+        self.expected_interval = expected_interval
+        self.rssi_histogram = StreamingHistogram(-140.0, -20.0, 1.0)
+        self.snr_histogram = StreamingHistogram(-20.0, 15.0, 0.5)
+        self.interval_histogram = StreamingHistogram(0.0, 10.0, 0.1)
+        self.minutes = deque(maxlen=MAX_MINUTE_SUMMARIES)
+        self.unlogged_minutes = deque(maxlen=MAX_MINUTE_SUMMARIES)  # drained by the logger
+        self.reset()
+
+    def reset(self):
+        self.last_arrival = None
+        self.received = 0
+        self.lost = 0
+        self.jitter = 0.0  # s, smoothed |inter-arrival - expected| (RFC 3550 style)
+        self.recent = deque()  # (arrival, lost before it) within LOSS_WINDOW
+        self.recent_lost = 0
+        self.current_minute = None
+
+    def on_packet(self, arrival, rssi, snr):
+        """Account for one packet; returns (packet loss % over LOSS_WINDOW, jitter in ms)."""
+        lost = 0
+        if self.last_arrival is not None:
+            gap = arrival - self.last_arrival
+            self.interval_histogram.add(gap)
+            lost = max(0, int(round(gap / self.expected_interval)) - 1)
+            # Jitter of the arrivals that were not lost
+            deviation = abs(gap - (lost + 1) * self.expected_interval)
+            self.jitter += (deviation - self.jitter) / 16.0
+        self.last_arrival = arrival
+        self.received += 1
+        self.lost += lost
+        self.rssi_histogram.add(rssi)
+        self.snr_histogram.add(snr)
+
+        self.recent.append((arrival, lost))
+        self.recent_lost += lost
+        while self.recent and arrival - self.recent[0][0] > LOSS_WINDOW:
+            self.recent_lost -= self.recent.popleft()[1]
+        total = len(self.recent) + self.recent_lost
+        loss_pct = 100.0 * self.recent_lost / total if total else 0.0
+
+        self._add_to_minute(arrival, lost, rssi, snr)
+        return loss_pct, 1000.0 * self.jitter
+
+    def _add_to_minute(self, arrival, lost, rssi, snr):
+        start = arrival - arrival % 60.0
+        minute = self.current_minute
+        if minute is None or minute.start != start:
+            if minute is not None:
+                self.minutes.append(minute)
+                self.unlogged_minutes.append(minute)
+            minute = self.current_minute = MinuteSummary(start)
+        minute.received += 1
+        minute.lost += lost
+        minute.rssi_sum += rssi
+        minute.rssi_min = min(minute.rssi_min, rssi)
+        minute.rssi_max = max(minute.rssi_max, rssi)
+        minute.snr_sum += snr
+        minute.jitter_ms = 1000.0 * self.jitter
+
+    def drain_minutes(self):
+        """Completed minute summaries not yet handed out (safe to call from another thread)."""
+        drained = []
+        while self.unlogged_minutes:
+            drained.append(self.unlogged_minutes.popleft())
+        return drained
+
+    @property
+    def loss_pct(self):
+        """Packet loss over the whole session."""
+        total = self.received + self.lost
+        return 100.0 * self.lost / total if total else 0.0
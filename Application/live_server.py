@@ -0,0 +1,376 @@
+import asyncio
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import parse_qs, urlsplit
+import numpy as np
+from channel_schema import SCHEMA
+from data_manager import SerialDataManager
+from history_store import SnapshotExpired
+from scrollback import decimate
+
+##############################
+# Live HTTP Server
+##############################
+# A small HTTP server on asyncio, in its own thread, so a browser can follow
+# the car:
+#   /                  a page listing every channel, updated live
+#   /api/latest        the newest sample
+#   /api/channels      channel metadata (name, unit, category, expected range)
+#   /api/history       ?keys=a,b&start=&end= (epoch s) or &seconds=, &points=
+#                      downsampled history (min/max per bucket)
+#   /api/stream        Server-Sent Events, one event per new sample
+# Responses are cached until a new sample arrives (or for good, for history
+# that ends in the past), so many clients polling the same URL cost one
+# encoding per sample. The stream is encoded once per sample and the same
+# bytes are queued to every client; a client that falls too far behind is
+# dropped, and its browser reconnects with Last-Event-ID to catch up. Samples
+# the store no longer holds by then (or overwritten before the broadcast read
+# them) are skipped, and a "gap" event says how many. Each client's last id is
+# recorded, so what its catch-up covered is not sent again.
+#
+# There is no authentication: anyone who can connect sees all telemetry. The
+# server listens on this computer only unless HUST_LIVE_HOST names another
+# address (0.0.0.0 for every interface, so phones on the pit network can
+# connect); only do that on a network you trust.
+
+LIVE_PORT = int(os.environ.get("HUST_LIVE_PORT", "8765"))  # 0 turns the server off
+LIVE_HOST = os.environ.get("HUST_LIVE_HOST", "127.0.0.1")
+POLL_INTERVAL = 0.05      # s between checks for new samples
+HISTORY_SECONDS = 600.0   # default /api/history range, back from the newest sample
+HISTORY_POINTS = 500      # default number of buckets
+MAX_POINTS = 5000
+CACHE_ENTRIES = 256
+CLIENT_QUEUE = 256        # events a stream client may fall behind by before it is dropped
+KEEPALIVE = 15.0          # s between comments on an idle stream
+CATCH_UP_ATTEMPTS = 3     # reads of the missed samples before giving up on them
+
+SCALES = 10.0 ** np.array(SCHEMA.decimals, dtype=np.float64)
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Live telemetry</title>
+<style>body{font-family:sans-serif;margin:8px;background:#e8f0ff;color:#1a206c}
+table{border-collapse:collapse;width:100%}td{padding:4px;border-bottom:1px solid #c5d5f0}
+td.v{text-align:right;font-weight:bold}#age{color:#888}</style></head>
+<body><h3>Live telemetry <span id="age"></span></h3><table id="t"></table>
+<script>
+let channels = {}, last = 0;
+fetch("/api/channels").then(r => r.json()).then(list => {
+  const table = document.getElementById("t");
+  for (const c of list) {
+    channels[c.key] = c;
+    table.insertAdjacentHTML("beforeend", `<tr><td>${c.display_name}</td><td class="v" id="${c.key}">--</td><td>${c.unit}</td></tr>`);
+  }
+  const stream = new EventSource("/api/stream");
+  stream.onmessage = e => {
+    const sample = JSON.parse(e.data);
+    last = sample.timestamp;
+    for (const [key, value] of Object.entries(sample.values)) {
+      const cell = document.getElementById(key);
+      if (cell) cell.textContent = value;
+    }
+  };
+});
+setInterval(() => { if (last) document.getElementById("age").textContent = `(${Math.round(Date.now() / 1000 - last)} s ago)`; }, 1000);
+</script></body></html>
+"""
+
+
+def rounded(rows):
+    """Rows (aligned with SCHEMA.keys) at their declared precision, with None for missing values."""
+    rows = np.rint(rows * SCALES) / SCALES
+    if np.isfinite(rows).all():
+        return rows.tolist()
+    return np.where(np.isfinite(rows), rows, None).tolist()
+
+
+def channel_metadata():
+    return [
+        {"key": field.key, "display_name": field.display_name, "unit": field.unit, "category": field.category,
+         "description": field.description, "max_expected": SerialDataManager.get_max_expected_value(field.key),
+         "thresholds": SCHEMA.thresholds.get(field.key)}
+        for field in SerialDataManager.FIELDS.values()
+    ]
+
+
+def gap_event(missed):
+    """An SSE "gap" event saying `missed` samples (None: an unknown number) will not be sent; empty for none."""
+    if missed is not None and missed <= 0:
+        return b""
+    return f"event: gap\ndata: {json.dumps({'missed': missed})}\n\n".encode()
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class LiveServer:
+    """Serves a reader's latest values, history and live stream over HTTP, from a background thread."""
+
+    def __init__(self, reader, host=LIVE_HOST, port=LIVE_PORT):
+        self.reader = reader
+        self.store = reader.store
+        self.host = host
+        self.port = port
+        self.cache = OrderedDict()  # request target -> (store count it is valid for, or None for good; response)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.clients = {}           # asyncio.Queue per stream client -> id of the last sample queued to it
+        self.sent = None            # sequence number of the next sample broadcast will send
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+
+    ##############################
+    # Thread and loop
+    ##############################
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        return self.server is not None
+
+    def stop(self):
+        if self.loop and self.loop.is_running():
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self.loop)
+        if self.thread:
+            self.thread.join()
+
+    async def _shutdown(self):
+        self.server.close()
+        for queue in list(self.clients):
+            queue.put_nowait(None)  # ends each stream
+        await asyncio.sleep(0.1)
+        self.loop.stop()
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(asyncio.start_server(self.handle, self.host, self.port))
+            self.port = self.server.sockets[0].getsockname()[1]
+            print(f"[DEBUG] Live server on http://{self.host}:{self.port}/")
+        except OSError as e:
+            print(f"[DEBUG] Live server not started: {e}")
+            self.ready.set()
+            return
+        self.ready.set()
+        self.loop.create_task(self.broadcast())
+        try:
+            self.loop.run_forever()
+        finally:
+            tasks = asyncio.all_tasks(self.loop)
+            for task in tasks:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            self.loop.close()
+
+    ##############################
+    # HTTP
+    ##############################
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                request = await reader.readline()
+                if not request:
+                    break
+                method, target, version = request.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                if method != "GET":
+                    writer.write(self.response(405, b'{"error": "only GET is supported"}'))
+                elif urlsplit(target).path == "/api/stream":
+                    await self.stream(writer, headers)
+                    break
+                else:
+                    writer.write(self.get(target))
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close" or version == "HTTP/1.0":
+                    break
+        except (ConnectionError, ValueError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def response(status, body, content_type="application/json", cache="no-cache"):
+        reason = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed"}.get(status, "Error")
+        head = (f"HTTP/1.1 {status} {reason}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                f"Cache-Control: {cache}\r\nAccess-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\n")
+        return head.encode("latin-1") + body
+
+    def get(self, target):
+        """The full response to a GET of `target`, from the cache when still valid."""
+        count = self.store.count
+        entry = self.cache.get(target)
+        if entry is not None and entry[0] in (None, count):
+            self.cache.move_to_end(target)
+            self.cache_hits += 1
+            return entry[1]
+        self.cache_misses += 1
+        url = urlsplit(target)
+        try:
+            body, valid, content_type = self.route(url.path, parse_qs(url.query), count)
+            response = self.response(200, body, content_type, "no-cache" if valid is not None else "max-age=3600")
+        except HttpError as e:
+            return self.response(e.status, json.dumps({"error": str(e)}).encode())
+        except SnapshotExpired as e:
+            return self.response(503, json.dumps({"error": str(e)}).encode())
+        self.cache[target] = (valid, response)
+        while len(self.cache) > CACHE_ENTRIES:
+            self.cache.popitem(last=False)
+        return response
+
+    def route(self, path, query, count):
+        """(body, store count it stays valid for or None for good, content type) for one path."""
+        if path == "/":
+            return PAGE.encode(), None, "text/html; charset=utf-8"
+        if path == "/api/channels":
+            return json.dumps(channel_metadata()).encode(), None, "application/json"
+        if path == "/api/latest":
+            return json.dumps(self.latest(count)).encode(), count, "application/json"
+        if path == "/api/history":
+            body, complete = self.history(query, count)
+            return json.dumps(body).encode(), None if complete else count, "application/json"
+        raise HttpError(404, f"no such path: {path}")
+
+    def latest(self, count):
+        snapshot = self.store.snapshot()
+        timestamps, rows = snapshot.range(count - 1, count)
+        if not len(timestamps):
+            return {"timestamp": None, "values": {}}
+        return {"timestamp": timestamps[0], "values": dict(zip(SCHEMA.keys, rounded(rows)[0]))}
+
+    def history(self, query, count):
+        def number(name, default):
+            try:
+                value = float(query[name][0]) if name in query else default
+            except ValueError:
+                raise HttpError(400, f"{name} must be a number")
+            if not math.isfinite(value):
+                raise HttpError(400, f"{name} must be a finite number")
+            return value
+
+        keys = query["keys"][0].split(",") if "keys" in query else list(SCHEMA.keys)
+        unknown = [key for key in keys if key not in SCHEMA.index]
+        if unknown:
+            raise HttpError(400, f"unknown channels: {', '.join(unknown)}")
+        points = int(min(max(number("points", HISTORY_POINTS), 1), MAX_POINTS))
+        snapshot = self.store.snapshot()
+        newest = snapshot.range(count - 1, count)[0]
+        end = number("end", newest[0] if len(newest) else time.time())
+        start = number("start", end - number("seconds", HISTORY_SECONDS))
+        first, last = snapshot.search(start), snapshot.search(end + 1e-6)
+        timestamps, rows = snapshot.range(first, last, keys)
+        timestamps, rows = decimate(timestamps, rows, points)
+        scales = SCALES[[SCHEMA.index[key] for key in keys]]
+        rows = np.rint(rows * scales) / scales
+        rows = np.where(np.isfinite(rows), rows, None) if not np.isfinite(rows).all() else rows
+        body = {"start": start, "end": end, "timestamps": timestamps.tolist(),
+                "values": {key: rows[:, i].tolist() for i, key in enumerate(keys)}}
+        # A range with samples after it (or a range the store no longer holds from) will not change
+        complete = "end" in query and last < count
+        return body, complete
+
+    ##############################
+    # Server-Sent Events
+    ##############################
+    async def stream(self, writer, headers):
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n"
+                     b"Access-Control-Allow-Origin: *\r\nConnection: keep-alive\r\n\r\nretry: 2000\n\n")
+        queue = asyncio.Queue(CLIENT_QUEUE)
+        # A reconnecting browser gets the samples it missed, if the store still has them
+        last_id = headers.get("last-event-id", "")
+        sent = (self.store.count if self.sent is None else self.sent) - 1
+        if last_id.isdigit():
+            events, caught_up = self.catch_up(int(last_id))
+            writer.write(events)
+            sent = max(sent, caught_up)
+        self.clients[queue] = sent  # broadcast goes on after this id
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), KEEPALIVE)
+                except asyncio.TimeoutError:
+                    event = b": keep-alive\n\n"
+                if event is None:
+                    break  # fell behind
+                writer.write(event)
+                await writer.drain()
+        finally:
+            self.clients.pop(queue, None)
+
+    def catch_up(self, last_id):
+        """
+        Events for the samples after `last_id` that the store still holds (at
+        most CLIENT_QUEUE), after a "gap" event if older ones are gone, and the
+        id of the last sample they cover.
+        """
+        last_id = min(last_id, self.store.count - 1)  # an id from before a restart: start afresh
+        skip = 0
+        for _ in range(CATCH_UP_ATTEMPTS):
+            snapshot = self.store.snapshot()
+            first = max(last_id + 1, snapshot.first() + skip, snapshot.count - CLIENT_QUEUE)
+            try:
+                first, events = self.events(snapshot, first, snapshot.count)
+            except SnapshotExpired:
+                # Overwritten while reading: start again after the oldest sample held now,
+                # whose slot is the next one the writer takes
+                skip = 1
+                continue
+            return gap_event(first - last_id - 1) + b"".join(events), max(last_id, snapshot.count - 1)
+        return gap_event(None), self.store.count - 1
+
+    def events(self, snapshot, first, last):
+        """(first sequence number, SSE event per sample) for samples first..last-1, with the numbers as ids."""
+        if last <= first:
+            return last, []
+        timestamps, rows = snapshot.range(first, last)
+        first = last - len(timestamps)
+        return first, [
+            f"id: {first + i}\ndata: {json.dumps({'timestamp': timestamp, 'values': dict(zip(SCHEMA.keys, row))})}\n\n".encode()
+            for i, (timestamp, row) in enumerate(zip(timestamps.tolist(), rounded(rows)))
+        ]
+
+    async def broadcast(self):
+        """
+        Encode each new sample once and queue it to every stream client,
+        skipping the samples a client already has (from its catch-up) and
+        preceded by a "gap" event for those it will never get.
+        """
+        self.sent = self.store.count
+        while True:
+            await asyncio.sleep(POLL_INTERVAL)
+            count = self.store.count
+            if count == self.sent:
+                continue
+            snapshot = self.store.snapshot()
+            try:
+                first, events = self.events(snapshot, max(self.sent, snapshot.first(), count - CLIENT_QUEUE), count)
+            except SnapshotExpired:
+                first, events = count, []  # overwritten while reading: reported as a gap
+            shared = b"".join(events)
+            self.sent = count
+            for queue, last_id in list(self.clients.items()):
+                if last_id >= count - 1:
+                    continue
+                if queue.full():
+                    queue.get_nowait()
+                    queue.put_nowait(None)  # drop the client; its browser reconnects and catches up
+                    self.clients.pop(queue, None)
+                    continue
+                skip = last_id + 1 - first
+                queue.put_nowait(gap_event(first - last_id - 1) + (b"".join(events[skip:]) if skip > 0 else shared))
+                self.clients[queue] = count - 1
@@ -0,0 +1,340 @@
+"""
+Offline analytics over logged telemetry (can_data_log*.csv, imported SD-card
+logs): per-session energy, temperatures, time outside the alert limits, speed
+distribution and data quality.
+
+Files are cut into byte-range chunks that worker processes parse and reduce
+with NumPy on their own, so memory stays bounded by the chunk size however
+large the logs are. Each chunk comes back as partial session aggregates, which
+are merged in time order; a session ends where the log has a gap of more than
+--session-gap seconds.
+
+Usage (from the Application folder):
+    python log_analytics.py can_data_log.csv
+    python log_analytics.py logs/ imported/ --workers 8 --csv summary.csv
+"""
+import argparse
+import csv
+import datetime
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from channel_schema import SCHEMA
+from link_analytics import SEND_INTERVAL
+
+CHUNK_BYTES = 32 * 1024 * 1024
+SESSION_GAP = 300.0       # s without samples that ends a session
+GAP_FACTOR = 3.0          # a step longer than this many send intervals counts as a data gap
+STUCK_RUN = 60            # identical consecutive samples before a channel counts as stuck
+SPEED_BINS = np.arange(0.0, 160.0, 20.0)  # km/h, last bin open-ended
+
+TEMPERATURE_KEYS = [channel.key for channel in SCHEMA.channels if channel.unit == "°C"]
+
+
+class SessionAggregate:
+    """Mergeable statistics for a run of samples without a session gap."""
+
+    def __init__(self, keys, timestamps, values):
+        n, c = values.shape
+        self.keys = list(keys)
+        self.index = {key: i for i, key in enumerate(self.keys)}
+        self.samples = n
+        self.first_ts, self.last_ts = float(timestamps[0]), float(timestamps[-1])
+        self.first_row, self.last_row = values[0].copy(), values[-1].copy()
+
+        finite = np.isfinite(values)
+        self.count = finite.sum(axis=0)
+        self.missing = n - self.count
+        self.total = np.where(finite, values, 0.0).sum(axis=0)
+        self.minimum = np.where(finite, values, np.inf).min(axis=0)
+        self.maximum = np.where(finite, values, -np.inf).max(axis=0)
+
+        # Runs of identical values, with the runs at either end kept for merging
+        self.start_run = np.zeros(c, dtype=np.int64)
+        self.end_run = np.zeros(c, dtype=np.int64)
+        self.longest_run = np.zeros(c, dtype=np.int64)
+        for j in range(c):
+            edges = np.flatnonzero(values[1:, j] != values[:-1, j]) + 1
+            bounds = np.concatenate(([0], edges, [n]))
+            runs = np.diff(bounds)
+            self.start_run[j], self.end_run[j], self.longest_run[j] = runs[0], runs[-1], runs.max()
+
+        dt = np.diff(timestamps)
+        self.gaps = int(np.count_nonzero(dt > GAP_FACTOR * SEND_INTERVAL))
+
+        # Energy (Wh) by the trapezoidal rule
+        self.energy_out = self.energy_in = self.solar = 0.0
+        power = self._power(values)
+        if power is not None:
+            self.energy_out = _trapezoid(np.maximum(power, 0.0), dt)
+            self.energy_in = _trapezoid(np.maximum(-power, 0.0), dt)
+        solar = self._column(values, "MPPT_total_watt")
+        if solar is not None:
+            self.solar = _trapezoid(np.nan_to_num(solar), dt)
+
+        # Seconds outside the critical limits (each sample holds until the next)
+        self.threshold_keys = [key for key in SCHEMA.thresholds if key in self.index]
+        self.time_outside = np.zeros(len(self.threshold_keys))
+        for i, key in enumerate(self.threshold_keys):
+            self.time_outside[i] = float(np.dot(self._outside(key, values[:-1]), dt))
+
+        speed = self._column(values, "velocity")
+        self.speed_counts = np.zeros(len(SPEED_BINS), dtype=np.int64)
+        if speed is not None:
+            speed = speed[np.isfinite(speed)]
+            self.speed_counts = np.bincount(np.clip(np.searchsorted(SPEED_BINS, speed, side="right") - 1,
+                                                    0, len(SPEED_BINS) - 1), minlength=len(SPEED_BINS))
+
+    def _column(self, values, key):
+        i = self.index.get(key)
+        return None if i is None else values[..., i]
+
+    def _power(self, values):
+        volt, current = self._column(values, "battery_volt"), self._column(values, "battery_current")
+        if volt is None or current is None:
+            return None
+        return np.nan_to_num(volt * current)
+
+    def _outside(self, key, values):
+        limits = SCHEMA.thresholds[key]
+        column = self._column(values, key)
+        with np.errstate(invalid="ignore"):
+            return ((column < limits["min"]) | (column > limits["max"])).astype(float)
+
+    def merge(self, other):
+        """Append `other`, the next run of samples of the same session."""
+        step = other.first_ts - self.last_ts
+        pair = np.vstack([self.last_row, other.first_row])
+        dt = np.array([step])
+        power = self._power(pair)
+        if power is not None:
+            self.energy_out += other.energy_out + _trapezoid(np.maximum(power, 0.0), dt)
+            self.energy_in += other.energy_in + _trapezoid(np.maximum(-power, 0.0), dt)
+        solar = self._column(pair, "MPPT_total_watt")
+        if solar is not None:
+            self.solar += other.solar + _trapezoid(np.nan_to_num(solar), dt)
+        for i, key in enumerate(self.threshold_keys):
+            self.time_outside[i] += other.time_outside[i] + self._outside(key, self.last_row) * step
+        self.gaps += other.gaps + int(step > GAP_FACTOR * SEND_INTERVAL)
+
+        joined = self.last_row == other.first_row
+        across = self.end_run + other.start_run
+        self.longest_run = np.maximum.reduce([self.longest_run, other.longest_run, np.where(joined, across, 0)])
+        whole_self = self.start_run == self.samples
+        whole_other = other.end_run == other.samples
+        self.start_run = np.where(joined & whole_self, across, self.start_run)
+        self.end_run = np.where(joined & whole_other, across, other.end_run)
+
+        self.samples += other.samples
+        self.count += other.count
+        self.missing += other.missing
+        self.total += other.total
+        self.minimum = np.minimum(self.minimum, other.minimum)
+        self.maximum = np.maximum(self.maximum, other.maximum)
+        self.speed_counts += other.speed_counts
+        self.last_ts, self.last_row = other.last_ts, other.last_row
+
+    def mean(self, key):
+        i = self.index[key]
+        return self.total[i] / self.count[i] if self.count[i] else float("nan")
+
+    def summary(self):
+        """Flat dict of the session's headline figures."""
+        row = {
+            "start": _format_time(self.first_ts),
+            "end": _format_time(self.last_ts),
+            "duration_s": round(self.last_ts - self.first_ts),
+            "samples": self.samples,
+            "gaps": self.gaps,
+            "energy_used_wh": round(self.energy_out, 2),
+            "energy_regen_wh": round(self.energy_in, 2),
+            "energy_solar_wh": round(self.solar, 2),
+        }
+        if "distance_travelled" in self.index:
+            i = self.index["distance_travelled"]
+            row["distance_km"] = round(float(self.maximum[i] - self.minimum[i]), 3) if self.count[i] else 0.0
+        if "velocity" in self.index:
+            row["speed_avg"] = round(self.mean("velocity"), 2)
+            row["speed_max"] = round(float(self.maximum[self.index["velocity"]]), 2)
+        for key in TEMPERATURE_KEYS:
+            if key in self.index:
+                row[f"{key}_max"] = round(float(self.maximum[self.index[key]]), 2)
+                row[f"{key}_avg"] = round(self.mean(key), 2)
+        for key, seconds in zip(self.threshold_keys, self.time_outside):
+            row[f"{key}_outside_s"] = round(float(seconds))
+        return row
+
+    def quality(self):
+        """(key, missing %, longest run) for channels with missing data or stuck values."""
+        flagged = []
+        for i, key in enumerate(self.keys):
+            missing = 100.0 * self.missing[i] / self.samples
+            if 0 < missing or (self.longest_run[i] >= STUCK_RUN and self.count[i]):
+                flagged.append((key, missing, int(self.longest_run[i])))
+        return flagged
+
+
+def _trapezoid(power, dt):
+    return float(np.dot((power[1:] + power[:-1]) * 0.5, dt)) / 3600.0
+
+
+def _format_time(timestamp):
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
+
+##############################
+# Chunked reading (runs in the workers)
+##############################
+def read_chunk(path, start, end):
+    """The complete lines starting in [start, end) of a file."""
+    with open(path, "rb") as f:
+        if start:
+            f.seek(start - 1)
+            f.readline()  # the rest of a line that started in the previous chunk
+        position = f.tell()
+        if position >= end:
+            return b""
+        data = f.read(end - position)
+        if data and not data.endswith(b"\n"):
+            data += f.readline()
+    return data
+
+
+def parse_chunk(data, columns):
+    """Parse CSV lines into (epoch seconds, to the millisecond; values with NaN for blanks). Malformed lines are dropped."""
+    data = data.replace(b"\r", b"").replace(b",,", b",nan,").replace(b",,", b",nan,").replace(b",\n", b",nan\n")
+    if data.endswith(b","):
+        data += b"nan"
+    rows = [line.split(b",") for line in data.split(b"\n")]
+    rows = [row for row in rows if len(row) == columns + 1 and not row[0].startswith(b"timestamp")]
+    try:
+        timestamps = np.array([row[0].decode() for row in rows], dtype="datetime64[ms]")
+        values = np.array([row[1:] for row in rows], dtype=np.float64).reshape(len(rows), columns)
+    except ValueError:
+        good_times, good_values = [], []
+        for row in rows:
+            try:
+                good_times.append(np.datetime64(row[0].decode(), "ms"))
+                good_values.append([float(v) for v in row[1:]])
+            except ValueError:
+                continue
+        timestamps = np.array(good_times, dtype="datetime64[ms]")
+        values = np.array(good_values, dtype=np.float64).reshape(len(good_values), columns)
+    return timestamps.astype(np.int64) / 1000.0, values
+
+
+def analyse_chunk(path, keys, start, end, session_gap):
+    """Reduce one chunk to its session aggregates (in time order). Returns (aggregates, bytes read)."""
+    data = read_chunk(path, start, end)
+    timestamps, values = parse_chunk(data, len(keys))
+    aggregates = []
+    if len(timestamps):
+        # Split where the log pauses (or time jumps backwards, e.g. appended runs)
+        step = np.diff(timestamps)
+        cuts = np.flatnonzero((step > session_gap) | (step < 0)) + 1
+        for lo, hi in zip(np.concatenate(([0], cuts)), np.concatenate((cuts, [len(timestamps)]))):
+            aggregates.append(SessionAggregate(keys, timestamps[lo:hi], values[lo:hi]))
+    return aggregates, len(data)
+
+
+##############################
+# Driver
+##############################
+def find_logs(paths):
+    """CSV files named directly or found in the given folders."""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "*.csv"))))
+        else:
+            files.extend(sorted(glob.glob(path)))
+    return files
+
+
+def analyse(paths, workers=None, chunk_bytes=CHUNK_BYTES, session_gap=SESSION_GAP):
+    """Analyse every log; returns ([(file, SessionAggregate)], bytes processed)."""
+    tasks = []
+    for path in find_logs(paths):
+        with open(path, "r", newline="") as f:
+            header = next(csv.reader(f), [])
+        if not header or header[0].lower() != "timestamp":
+            print(f"[DEBUG] Skipping {path}: no header")
+            continue
+        size = os.path.getsize(path)
+        for start in range(0, size, chunk_bytes):
+            tasks.append((path, header[1:], start, min(start + chunk_bytes, size)))
+
+    sessions = []
+    processed = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(analyse_chunk, path, keys, start, end, session_gap)
+                   for path, keys, start, end in tasks]
+        # Chunks come back in file order, so sessions can be stitched as they arrive
+        for (path, keys, _, _), future in zip(tasks, futures):
+            aggregates, size = future.result()
+            processed += size
+            for aggregate in aggregates:
+                if sessions and sessions[-1][0] == path:
+                    current = sessions[-1][1]
+                    if 0 <= aggregate.first_ts - current.last_ts <= session_gap:
+                        current.merge(aggregate)
+                        continue
+                sessions.append((path, aggregate))
+    return sessions, processed
+
+
+def print_session(path, session):
+    summary = session.summary()
+    hours, rest = divmod(summary["duration_s"], 3600)
+    print(f"{os.path.basename(path)}: {summary['start']} - {summary['end']} "
+          f"({hours}h{rest // 60:02d}m, {summary['samples']} samples, {summary['gaps']} gaps)")
+    print(f"  energy: used {summary['energy_used_wh']:.1f} Wh, regen {summary['energy_regen_wh']:.1f} Wh, "
+          f"solar {summary['energy_solar_wh']:.1f} Wh "
+          f"(net {summary['energy_solar_wh'] + summary['energy_regen_wh'] - summary['energy_used_wh']:.1f} Wh)")
+    if "speed_avg" in summary:
+        total = session.speed_counts.sum() or 1
+        bins = ", ".join(f"{int(low)}+: {100.0 * count / total:.0f}%"
+                         for low, count in zip(SPEED_BINS, session.speed_counts) if count)
+        print(f"  speed: avg {summary['speed_avg']:.1f} km/h, max {summary['speed_max']:.1f} km/h, "
+              f"distance {summary.get('distance_km', 0.0):.2f} km; {bins}")
+    temperatures = [f"{key} {summary[f'{key}_max']:.1f}/{summary[f'{key}_avg']:.1f}"
+                    for key in TEMPERATURE_KEYS if f"{key}_max" in summary]
+    if temperatures:
+        print(f"  temperatures max/avg (°C): {', '.join(temperatures)}")
+    outside = [f"{key} {seconds:.0f} s" for key, seconds in zip(session.threshold_keys, session.time_outside) if seconds]
+    print(f"  outside limits: {', '.join(outside) or 'none'}")
+    flagged = session.quality()
+    if flagged:
+        print("  data quality: " + ", ".join(f"{key} ({missing:.0f}% missing, run {run})"
+                                              for key, missing, run in flagged))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise logged telemetry per session.")
+    parser.add_argument("paths", nargs="+", help="CSV log files, globs or folders")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--chunk-mb", type=float, default=CHUNK_BYTES / 2 ** 20,
+                        help="chunk size per task in MB (bounds memory per worker)")
+    parser.add_argument("--session-gap", type=float, default=SESSION_GAP,
+                        help="seconds without samples that end a session (default: 300)")
+    parser.add_argument("--csv", help="also write one summary row per session to this file")
+    args = parser.parse_args()
+
+    began = time.perf_counter()
+    sessions, processed = analyse(args.paths, args.workers, int(args.chunk_mb * 2 ** 20), args.session_gap)
+    elapsed = time.perf_counter() - began
+
+    for path, session in sessions:
+        print_session(path, session)
+    if args.csv and sessions:
+        rows = [dict(file=os.path.basename(path), **session.summary()) for path, session in sessions]
+        fields = list(dict.fromkeys(field for row in rows for field in row))
+        with open(args.csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    gigabytes = processed / 1e9
+    print(f"{len(sessions)} sessions, {processed / 1e6:.1f} MB in {elapsed:.2f} s with {args.workers} workers"
+          + (f": {elapsed / gigabytes:.1f} s/GB" if gigabytes else ""))
@@ -0,0 +1,120 @@
+import math
+import random
+from link_analytics import LinkAnalytics, SEND_INTERVAL
+
+##############################
+# LoRa Link Model
+##############################
+# Time on air and demodulation limits of the SX127x radios for each spreading
+# factor / bandwidth setting, and a simulator of the car-to-pit link built on
+# them. The simulator lets the data-rate controller be evaluated offline: a car
+# drives away from and back to the receiver, the path loss follows a
+# log-distance model with correlated shadowing, and every packet is delivered
+# with a probability that depends on how far its SNR is above the limit of its
+# spreading factor.
+
+SPREADING_FACTORS = (7, 8, 9, 10, 11, 12)  # SF6 needs implicit headers, which the firmware does not use
+BANDWIDTHS = (62500, 125000, 250000)
+SETTINGS = [(sf, bw) for sf in SPREADING_FACTORS for bw in BANDWIDTHS]
+DEFAULT_SETTING = (7, 125000)  # setupLoRa() in both firmwares
+
+# Lowest SNR (dB) each spreading factor can demodulate (SX1276 datasheet)
+SNR_LIMIT = {7: -7.5, 8: -10.0, 9: -12.5, 10: -15.0, 11: -17.5, 12: -20.0}
+NOISE_FIGURE = 6.0   # dB, receiver
+TX_POWER = 17.0      # dBm, LoRa library default
+PAYLOAD_BYTES = 120  # typical length of the text payload
+PREAMBLE_SYMBOLS = 8
+DOWNLINK_REPEATS = 3  # the receiver sends each PARAM command this many times
+
+
+def airtime(sf, bw, payload_bytes=PAYLOAD_BYTES, coding_rate=1, preamble=PREAMBLE_SYMBOLS):
+    """Time on air in seconds of one packet (explicit header, CRC on), per the SX127x datasheet."""
+    symbol = (2 ** sf) / bw
+    low_data_rate = 1 if symbol > 0.016 else 0
+    payload_symbols = 8 + max(math.ceil((8 * payload_bytes - 4 * sf + 28 + 16)
+                                        / (4 * (sf - 2 * low_data_rate))) * (coding_rate + 4), 0)
+    return (preamble + 4.25 + payload_symbols) * symbol
+
+
+def noise_floor(bw):
+    """Thermal noise plus receiver noise figure over the bandwidth, in dBm."""
+    return -174.0 + 10.0 * math.log10(bw) + NOISE_FIGURE
+
+
+def packet_rate(sf, bw, send_interval=SEND_INTERVAL, payload_bytes=PAYLOAD_BYTES):
+    """Packets per second the sender manages: one per send interval, unless a packet takes longer to transmit."""
+    return 1.0 / max(send_interval, airtime(sf, bw, payload_bytes))
+
+
+def delivery_probability(snr, sf):
+    """Chance that a packet received at `snr` dB is decoded; 50 % at the SF's limit, ~95 % 3 dB above it."""
+    margin = snr - SNR_LIMIT[sf]
+    return 1.0 / (1.0 + math.exp(-margin))
+
+
+def track_distance(t, near=100.0, far=1200.0, lap_time=600.0):
+    """Distance (m) from the receiver of a car driving laps that take it from `near` out to `far` and back."""
+    return near + (far - near) * 0.5 * (1.0 - math.cos(2.0 * math.pi * t / lap_time))
+
+
+class LinkSimulator:
+    """Simulates the telemetry link for a given controller (or a fixed setting)."""
+
+    def __init__(self, distance=track_distance, seed=1, path_loss_exponent=3.5, reference_loss=40.0,
+                 shadowing_db=4.0, shadowing_time=20.0, send_interval=SEND_INTERVAL):
+        self.distance = distance
+        self.seed = seed
+        self.path_loss_exponent = path_loss_exponent
+        self.reference_loss = reference_loss  # dB at 1 m
+        self.shadowing_db = shadowing_db
+        self.shadowing_time = shadowing_time  # s, correlation time of the shadowing
+        self.send_interval = send_interval
+
+    def rssi(self, t, shadowing):
+        path_loss = self.reference_loss + 10.0 * self.path_loss_exponent * math.log10(max(self.distance(t), 1.0))
+        return TX_POWER - path_loss + shadowing
+
+    def run(self, duration, controller=None, setting=DEFAULT_SETTING):
+        """
+        Simulate `duration` seconds. With a controller, its commands are sent
+        as downlinks (which can be lost like any packet); otherwise `setting`
+        is used throughout. Returns a dict with sent, delivered, loss_pct,
+        throughput (delivered packets/s) and the number of setting changes.
+        """
+        rng = random.Random(self.seed)
+        sender = receiver = setting if controller is None else controller.setting
+        link = LinkAnalytics()
+        link.expected_interval = 1.0 / packet_rate(*sender, self.send_interval)
+        shadowing = 0.0
+        t = 0.0
+        sent = delivered = changes = 0
+        while t < duration:
+            period = max(self.send_interval, airtime(*sender))
+            decay = math.exp(-period / self.shadowing_time)
+            shadowing = shadowing * decay + rng.gauss(0.0, self.shadowing_db * math.sqrt(1.0 - decay ** 2))
+            rssi = self.rssi(t, shadowing)
+            snr = min(rssi - noise_floor(sender[1]), 10.0)  # the radio's SNR reading saturates
+            sent += 1
+            if sender == receiver and rng.random() < delivery_probability(snr, sender[0]):
+                delivered += 1
+                link.on_packet(t, rssi, snr)
+                if controller is not None:
+                    controller.on_packet(t, rssi, snr)
+            if controller is not None:
+                command = controller.poll(t)
+                if command is not None:
+                    changes += 1
+                    # The downlink goes out on the receiver's current setting, then the receiver switches
+                    lost = (1.0 - delivery_probability(snr, receiver[0])) ** DOWNLINK_REPEATS
+                    if receiver == sender and rng.random() >= lost:
+                        sender = command
+                    receiver = command
+                    link.expected_interval = 1.0 / packet_rate(*command, self.send_interval)
+            t += period
+        return {
+            "sent": sent,
+            "delivered": delivered,
+            "loss_pct": 100.0 * (sent - delivered) / sent if sent else 0.0,
+            "throughput": delivered / duration,
+            "changes": changes,
+        }
@@ -3,21 +3,30 @@ from PyQt5.QtWidgets import QApplication
 from plot_app import PlotApp
 from serial_reader import SerialReader
 from mock_serial_reader import MockSerialReader
-# from widget.loading_screen_widget import LoadingScreen
 
 if __name__ == "__main__":
     use_mock = True # Change to True if you want to use fake data for testing
     serial_reader = MockSerialReader() if use_mock else SerialReader()
     app = QApplication(sys.argv)
-    # Show the loading screen first
-    # loading_screen = LoadingScreen("assets/HUST_big_logo.png")
-    # loading_screen.show()
-    # loading_screen.exec_()  # Block until the loading screen is closed
     main_window = PlotApp(serial_reader)
     main_window.showMaximized()
+    # Latest values, history and a live stream over HTTP (on this computer only,
+    # unless HUST_LIVE_HOST opens it to the pit network); imported once the
+    # window shows, as it pulls in asyncio
+    from live_server import LiveServer, LIVE_PORT
+    live_server = LiveServer(serial_reader)
+    if LIVE_PORT:
+        live_server.start()
+    # The graphs and the recovered history are loaded after the window shows;
+    # the reader starts once they are in place.
     if not use_mock:
-        serial_reader.start()
+        main_window.startupFinished.connect(serial_reader.start)
     try:
         sys.exit(app.exec_())
     finally:
+        live_server.stop()
+        main_window.port_monitor.stop()
+        main_window.outbox_sync.stop()
+        serial_reader.range_refit.stop()
         serial_reader.stop()
+        serial_reader.store.close()
@@ -2,12 +2,16 @@ import random
 import math
 from PyQt5.QtCore import pyqtSignal, QObject
 from base_serial_reader import BaseSerialReader
+from sample import read_measured
+from sample_batch import SampleBatch
 
 ##############################
 # Mock Serial Reader (for testing)
 ##############################
 class MockSerialReader(QObject, BaseSerialReader):
-    dataReceived = pyqtSignal()
+    # Never emitted: the GUI draws mock samples from its own timer and does not log or upload them
+    samplesReceived = pyqtSignal(SampleBatch)
+    alertRaised = pyqtSignal(object)  # AlertEvent, raised or cleared
 
     def __init__(self):
         QObject.__init__(self)
@@ -39,34 +43,14 @@ class MockSerialReader(QObject, BaseSerialReader):
         self.MPPT3_watt = 0.0
         self.MPPT_total_watt = 0.0
         self.rssi = -70.0  # Signal strength in dBm
+        self.snr = 9.0  # Signal-to-noise ratio in dB
 
-        self.latest_values = {
-            "velocity": self.velocity,
-            "distance_travelled": self.distance_travelled,
-            "battery_volt": self.battery_volt,
-            "battery_current": self.battery_current,
-            "battery_cell_LOW_volt": self.battery_cell_LOW_volt,
-            "battery_cell_HIGH_volt": self.battery_cell_HIGH_volt,
-            "battery_cell_AVG_volt": self.battery_cell_AVG_volt,
-            "battery_cell_LOW_temp": self.battery_cell_LOW_temp,
-            "battery_cell_HIGH_temp": self.battery_cell_HIGH_temp,
-            "battery_cell_AVG_temp": self.battery_cell_AVG_temp,
-            "battery_cell_ID_HIGH_temp": self.battery_cell_ID_HIGH_temp,
-            "battery_cell_ID_LOW_temp": self.battery_cell_ID_LOW_temp,
-            "BMS_temp": self.BMS_temp,
-            "motor_current": self.motor_current,
-            "motor_temp": self.motor_temp,
-            "motor_controller_temp": self.motor_controller_temp,
-            "MPPT1_watt": self.MPPT1_watt,
-            "MPPT2_watt": self.MPPT2_watt,
-            "MPPT3_watt": self.MPPT3_watt,
-            "MPPT_total_watt": self.MPPT_total_watt,
-            "rssi": self.rssi
-        }
-        # Populate the history with the initial values.
-        for key, value in self.latest_values.items():
-            self.history[key].pop(0)
-            self.history[key].append(value)
+        # Show the initial values, without storing them: finish_startup may still
+        # load older samples from the log, and the history must stay in time order.
+        self.latest_values.assign(read_measured(self))
+
+    def on_alert(self, event):
+        self.alertRaised.emit(event)
 
     def start(self):
         # No action needed for the mock.
@@ -185,31 +169,12 @@ class MockSerialReader(QObject, BaseSerialReader):
             rssi_variation = random.uniform(-8, 2)  # Improving signal when slowing down
         
         self.rssi = base_rssi + rssi_variation
+        # SNR follows RSSI down towards the noise floor
+        self.snr = min(12.0, (self.rssi + 120.0) / 5.0 + random.uniform(-1.5, 1.5))
+
+        # Occasionally lose a packet (more often with a weak signal)
+        if random.random() < (0.01 if self.rssi > -75.0 else 0.05):
+            return
 
-        self.latest_values = {
-            "velocity": self.velocity,
-            "distance_travelled": self.distance_travelled,
-            "battery_volt": self.battery_volt,
-            "battery_current": self.battery_current,
-            "battery_cell_LOW_volt": self.battery_cell_LOW_volt,
-            "battery_cell_HIGH_volt": self.battery_cell_HIGH_volt,
-            "battery_cell_AVG_volt": self.battery_cell_AVG_volt,
-            "battery_cell_LOW_temp": self.battery_cell_LOW_temp,
-            "battery_cell_HIGH_temp": self.battery_cell_HIGH_temp,
-            "battery_cell_AVG_temp": self.battery_cell_AVG_temp,
-            "battery_cell_ID_HIGH_temp": self.battery_cell_ID_HIGH_temp,
-            "battery_cell_ID_LOW_temp": self.battery_cell_ID_LOW_temp,
-            "BMS_temp": self.BMS_temp,
-            "motor_current": self.motor_current,
-            "motor_temp": self.motor_temp,
-            "motor_controller_temp": self.motor_controller_temp,
-            "MPPT1_watt": self.MPPT1_watt,
-            "MPPT2_watt": self.MPPT2_watt,
-            "MPPT3_watt": self.MPPT3_watt,
-            "MPPT_total_watt": self.MPPT_total_watt,
-            "rssi": self.rssi
-        }
-        # Update the history arrays for each variable.
-        for key, value in self.latest_values.items():
-            self.history[key].pop(0)
-            self.history[key].append(value)
+        # Update latest values, derived channels and history.
+        self.store_sample(read_measured(self))
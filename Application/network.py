@@ -1,86 +1,125 @@
-import pymysql
-import pymysql.cursors
-
-# ==========================
-# Database Credentials
-# ==========================
-DB_HOST = "194.47.13.187"
-DB_USER = "remoteuser"
-DB_PASSWORD = "mhsRuS84s6K6baslP9G7LGH"
-DB_NAME = "Hust"
-
-# ==========================
-# Database Connection Function
-# ==========================
-def connect_db():
-    return pymysql.connect(
-        host=DB_HOST,
-        user=DB_USER,
-        password=DB_PASSWORD,
-        database=DB_NAME,
-        cursorclass=pymysql.cursors.DictCursor
-    )
-
-# ==========================
-# Insert Data into MySQL
-# ==========================
-def insert_into_db(latest_values):
-    """Inserts the latest values into the corresponding database tables."""
-    conn = connect_db()
-    try:
-        with conn.cursor() as cursor:
-            # Battery Data Table
-            cursor.execute("""
-                INSERT INTO `Battery Data Table`
-                (timestamp, battery_volt, battery_current, battery_cell_low_volt, battery_cell_high_volt, battery_cell_average_volt,
-                 battery_cell_low_temp, battery_cell_high_temp, battery_cell_average_temp)
-                VALUES (NOW(), %s, %s, %s, %s, %s, %s, %s, %s)
-            """, (
-                latest_values["battery_volt"],
-                latest_values["battery_current"],
-                latest_values["battery_cell_LOW_volt"],
-                latest_values["battery_cell_HIGH_volt"],
-                latest_values["battery_cell_AVG_volt"],
-                latest_values["battery_cell_LOW_temp"],
-                latest_values["battery_cell_HIGH_temp"],
-                latest_values["battery_cell_AVG_temp"]
-            ))
-
-            # Motor Data Table
-            cursor.execute("""
-                INSERT INTO `Motor Data Table`
-                (timestamp, motor_current, motor_temp, motor_controller_temp)
-                VALUES (NOW(), %s, %s, %s)
-            """, (
-                latest_values["motor_current"],
-                latest_values["motor_temp"],
-                latest_values["motor_controller_temp"]
-            ))
-
-            # MPPT Data Table
-            cursor.execute("""
-                INSERT INTO `MPPT Data Table`
-                (timestamp, MPPT1_watt, MPPT2_watt, MPPT3_watt, MPPT_total_watt)
-                VALUES (NOW(), %s, %s, %s, %s)
-            """, (
-                latest_values["MPPT1_watt"],
-                latest_values["MPPT2_watt"],
-                latest_values["MPPT3_watt"],
-                latest_values["MPPT_total_watt"]
-            ))
-
-            # Vehicle Data Table
-            cursor.execute("""
-                INSERT INTO `Vehicle Data Table`
-                (timestamp, velocity, distance_travelled)
-                VALUES (NOW(), %s, %s)
-            """, (
-                latest_values["velocity"],
-                latest_values["distance_travelled"]
-            ))
-
-        conn.commit()
-    except pymysql.MySQLError as e:
-        print("❌ MySQL Error:", e)
-    finally:
-        conn.close()
\ No newline at end of file
+# pymysql is imported on first use, so starting the dashboard does not wait for it
+from channel_schema import SCHEMA
+
+# ==========================
+# Database Credentials
+# ==========================
+DB_HOST = "194.47.13.187"
+DB_USER = "remoteuser"
+DB_PASSWORD = "mhsRuS84s6K6baslP9G7LGH"
+DB_NAME = "Hust"
+
+ALERT_INSERT = """
+    INSERT INTO `Alert Table`
+    (timestamp, rule, channel, value, state, severity)
+    VALUES (FROM_UNIXTIME(%s), %s, %s, %s, %s, %s)
+"""
+
+# ==========================
+# Database Connection Function
+# ==========================
+def connect_db():
+    import pymysql.cursors
+    return pymysql.connect(
+        host=DB_HOST,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        database=DB_NAME,
+        cursorclass=pymysql.cursors.DictCursor
+    )
+
+# ==========================
+# Bulk Insert into MySQL
+# ==========================
+def bulk_insert_into_db(rows, timestamps, batch_size=5000):
+    """
+    Inserts many samples (rows aligned with SCHEMA.keys, with their epoch
+    timestamps) over one connection, `batch_size` rows per statement batch.
+    Returns the number of samples inserted.
+    """
+    import pymysql
+    try:
+        conn = connect_db()
+    except pymysql.MySQLError as e:
+        print("❌ MySQL Error:", e)
+        return 0
+    inserted = 0
+    try:
+        with conn.cursor() as cursor:
+            for start in range(0, len(rows), batch_size):
+                batch = list(zip(timestamps[start:start + batch_size], rows[start:start + batch_size]))
+                for sql, columns in SCHEMA.db_inserts_at:
+                    cursor.executemany(sql, [[timestamp] + [row[i] for i in columns] for timestamp, row in batch])
+                conn.commit()
+                inserted += len(batch)
+    except pymysql.MySQLError as e:
+        print("❌ MySQL Error:", e)
+    finally:
+        conn.close()
+    return inserted
+
+# ==========================
+# Outbox Tables
+# ==========================
+def create_outbox_tables():
+    """Creates the tables upload_outbox writes to besides the channel tables, if missing."""
+    conn = connect_db()
+    try:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS `Uploaded Samples`
+                (sample_id CHAR(32) PRIMARY KEY)
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS `Alert Table` (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    timestamp DATETIME NOT NULL,
+                    rule VARCHAR(64) NOT NULL,
+                    channel VARCHAR(64) NOT NULL,
+                    value DOUBLE,
+                    state VARCHAR(16) NOT NULL,
+                    severity VARCHAR(16) NOT NULL
+                )
+            """)
+        conn.commit()
+    finally:
+        conn.close()
+
+# ==========================
+# Upload Outbox Batch
+# ==========================
+def upload_outbox(entries):
+    """
+    Inserts a batch of outbox entries (outbox.Entry) in one transaction,
+    skipping those whose sample id the server already has, so a batch can be
+    sent again after a lost acknowledgement. The tables must exist
+    (create_outbox_tables). Raises pymysql.MySQLError on failure. Returns the
+    number of entries inserted.
+    """
+    conn = connect_db()
+    try:
+        with conn.cursor() as cursor:
+            placeholders = ", ".join(["%s"] * len(entries))
+            cursor.execute(f"SELECT sample_id FROM `Uploaded Samples` WHERE sample_id IN ({placeholders})",
+                           [entry.sample_id for entry in entries])
+            stored = {row["sample_id"] for row in cursor.fetchall()}
+            new = [entry for entry in entries if entry.sample_id not in stored]
+            samples = [entry for entry in new if entry.kind == "sample"]
+            if samples:
+                for sql, columns in SCHEMA.db_inserts_at:
+                    cursor.executemany(sql, [[entry.timestamp] + [entry.payload[i] for i in columns]
+                                             for entry in samples])
+            alerts = [entry for entry in new if entry.kind == "alert"]
+            if alerts:
+                cursor.executemany(ALERT_INSERT, [
+                    (entry.timestamp, entry.payload["rule"], entry.payload["channel"], entry.payload["value"],
+                     entry.payload["state"], entry.payload["severity"])
+                    for entry in alerts
+                ])
+            if new:
+                cursor.executemany("INSERT INTO `Uploaded Samples` (sample_id) VALUES (%s)",
+                                   [(entry.sample_id,) for entry in new])
+        conn.commit()
+    finally:
+        conn.close()
+    return len(new)
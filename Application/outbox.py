@@ -0,0 +1,297 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass
+from channel_schema import SCHEMA
+
+##############################
+# Database Outbox
+##############################
+# Every sample and alert meant for the remote database is first appended to a
+# local SQLite file (in WAL mode, so appending never waits for the sync worker
+# reading it). OutboxSync drains it to the server in large batches whenever
+# the server is reachable, oldest first, and deletes what was accepted. Entries
+# left over when the app exits are sent after the next start.
+#
+# Each entry carries a random sample id. The server records the ids it has
+# stored in the same transaction as the rows, and skips ids it already has,
+# so a batch whose acknowledgement was lost can simply be sent again.
+#
+# Only a server that cannot be reached (ServerUnreachable, or a connection
+# error) holds the queue back. A batch the server refuses is split in halves
+# until the entries it refuses are found; those are moved to the local
+# dead_letter table with the error, for a look by hand, and the rest is sent.
+
+OUTBOX_PATH = os.environ.get("HUST_OUTBOX", "outbox.db")
+BATCH_SIZE = 1000       # entries per upload
+IDLE_INTERVAL = 1.0     # s between checks when the outbox is empty
+RETRY_DELAY = 1.0       # s after the first failed upload, doubling up to RETRY_MAX_DELAY
+RETRY_MAX_DELAY = 60.0
+RATE_WINDOW = 10.0      # s over which the drain rate is measured
+STOP_TIMEOUT = 5.0      # s to let an upload in progress finish on exit
+
+
+@dataclass
+class Entry:
+    id: int           # local row id, increasing in append order
+    sample_id: str
+    kind: str         # "sample" (payload: row aligned with SCHEMA.keys) or "alert" (payload: dict)
+    timestamp: float  # epoch seconds
+    payload: object
+
+
+def sample_payload(values):
+    """A sample's row aligned with SCHEMA.keys, with values flagged invalid (a Sample's mask) as None."""
+    row = SCHEMA.row(values)
+    invalid = getattr(values, "invalid", 0)
+    if invalid:
+        row = [None if invalid >> i & 1 else value for i, value in enumerate(row)]
+    return row
+
+
+class Outbox:
+    """A persistent queue of entries waiting for upload. Any thread may append; one thread drains it."""
+
+    def __init__(self, path=OUTBOX_PATH):
+        self.path = path
+        self.local = threading.local()  # one connection per thread
+        conn = self.connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                sample_id TEXT NOT NULL UNIQUE,
+                kind TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                payload TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS dead_letter (
+                id INTEGER PRIMARY KEY,
+                sample_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                payload TEXT NOT NULL,
+                error TEXT NOT NULL,
+                failed_at REAL NOT NULL
+            )
+        """)
+        conn.commit()
+
+    def connection(self):
+        conn = getattr(self.local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            # A commit is durable once checkpointed; a power cut may lose the last few, never corrupt the file
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self.local.conn = conn
+        return conn
+
+    def append(self, kind, timestamp, payload, sample_id=None):
+        """Queue one entry and return its sample id. Appending an id already queued does nothing."""
+        sample_id = sample_id or uuid.uuid4().hex
+        conn = self.connection()
+        conn.execute("INSERT OR IGNORE INTO outbox (sample_id, kind, timestamp, payload) VALUES (?, ?, ?, ?)",
+                     (sample_id, kind, timestamp, json.dumps(payload)))
+        conn.commit()
+        return sample_id
+
+    def append_sample(self, values, timestamp):
+        """Queue a sample; values flagged invalid (a Sample's mask) are sent as NULL."""
+        return self.append("sample", timestamp, sample_payload(values))
+
+    def append_samples(self, samples):
+        """Queue Samples (each at its own timestamp) in one transaction. Returns their sample ids."""
+        entries = [(uuid.uuid4().hex, "sample", sample.timestamp, json.dumps(sample_payload(sample)))
+                   for sample in samples]
+        conn = self.connection()
+        conn.executemany("INSERT OR IGNORE INTO outbox (sample_id, kind, timestamp, payload) VALUES (?, ?, ?, ?)",
+                         entries)
+        conn.commit()
+        return [entry[0] for entry in entries]
+
+    def append_alert(self, event):
+        return self.append("alert", event.timestamp, {
+            "rule": event.rule, "channel": event.channel, "value": event.value,
+            "state": event.state, "severity": event.severity,
+        })
+
+    def pending(self, limit):
+        """The oldest `limit` entries."""
+        rows = self.connection().execute(
+            "SELECT id, sample_id, kind, timestamp, payload FROM outbox ORDER BY id LIMIT ?", (limit,))
+        return [Entry(id, sample_id, kind, timestamp, json.loads(payload))
+                for id, sample_id, kind, timestamp, payload in rows]
+
+    def remove(self, entries):
+        """Delete uploaded entries (a batch returned by pending)."""
+        conn = self.connection()
+        conn.executemany("DELETE FROM outbox WHERE id = ?", [(entry.id,) for entry in entries])
+        conn.commit()
+
+    def dead_letter(self, entries, error):
+        """Move entries the server refuses out of the queue into dead_letter, with the error."""
+        now = time.time()
+        conn = self.connection()
+        conn.executemany("INSERT INTO dead_letter (sample_id, kind, timestamp, payload, error, failed_at) "
+                         "VALUES (?, ?, ?, ?, ?, ?)",
+                         [(entry.sample_id, entry.kind, entry.timestamp, json.dumps(entry.payload), str(error), now)
+                          for entry in entries])
+        conn.executemany("DELETE FROM outbox WHERE id = ?", [(entry.id,) for entry in entries])
+        conn.commit()
+
+    def backlog(self):
+        return self.connection().execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def close(self):
+        """Close the calling thread's connection."""
+        conn = getattr(self.local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+
+
+class ServerUnreachable(Exception):
+    """The server could not be reached or lost the connection; the entries are fine and are sent again later."""
+
+
+class EntriesRejected(Exception):
+    """The server refused the entries themselves (bad data, schema mismatch); sending them again cannot help."""
+
+
+def call_server(function, *args):
+    """Call a network function, raising pymysql's connection errors as ServerUnreachable, others as EntriesRejected."""
+    try:
+        import pymysql
+    except ImportError as e:
+        raise ServerUnreachable(e) from e
+    try:
+        return function(*args)
+    except (pymysql.OperationalError, pymysql.InterfaceError) as e:
+        raise ServerUnreachable(e) from e
+    except pymysql.MySQLError as e:
+        raise EntriesRejected(e) from e
+
+
+def prepare_server():
+    from network import create_outbox_tables
+    return call_server(create_outbox_tables)
+
+
+def upload_to_server(entries):
+    from network import upload_outbox
+    return call_server(upload_outbox, entries)
+
+
+# Errors that leave the entries queued; any other error from `upload` rejects the batch
+UNREACHABLE = (ServerUnreachable, ConnectionError, TimeoutError)
+
+
+class OutboxSync:
+    """
+    Drains an Outbox in a background thread through `upload(entries)`, which
+    must store the whole batch or raise. `prepare()`, if given, runs once
+    before the first upload (creating the server's tables). Uploads failing
+    with an UNREACHABLE error are retried with exponential backoff; entries
+    refused with any other error are moved to the dead letters.
+    """
+
+    def __init__(self, outbox, upload=upload_to_server, batch_size=BATCH_SIZE, idle_interval=IDLE_INTERVAL,
+                 retry_delay=RETRY_DELAY, retry_max_delay=RETRY_MAX_DELAY, prepare=prepare_server):
+        self.outbox = outbox
+        self.upload = upload
+        self.prepare = prepare
+        self.prepared = prepare is None
+        self.batch_size = batch_size
+        self.idle_interval = idle_interval
+        self.retry_delay = retry_delay
+        self.retry_max_delay = retry_max_delay
+        self.reachable = None  # unknown until the first upload
+        self.last_error = ""
+        self.drained = 0       # entries uploaded this session
+        self.rejected = 0      # entries moved to the dead letters this session
+        self.backlog = 0       # entries waiting, as of the last check
+        self.recent = deque()  # (time, entries) of recent uploads, for the drain rate
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def drain_rate(self):
+        """Entries uploaded per second over the last RATE_WINDOW seconds."""
+        recent = list(self.recent)
+        now = time.time()
+        return sum(count for when, count in recent if now - when <= RATE_WINDOW) / RATE_WINDOW
+
+    def _send(self, batch):
+        """
+        Upload a batch and remove it from the outbox. A refused batch is split
+        in halves and each sent on its own, down to the single entries the
+        server refuses, which go to the dead letters. UNREACHABLE errors are
+        raised, leaving what was not sent queued.
+        """
+        try:
+            self.upload(batch)
+        except UNREACHABLE:
+            raise
+        except Exception as e:
+            if len(batch) == 1:
+                self.outbox.dead_letter(batch, e)
+                self.rejected += 1
+                self.backlog = max(0, self.backlog - 1)
+                print(f"[DEBUG] Database refused outbox entry {batch[0].sample_id}, moved to dead_letter: {e}")
+                return
+            half = len(batch) // 2
+            self._send(batch[:half])
+            self._send(batch[half:])
+            return
+        self.outbox.remove(batch)
+        self.drained += len(batch)
+        self.backlog = max(0, self.backlog - len(batch))
+        now = time.time()
+        self.recent.append((now, len(batch)))
+        while self.recent and now - self.recent[0][0] > RATE_WINDOW:
+            self.recent.popleft()
+
+    def _run(self):
+        delay = self.retry_delay
+        try:
+            while not self.stopping.is_set():
+                batch = self.outbox.pending(self.batch_size)
+                self.backlog = self.outbox.backlog()
+                if not batch:
+                    self.stopping.wait(self.idle_interval)
+                    continue
+                try:
+                    if not self.prepared:
+                        self.prepare()
+                        self.prepared = True
+                    self._send(batch)
+                except Exception as e:
+                    # Unreachable, or the tables could not be created: keep everything queued
+                    if self.reachable is not False:
+                        print(f"[DEBUG] Database upload failed, keeping {self.backlog} entries queued: {e}")
+                    self.reachable = False
+                    self.last_error = str(e)
+                    self.stopping.wait(delay)
+                    delay = min(delay * 2, self.retry_max_delay)
+                    continue
+                if self.reachable is False:
+                    print("[DEBUG] Database reachable again, draining the outbox.")
+                self.reachable = True
+                delay = self.retry_delay
+        finally:
+            self.outbox.close()
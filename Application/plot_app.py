@@ -1,28 +1,37 @@
 import os
 import csv
+import math
 import datetime
-from network import insert_into_db
-import serial.tools.list_ports
+import threading
 from PyQt5.QtWidgets import (
-    QMainWindow, QVBoxLayout, QWidget, QComboBox, QLabel, QHBoxLayout, QTextEdit, QPushButton, QScrollArea, QSizePolicy
+    QMainWindow, QVBoxLayout, QWidget, QComboBox, QLabel, QHBoxLayout, QTextEdit, QPushButton, QScrollArea, QSizePolicy, QCheckBox,
+    QShortcut
 )
-from PyQt5.QtGui import QMovie, QPixmap, QIcon, QFont
-from PyQt5.QtCore import QTimer, QThread, Qt
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import matplotlib.pyplot as plt
+from PyQt5.QtGui import QMovie, QPixmap, QIcon, QFont, QKeySequence
+from PyQt5.QtCore import QTimer, QThread, Qt, pyqtSignal
 from mock_serial_reader import MockSerialReader
 from connection_worker import ConnectionWorker
-import matplotlib.dates as mdates
-import matplotlib.ticker as mticker
+from port_monitor import PortMonitor
+from outbox import Outbox, OutboxSync
+from exporter import Exporter
+from range_estimator import PACK_WH
 from widget.battery_widget import VerticalBatteryWidget
 from widget.speedometer_widget import SpeedometerWidget
+from widget.lap_table_widget import LapTableWidget
+from widget.export_dialog import ExportDialog
 from data_manager import SerialDataManager
+from graph_spec import load_graphs
+from graph_panel import GraphPanel, MAX_GRAPHS, TIME_INTERVALS, load_matplotlib
+from dashboard import RenderScheduler, DashboardWindow
+from link_analytics import MINUTE_SUMMARY_HEADER
+from lap_tracker import LAP_HEADER
+from scrollback import HistoryLoader
 
-# Graph type constants
-GRAPH_TYPES = ["Velocity", "Battery Temps", "Motor Temps", "MPPT power", "Power trade-off"]
-MAX_GRAPHS = 4
 
 class PlotApp(QMainWindow):
+    startupLoaded = pyqtSignal(object)  # (recovered rows, timestamps), from the startup thread
+    startupFinished = pyqtSignal()      # graphs built and history recovered; the reader may start
+
     def __init__(self, serial_reader):
         super().__init__()
         self.serial_reader = serial_reader
@@ -30,25 +39,14 @@ class PlotApp(QMainWindow):
         
         # Initialize data manager first
         self.data_manager = SerialDataManager()
+        # The graph types, compiled once from graphs.json
+        self.graph_set = load_graphs()
         
         # Get the directory where this script is located
         script_dir = os.path.dirname(os.path.abspath(__file__))
         self.logo_path = os.path.join(script_dir, 'assets', 'HUST_big_logo.png')
         self.loading_gif_path = os.path.join(script_dir, 'assets', 'loading.gif')
         
-        # Critical thresholds for warning system
-        self.critical_thresholds = {
-            "battery_volt": {"min": 100.0, "max": 150.0},  # V
-            "battery_current": {"min": -50.0, "max": 80.0},  # A
-            "battery_cell_LOW_volt": {"min": 3.0, "max": 4.2},  # V per cell
-            "battery_cell_HIGH_volt": {"min": 3.0, "max": 4.2},  # V per cell
-            "battery_cell_LOW_temp": {"min": -10.0, "max": 50.0},  # °C
-            "battery_cell_HIGH_temp": {"min": -10.0, "max": 50.0},  # °C
-            "motor_temp": {"min": -10.0, "max": 80.0},  # °C
-            "motor_controller_temp": {"min": -10.0, "max": 70.0},  # °C
-            "BMS_temp": {"min": -10.0, "max": 60.0},  # °C
-        }
-
         self.setWindowTitle("HUST - Henry Live Data")
         self.setGeometry(100, 100, 1280, 900)
 
@@ -100,12 +98,15 @@ class PlotApp(QMainWindow):
         self.graph_buttons_layout.setSpacing(15)
         self.graph_buttons_layout.setContentsMargins(15, 8, 15, 8)  # Reduced vertical padding to make box thinner
 
-        # Graph containers for individual graphs with their dropdowns
-        self.graph_containers = []
-        self.graph_dropdowns = []
-        self.figures = []
-        self.axes = []
-        self.canvases = []
+        # The graphs (graph_panel.py). Scrolled-back ranges are loaded in the
+        # background; this window and any extra dashboard windows share the
+        # loader and are redrawn together by one scheduler (dashboard.py).
+        self.history_loader = HistoryLoader(self.serial_reader.store)
+        self.graph_panel = GraphPanel(self.serial_reader, self.graph_set, self.history_loader)
+        self.graph_panel.graphsChanged.connect(self.update_graph_buttons)
+        self.render_scheduler = RenderScheduler(self.serial_reader.store, self.history_loader, self)
+        self.render_scheduler.add(self)
+        self.dashboards_opened = 0
 
         # Time Interval Selector with better grouping
         time_interval_container = QWidget()
@@ -115,8 +116,8 @@ class PlotApp(QMainWindow):
         time_interval_label = QLabel("Time Interval:")
         time_interval_label.setStyleSheet("font-weight: bold;")
         self.time_unit_dropdown = QComboBox()
-        self.time_unit_dropdown.addItems(["2 s", "1 min"])
-        self.time_unit_dropdown.currentTextChanged.connect(self.update_all_graphs)
+        self.time_unit_dropdown.addItems(list(TIME_INTERVALS))
+        self.time_unit_dropdown.currentTextChanged.connect(self.graph_panel.set_time_interval)
         self.time_unit_dropdown.setMinimumWidth(80)
         time_interval_layout.addWidget(time_interval_label)
         time_interval_layout.addWidget(self.time_unit_dropdown)
@@ -127,16 +128,38 @@ class PlotApp(QMainWindow):
 
         # Add buttons for adding and removing graphs with better grouping
         self.add_graph_button = QPushButton("+ Add Graph")
-        self.add_graph_button.clicked.connect(self.add_graph)
+        self.add_graph_button.clicked.connect(self.graph_panel.add_graph)
         self.add_graph_button.setStyleSheet("color: white;")
         self.remove_graph_button = QPushButton("- Remove Graph")
-        self.remove_graph_button.clicked.connect(self.remove_graph)
+        self.remove_graph_button.clicked.connect(self.graph_panel.remove_graph)
         self.remove_graph_button.setStyleSheet("color: white;")
         
         # Dark mode toggle button
         self.dark_mode_button = QPushButton("◐ Dark Mode")
         self.dark_mode_button.clicked.connect(self.toggle_dark_mode)
         self.dark_mode_button.setStyleSheet("color: white;")
+
+        # Another window of graphs over the same data (e.g. for a second monitor)
+        self.new_window_button = QPushButton("⧉ New Window")
+        self.new_window_button.clicked.connect(self.open_dashboard)
+        self.new_window_button.setStyleSheet("color: white;")
+
+        # Per-lap table; the L key sets a lap marker
+        self.laps_button = QPushButton("⏱ Laps")
+        self.laps_button.clicked.connect(self.show_laps)
+        self.laps_button.setStyleSheet("color: white;")
+        self.lap_window = None
+        self.lap_shortcut = QShortcut(QKeySequence("L"), self)
+        self.lap_shortcut.activated.connect(self.mark_lap)
+
+        # Export a time range of the history to a file, in the background
+        self.export_button = QPushButton("⇩ Export")
+        self.export_button.clicked.connect(self.show_export)
+        self.export_button.setStyleSheet("color: white;")
+        self.exporter = Exporter(self.serial_reader.store)
+        self.exporter.finished.connect(self.text_box_append)
+        self.exporter.failed.connect(self.text_box_append)
+        self.export_window = None
         
         # Group buttons with consistent spacing
         buttons_layout = QHBoxLayout()
@@ -152,6 +175,9 @@ class PlotApp(QMainWindow):
         separator2.setObjectName("separator")
         buttons_layout.addWidget(separator2)
         buttons_layout.addWidget(self.dark_mode_button)
+        buttons_layout.addWidget(self.laps_button)
+        buttons_layout.addWidget(self.export_button)
+        buttons_layout.addWidget(self.new_window_button)
         
         self.graph_buttons_layout.addLayout(buttons_layout)
         
@@ -184,6 +210,14 @@ class PlotApp(QMainWindow):
         self.rssi_label.setAlignment(Qt.AlignCenter)
         self.graph_buttons_layout.addWidget(self.rssi_label)
 
+        # Database upload backlog (see outbox.py)
+        self.upload_label = QLabel("DB: --")
+        self.upload_label.setStyleSheet("color: #888888; font-weight: bold; font-size: 12px; padding: 5px; border: 2px solid #4472c4; border-radius: 4px;")
+        self.upload_label.setFixedSize(170, 30)
+        self.upload_label.setAlignment(Qt.AlignCenter)
+        self.upload_label.setToolTip("Entries waiting for the database, and how fast they are being sent")
+        self.graph_buttons_layout.addWidget(self.upload_label)
+
         self.graph_buttons_layout.setAlignment(Qt.AlignLeft)
 
         self.left_layout.addWidget(self.graph_buttons_container)
@@ -205,10 +239,23 @@ class PlotApp(QMainWindow):
         self.port_dropdown = QComboBox()
         self.port_dropdown.setSizePolicy(QSizePolicy.Preferred, QSizePolicy.Fixed)
         self.port_dropdown.setMaximumWidth(120)  # Limit dropdown width
-        self.populate_com_ports()
         self.port_dropdown.currentTextChanged.connect(self.update_com_port)
+        # Ports are listed in the background and refreshed as devices come and go
+        self.port_monitor = PortMonitor()
+        self.port_monitor.portsChanged.connect(self.populate_com_ports)
+        self.port_monitor.portAdded.connect(lambda port: self.text_box.append(f"Serial port {port} connected."))
+        self.port_monitor.portRemoved.connect(lambda port: self.text_box.append(f"Serial port {port} removed."))
+        self.port_monitor.start()
+        if hasattr(self.serial_reader, 'connectionChanged'):
+            self.serial_reader.connectionChanged.connect(self.on_reader_connection_changed)
         self.port_selector_layout.addWidget(self.port_label)
         self.port_selector_layout.addWidget(self.port_dropdown)
+        # Closed-loop spreading factor / bandwidth control (real receiver only)
+        if hasattr(self.serial_reader, 'rate_controller'):
+            self.auto_rate_checkbox = QCheckBox("Auto data rate")
+            self.auto_rate_checkbox.setToolTip("Adapt LoRa spreading factor and bandwidth to the measured link")
+            self.auto_rate_checkbox.toggled.connect(self.toggle_auto_rate)
+            self.port_selector_layout.addWidget(self.auto_rate_checkbox)
         self.port_selector_layout.addWidget(self.logo_label)  # Add logo next to COM port
         self.port_selector_layout.setAlignment(Qt.AlignLeft)  # Align to right
         self.right_layout.addLayout(self.port_selector_layout)
@@ -220,6 +267,20 @@ class PlotApp(QMainWindow):
         self.text_box.setMaximumHeight(60)  # Smaller text box height
         self.right_layout.addWidget(self.text_box)
 
+        # Rolling statistics window shown next to each live value
+        self.stats_selector_layout = QHBoxLayout()
+        self.stats_selector_layout.setContentsMargins(0, 0, 0, 0)
+        self.stats_selector_layout.setSpacing(5)
+        stats_label = QLabel("Min / Avg / Max over:")
+        stats_label.setStyleSheet("font-weight: bold;")
+        self.stats_window_dropdown = QComboBox()
+        self.stats_window_dropdown.addItems(["Off"] + self.serial_reader.stats.window_names())
+        self.stats_window_dropdown.currentTextChanged.connect(self.on_stats_window_changed)
+        self.stats_selector_layout.addWidget(stats_label)
+        self.stats_selector_layout.addWidget(self.stats_window_dropdown)
+        self.stats_selector_layout.addStretch()
+        self.right_layout.addLayout(self.stats_selector_layout)
+
         # Create a scrollable area for live data
         self.live_data_scroll = QScrollArea()
         self.live_data_scroll.setWidgetResizable(True)
@@ -238,6 +299,7 @@ class PlotApp(QMainWindow):
         # Create labels and value boxes for each data field
         self.data_labels = {}
         self.data_values = {}
+        self.data_stats = {}
         for key in self.serial_reader.available_data:
             # Create a horizontal layout for each data row
             row_layout = QHBoxLayout()
@@ -267,6 +329,13 @@ class PlotApp(QMainWindow):
             value_box.setAlignment(Qt.AlignCenter)
             value_box.setWordWrap(True)
             
+            # Create rolling statistics label (min / avg / max), shown below the value
+            stats_box = QLabel("")
+            stats_box.setStyleSheet("font-size: 10px; padding: 0px 2px;")
+            stats_box.setContentsMargins(155, 0, 0, 0)  # Line up with the value box
+            stats_box.setAlignment(Qt.AlignLeft | Qt.AlignVCenter)
+            stats_box.setVisible(False)
+            
             # Add unit label if available
             if field and field.unit:
                 unit_label = QLabel(f" {field.unit}")
@@ -285,9 +354,11 @@ class PlotApp(QMainWindow):
             # Store references
             self.data_labels[key] = label
             self.data_values[key] = value_box
+            self.data_stats[key] = stats_box
             
             # Add row to main layout
             self.live_data_layout.addLayout(row_layout)
+            self.live_data_layout.addWidget(stats_box)
         
         self.live_data_scroll.setWidget(self.live_data_widget)
         self.right_layout.addWidget(self.live_data_scroll)
@@ -324,37 +395,107 @@ class PlotApp(QMainWindow):
         self.right_container.setSizePolicy(QSizePolicy.Fixed, QSizePolicy.Preferred)
         self.main_layout.addWidget(self.right_container, 2)
 
-        # Add initial graphs
-        self.add_graph()
-        self.add_graph()
+        # The initial graphs are added once matplotlib has been loaded (finish_startup)
+        self.graphs_loading_label = QLabel("Loading graphs...")
+        self.graphs_loading_label.setAlignment(Qt.AlignCenter)
+        self.left_layout.addWidget(self.graphs_loading_label, 1)
+        self.add_graph_button.setDisabled(True)
+        self.remove_graph_button.setDisabled(True)
+        self.new_window_button.setDisabled(True)
 
-        # Connect serial data signal to update the graphs.
-        if hasattr(self.serial_reader, 'dataReceived'):
-            self.serial_reader.dataReceived.connect(self.update_all_graphs)
-
-        
         # --- CSV Logging Setup ---
         self.log_buffer = []  # buffer to accumulate log rows
         self.log_filename = "can_data_log.csv"
+        header = ["timestamp"] + self.serial_reader.available_data
+        # A log written with a different set of channels is archived, not appended to.
+        self.recover_filename = self.log_filename
+        if os.path.exists(self.log_filename):
+            with open(self.log_filename, "r", newline="") as f:
+                old_header = next(csv.reader(f), [])
+            if old_header != header:
+                archived = f"can_data_log_{datetime.datetime.now():%Y%m%d_%H%M%S}.csv"
+                os.replace(self.log_filename, archived)
+                self.recover_filename = archived
+                print(f"[DEBUG] Channel list changed, previous log archived as {archived}")
         # If the CSV file does not exist, create it and write a header row.
         if not os.path.exists(self.log_filename):
             with open(self.log_filename, "w", newline="") as f:
                 writer = csv.writer(f)
-                header = ["timestamp"] + self.serial_reader.available_data
                 writer.writerow(header)
         # A timer to flush the log buffer to file once per minute.
         self.log_timer = QTimer(self)
         self.log_timer.timeout.connect(self.flush_log_buffer)
         self.log_timer.start(60000)  # 60000 ms = 1 minute
 
-        # Log each new CAN message.
-        self.serial_reader.dataReceived.connect(self.on_new_data)
+        # Log each new CAN message and redraw, a batch of them at a time.
+        self.serial_reader.samplesReceived.connect(self.on_new_samples)
+
+        # --- Database Upload Setup ---
+        # Samples and alerts are queued locally and sent in batches whenever the server is reachable.
+        self.outbox = Outbox()
+        self.outbox_sync = OutboxSync(self.outbox)
+        self.outbox_sync.start()
+        self.upload_timer = QTimer()
+        self.upload_timer.timeout.connect(self.update_upload_display)
+        self.upload_timer.start(2000)
+
+        # --- Range Estimation ---
+        # The range model's power curve is refitted from the history in the background.
+        self.serial_reader.range_refit.start()
+
+        # --- Alert Logging Setup ---
+        self.alert_buffer = []  # buffer to accumulate alert rows, flushed with the log buffer
+        self.alert_log_filename = "alert_log.csv"
+        if not os.path.exists(self.alert_log_filename):
+            with open(self.alert_log_filename, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["timestamp", "rule", "channel", "value", "state", "severity"])
+        self.serial_reader.alertRaised.connect(self.on_alert)
+
+        # --- Link Logging Setup ---
+        # One row per completed minute of link statistics, written on the flush timer.
+        self.link_log_filename = "link_log.csv"
+        if not os.path.exists(self.link_log_filename):
+            with open(self.link_log_filename, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(MINUTE_SUMMARY_HEADER)
+
+        # --- Lap Logging Setup ---
+        # Completed laps are appended on the flush timer.
+        self.lap_log_filename = "lap_log.csv"
+        self.laps_logged = 0
+        if not os.path.exists(self.lap_log_filename):
+            with open(self.lap_log_filename, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(LAP_HEADER)
 
         # number of samples in your buffer
-        self.max_samples = len(self.serial_reader.history[self.serial_reader.available_data[0]])
-
-        # Recover any saved CAN data from the CSV file.
-        self.recover_csv_data()
+        self.max_samples = self.serial_reader.history_samples
+
+        # The slow part of starting up (importing matplotlib, reading the log
+        # tail) runs in the background so the window shows immediately.
+        self.startup_done = False
+        self.startupLoaded.connect(self.finish_startup)
+        threading.Thread(target=self.load_startup_data, daemon=True).start()
+
+    def load_startup_data(self):
+        """Runs in a background thread: import matplotlib and read the saved CAN data from the CSV file."""
+        load_matplotlib()
+        self.startupLoaded.emit(self.read_csv_tail())
+
+    def finish_startup(self, recovered):
+        """Build the graphs and load the recovered history (GUI thread), then let data flow."""
+        rows, timestamps = recovered
+        if rows:
+            # Commit into the reader's history (before it starts reading)
+            self.serial_reader.load_history(rows, timestamps)
+            print("[DEBUG] CSV data recovery complete.")
+        self.left_layout.removeWidget(self.graphs_loading_label)
+        self.graphs_loading_label.deleteLater()
+        self.left_layout.addWidget(self.graph_panel, 1)
+        self.graph_panel.add_graph()
+        self.graph_panel.add_graph()
+        self.new_window_button.setDisabled(False)
         self.update_all_graphs()
 
         # For the mock reader, use a timer to update data every second.
@@ -362,6 +503,8 @@ class PlotApp(QMainWindow):
             self.timer = QTimer(self)
             self.timer.timeout.connect(self.mock_update)
             self.timer.start(1000)
+        self.startup_done = True
+        self.startupFinished.emit()
 
     def apply_theme(self):
         """Apply the current theme (light or dark) to the application."""
@@ -568,69 +711,43 @@ class PlotApp(QMainWindow):
         """Toggle between light and dark mode."""
         self.dark_mode = not self.dark_mode
         self.apply_theme()
-        # Update figure backgrounds for existing graphs
-        plot_style = self.get_plot_style()
-        for figure in self.figures:
-            figure.patch.set_facecolor(plot_style['figure_bg'])
+        # Update figure backgrounds in every window (dashboards take the style sheet from this one)
+        for window in self.render_scheduler.windows:
+            window.graph_panel.set_dark_mode(self.dark_mode)
         # Update all graphs to reflect the new theme
         self.update_all_graphs()
+
+    def open_dashboard(self):
+        """Open another window of graphs, sharing this window's data and redraws."""
+        self.dashboards_opened += 1
+        window = DashboardWindow(self.serial_reader, self.graph_set, self.history_loader, self.render_scheduler,
+                                 self.dashboards_opened, self.dark_mode, self)
+        window.show()
+        self.update_all_graphs()
     
-    def get_plot_colors(self):
-        """Get the appropriate color palette based on current theme."""
-        if self.dark_mode:
-            # Lighter colors for dark background
-            return ['#60a5fa', '#93c5fd', '#7fb3d3', '#5b9bd5', '#3e81f0', '#a4c8e8', '#b0d4ff']
-        else:
-            # Darker colors for light background
-            return ['#1e3a8a', '#2563eb', '#3b82f6', '#4472c4', '#2d6fc7', '#5b9bd5', '#6366f1']
-    
-    def _add_annotation(self, ax, text, y_pos, plot_style):
-        """Helper method to add styled annotations to plots."""
-        ax.annotate(text, xy=(0.05, y_pos), xycoords='axes fraction', fontsize=10,
-                   horizontalalignment='left', verticalalignment='top',
-                   bbox=dict(boxstyle="round,pad=0.3", edgecolor=plot_style['annotation_edge'],
-                            facecolor=plot_style['annotation_bg'], linewidth=1.5),
-                   color=plot_style['annotation_text'])
-
-    def get_plot_style(self):
-        """Get the plot styling parameters based on current theme."""
-        if self.dark_mode:
-            return {
-                'bg_color': '#2d4a7c',
-                'spine_color': '#7fb3d3',
-                'tick_color': '#b0c4de',
-                'title_color': '#e0e8f5',
-                'label_color': '#e0e8f5',
-                'legend_bg': '#2d4a7c',
-                'legend_edge': '#7fb3d3',
-                'legend_text': '#e0e8f5',
-                'annotation_bg': '#3a5a8c',
-                'annotation_edge': '#7fb3d3',
-                'annotation_text': '#e0e8f5',
-                'default_line': '#60a5fa',
-                'figure_bg': '#1a206c'
-            }
-        else:
-            return {
-                'bg_color': '#f0f7ff',
-                'spine_color': '#4472c4',
-                'tick_color': '#1a206c',
-                'title_color': '#1a206c',
-                'label_color': '#1a206c',
-                'legend_bg': '#e8f0ff',
-                'legend_edge': '#4472c4',
-                'legend_text': '#1a206c',
-                'annotation_bg': '#d4e4f7',
-                'annotation_edge': '#4472c4',
-                'annotation_text': '#1a206c',
-                'default_line': '#2563eb',
-                'figure_bg': '#e8f0ff'
-            }
-
-    def populate_com_ports(self):
-        ports = [port.device for port in serial.tools.list_ports.comports()]
+    def populate_com_ports(self, ports):
+        """Refresh the dropdown with the ports present, without changing the selection."""
+        if hasattr(self.serial_reader, 'on_ports_changed'):
+            self.serial_reader.on_ports_changed(ports)
+        current = self.port_dropdown.currentText()
+        items = list(ports)
+        # The reader's port stays listed while it is gone, as the reader waits for it to return
+        if current and current not in items and current == self.serial_reader.selected_port:
+            items.append(current)
+        self.port_dropdown.blockSignals(True)
         self.port_dropdown.clear()
-        self.port_dropdown.addItems(ports)
+        self.port_dropdown.addItems(items)
+        if current in items:
+            self.port_dropdown.setCurrentText(current)
+        self.port_dropdown.blockSignals(False)
+
+    def on_reader_connection_changed(self, connected):
+        port = self.serial_reader.selected_port
+        if connected:
+            self.text_box.append(f"Reconnected to {port}. Downtime this session: "
+                                 f"{self.serial_reader.downtime:.1f} s over {self.serial_reader.reconnects} reconnect(s).")
+        else:
+            self.text_box.append(f"Lost {port}, reconnecting...")
 
     def update_com_port(self, port):
         self.serial_reader.set_port(port)
@@ -647,6 +764,30 @@ class PlotApp(QMainWindow):
             self.connection_thread.finished.connect(self.connection_thread.deleteLater)
             self.connection_thread.start()
 
+    def toggle_auto_rate(self, enabled):
+        self.serial_reader.rate_controller.enabled = enabled
+        self.text_box.append(f"Auto data rate {'on' if enabled else 'off'}.")
+
+    def show_laps(self):
+        if self.lap_window is None:
+            self.lap_window = LapTableWidget(self.serial_reader.lap_tracker, self)
+        self.lap_window.show()
+        self.lap_window.raise_()
+        self.lap_window.refresh()
+
+    def show_export(self):
+        if self.export_window is None:
+            self.export_window = ExportDialog(self.exporter, self.data_manager, self.serial_reader.available_data, self)
+        self.export_window.show()
+        self.export_window.raise_()
+
+    def text_box_append(self, text):
+        self.text_box.append(text)
+
+    def mark_lap(self):
+        self.serial_reader.lap_tracker.mark()
+        self.text_box.append("Lap marker set.")
+
     def mock_update(self):
         self.serial_reader.update()
         self.update_all_graphs()
@@ -655,252 +796,97 @@ class PlotApp(QMainWindow):
         """Return an appropriate unit string based on the variable name."""
         return self.data_manager.get_unit(variable)
 
-    def get_rounded_timestamp(self):
+    def get_rounded_timestamp(self, timestamp=None):
         """
-        Get the current timestamp rounded to the nearest second.
+        Get the given epoch timestamp (default: now) rounded to the nearest second.
         If microseconds are 500,000 or more, round up; otherwise, round down.
         Returns a string in ISO format without decimals.
         """
-        now = datetime.datetime.now()
+        now = datetime.datetime.now() if timestamp is None else datetime.datetime.fromtimestamp(timestamp)
         # Add 500,000 microseconds and then replace microseconds with 0.
         rounded = (now + datetime.timedelta(microseconds=500000)).replace(microsecond=0)
         return rounded.isoformat()
 
-    def update_graph(self, graph_id):
-        # Determine the sample interval in seconds from the dropdown.
-        time_option = self.time_unit_dropdown.currentText()
-        if time_option == "2 s":
-            sample_interval = 2
-        elif time_option == "1 min":
-            sample_interval = 60
-        else:
-            sample_interval = 2
-
-        # Get the current time (for graphing, we don't require rounding here).
-        now = datetime.datetime.now()
-
-        # Select the appropriate axis and dropdown based on graph_id
-        ax = self.axes[graph_id - 1]
-        canvas = self.canvases[graph_id - 1]
-        selected_var = self.graph_dropdowns[graph_id - 1].currentText()
-
-        ax.clear()
-
-        # Define graph configurations using the data manager
-        graph_configs = {
-            "Velocity": {
-                "data_keys": ["velocity"],
-                "ylabel": self.data_manager.get_unit("velocity"),
-                "annotations": []
-            },
-            "Battery Temps": {
-                "data_keys": ["battery_cell_LOW_temp", "battery_cell_HIGH_temp", "battery_cell_AVG_temp", "BMS_temp"],
-                "ylabel": self.data_manager.get_unit("battery_cell_LOW_temp"),
-                "annotations": [
-                    ("battery_cell_ID_LOW_temp", "Low Temp ID: {value}"),
-                    ("battery_cell_ID_HIGH_temp", "High Temp ID: {value}")
-                ]
-            },
-            "Motor Temps": {
-                "data_keys": ["motor_temp", "motor_controller_temp"],
-                "ylabel": self.data_manager.get_unit("motor_temp"),
-                "annotations": []
-            },
-            "MPPT power": {
-                "data_keys": ["MPPT1_watt", "MPPT2_watt", "MPPT3_watt", "MPPT_total_watt"],
-                "ylabel": self.data_manager.get_unit("MPPT1_watt"),
-                "annotations": []
-            },
-            "Power trade-off": {
-                "data_keys": ["battery_current", "battery_volt", "MPPT_total_watt"],
-                "ylabel": "W",
-                "annotations": [],
-                "custom_processing": True
-            }
-        }
-
-        config = graph_configs.get(selected_var, {
-            "data_keys": [selected_var],
-            "ylabel": self.data_manager.get_unit(selected_var),
-            "annotations": []
-        })
-
-        if config.get("custom_processing", False):
-            # Handle power trade-off calculation
-            battery_current = self.serial_reader.history.get("battery_current", [])
-            battery_voltage = self.serial_reader.history.get("battery_volt", [])
-            total_mppt_watt = self.serial_reader.history.get("MPPT_total_watt", [])
-
-            min_length = min(len(battery_current), len(battery_voltage), len(total_mppt_watt))
-            battery_power = [battery_current[i] * battery_voltage[i] for i in range(min_length)]
-
-            data = {
-                "Battery Power": battery_power,
-                "Total MPPT Power": total_mppt_watt[:min_length],
-            }
-            ylabel = config["ylabel"]
-            
-            # Add power difference annotation
-            power_difference = -battery_power[-1] + total_mppt_watt[-1]
-            config["annotations"].append(("custom", f"Power Difference: {power_difference:.2f} W"))
-        else:
-            # Standard processing
-            if len(config["data_keys"]) == 1:
-                data = self.serial_reader.history.get(config["data_keys"][0], [])
-            else:
-                data = {key: self.serial_reader.history.get(key, []) for key in config["data_keys"]}
-            ylabel = config["ylabel"]
-
-        # Add annotations
-        plot_style = self.get_plot_style()
-        for i, (key, template) in enumerate(config["annotations"]):
-            if key == "custom":
-                self._add_annotation(ax, template, 0.95 - i * 0.1, plot_style)
-            else:
-                value = self.serial_reader.latest_values.get(key, "N/A")
-                text = template.format(value=value)
-                self._add_annotation(ax, text, 0.95 - i * 0.1, plot_style)
-
-        # Get theme-appropriate colors and styling
-        blue_colors = self.get_plot_colors()
-        plot_style = self.get_plot_style()
-        
-        # Plot the data
-        if isinstance(data, dict):
-            color_idx = 0
-            for label, values in data.items():
-                times = [now - datetime.timedelta(seconds=(len(values) - 1 - i) * sample_interval)
-                        for i in range(len(values))]
-                x = mdates.date2num(times)
-                color = blue_colors[color_idx % len(blue_colors)]
-                ax.plot(x, values, '-', label=self.data_manager.get_display_name(label), 
-                       color=color, linewidth=2)
-                color_idx += 1
-            ax.legend(loc='best', framealpha=0.9, facecolor=plot_style['legend_bg'], 
-                     edgecolor=plot_style['legend_edge'], labelcolor=plot_style['legend_text'])
-        else:
-            times = [now - datetime.timedelta(seconds=(len(data) - 1 - i) * sample_interval)
-                    for i in range(len(data))]
-            x = mdates.date2num(times)
-            ax.plot(x, data, '-', color=plot_style['default_line'], linewidth=2)
-
-        # Set fixed y-axis limits based on data type
-        self._set_y_axis_limits(ax, selected_var, data, config)
-        
-        # Style the plot based on current theme
-        ax.set_facecolor(plot_style['bg_color'])
-        ax.spines['top'].set_visible(False)
-        ax.spines['right'].set_visible(False)
-        ax.spines['left'].set_color(plot_style['spine_color'])
-        ax.spines['bottom'].set_color(plot_style['spine_color'])
-        ax.tick_params(colors=plot_style['tick_color'])
-        
-        # Title removed as requested
-        ax.set_xlabel("Time", color=plot_style['label_color'], fontsize=10)
-        ax.set_ylabel(ylabel, color=plot_style['label_color'], fontsize=10)
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-        ax.xaxis.set_major_locator(mticker.MaxNLocator(4))
-        canvas.draw()
-
-    def _set_y_axis_limits(self, ax, selected_var, data, config):
-        """Set fixed y-axis limits based on data type, expanding only if data exceeds limits."""
-        # Handle special cases
-        if config.get("custom_processing", False):
-            # For power trade-off graph, use power-related limits
-            max_expected = 5000.0  # 5kW max power
-            if isinstance(data, dict) and data:
-                current_max = max(max(values) if values else 0 for values in data.values())
-            else:
-                current_max = 0
-        else:
-            # Get the maximum expected value for this data type
-            if isinstance(data, dict):
-                # For multi-line plots, check all data series
-                max_expected = 0
-                current_max = 0
-                for key, values in data.items():
-                    if values:
-                        field_max = self.data_manager.get_max_expected_value(key)
-                        max_expected = max(max_expected, field_max)
-                        current_max = max(current_max, max(values))
-            else:
-                # For single-line plots
-                if data:
-                    max_expected = self.data_manager.get_max_expected_value(selected_var)
-                    current_max = max(data)
-                else:
-                    max_expected = 100.0  # Default
-                    current_max = 0
-        
-        # Set y-axis limits
-        if current_max > max_expected:
-            # If current data exceeds expected max, expand the axis
-            y_max = current_max * 1.1  # Add 10% margin
-        else:
-            # Use the fixed expected maximum
-            y_max = max_expected
-        
-        # Set minimum - allow negative values for power (can be negative when consuming)
-        if any(key in selected_var.lower() for key in ['power', 'watt', 'trade']):
-            y_min = min(0, current_max * 0.1) if data else -1000  # Allow negative power
-        elif any(key in selected_var.lower() for key in ['temp', 'temperature']):
-            y_min = min(0, current_max * 0.1) if data else 0
-        else:
-            y_min = 0
-        
-        ax.set_ylim(y_min, y_max)
-
     def update_all_graphs(self):
-        for i in range(1, len(self.graph_dropdowns) + 1):
-            self.update_graph(i)
-        self.update_battery_widget()
-        self.update_speedometer_widget()
-        self.update_live_data_display()
-        self.update_rssi_display()
-
-    def update_battery_widget(self):
-        battery_volt = self.serial_reader.latest_values.get("battery_volt", 0.0)
-        self.battery_widget.setVoltage(battery_volt)
-
-    def update_speedometer_widget(self):
-        velocity = self.serial_reader.latest_values.get("velocity", 0.0)
-        distance = self.serial_reader.latest_values.get("distance_travelled", 0.0)
+        """Redraw every window at the next pass of the event loop (see RenderScheduler)."""
+        self.render_scheduler.request()
+
+    def render(self, snapshot):
+        # Everything drawn in one update comes from the same sample index,
+        # while the reader thread keeps appending undisturbed.
+        latest = snapshot.latest()
+        self.graph_panel.render(snapshot)
+        self.update_battery_widget(latest)
+        self.update_speedometer_widget(latest)
+        self.update_live_data_display(latest)
+        self.update_rssi_display(latest)
+
+    def update_scrolled_graphs(self):
+        self.graph_panel.update_scrolled_graphs()
+
+    def update_graph_buttons(self, count):
+        self.add_graph_button.setDisabled(count >= MAX_GRAPHS)
+        self.remove_graph_button.setDisabled(count <= 1)
+
+    def update_battery_widget(self, latest=None):
+        latest = latest or self.serial_reader.latest_values
+        self.battery_widget.setCharge(latest.get("remaining_energy", 0.0), PACK_WH,
+                                      latest.get("range_remaining", 0.0), latest.get("time_remaining", 0.0))
+
+    def update_speedometer_widget(self, latest=None):
+        latest = latest or self.serial_reader.latest_values
+        velocity = latest.get("velocity", 0.0)
+        distance = latest.get("distance_travelled", 0.0)
         self.speedometer_widget.updateSpeedometer(velocity, distance)
 
-    def update_live_data_display(self):
+    def format_value(self, value):
+        """Format a numeric value with a precision suited to its magnitude."""
+        if isinstance(value, (int, float)):
+            if abs(value) < 0.01 and value != 0:
+                return f"{value:.4f}"
+            elif abs(value) < 1:
+                return f"{value:.3f}"
+            else:
+                return f"{value:.2f}"
+        return str(value)
+
+    def update_live_data_display(self, latest=None):
         """Update the live data display with current serial values."""
+        latest = latest or self.serial_reader.latest_values
+        stats_window = self.stats_window_dropdown.currentText()
         for key, value_box in self.data_values.items():
-            current_value = self.serial_reader.latest_values.get(key, None)
+            current_value = latest.get(key, None)
             field = self.data_manager.get_field(key)
             
-            # Check for critical values
-            warning_icon = ""
-            if current_value is not None and key in self.critical_thresholds:
-                thresholds = self.critical_thresholds[key]
-                if current_value < thresholds["min"] or current_value > thresholds["max"]:
-                    warning_icon = "⚠️ "
+            # Warn while an alert on this channel is raised (evaluated in the ingest path)
+            warning_icon = "⚠️ " if self.serial_reader.alerts.is_active(key) else ""
             
             if current_value is not None:
-                # Format the value based on its type
-                if isinstance(current_value, (int, float)):
-                    if abs(current_value) < 0.01 and current_value != 0:
-                        formatted_value = f"{current_value:.4f}"
-                    elif abs(current_value) < 1:
-                        formatted_value = f"{current_value:.3f}"
-                    else:
-                        formatted_value = f"{current_value:.2f}"
-                else:
-                    formatted_value = str(current_value)
-                
-                value_text = f"{warning_icon}{formatted_value}"
+                value_text = f"{warning_icon}{self.format_value(current_value)}"
             else:
                 value_text = "--"
             
             value_box.setText(value_text)
 
-    def update_rssi_display(self):
+            # Rolling statistics for the selected window
+            stats_box = self.data_stats[key]
+            stats = self.serial_reader.stats.get(key, stats_window)
+            if stats_window != "Off" and stats.count:
+                stats_box.setText(
+                    f"{self.format_value(stats.min)} / {self.format_value(stats.mean)} / {self.format_value(stats.max)}")
+                stats_box.setVisible(True)
+            else:
+                stats_box.setVisible(False)
+
+    def on_stats_window_changed(self, window):
+        # The reader publishes the statistics of the shown window with each sample
+        self.serial_reader.stats.watch([window])
+        self.update_live_data_display()
+
+    def update_rssi_display(self, latest=None):
         """Update the RSSI signal strength display."""
-        rssi_value = self.serial_reader.latest_values.get("rssi", None)
+        latest = latest or self.serial_reader.latest_values
+        rssi_value = latest.get("rssi", None)
         if rssi_value is not None:
             # Format RSSI value
             formatted_rssi = f"{rssi_value:.1f}"
@@ -925,71 +911,120 @@ class PlotApp(QMainWindow):
             self.rssi_label.setText("RSSI: -- dBm")
             self.rssi_label.setStyleSheet("color: #888888; font-weight: bold; font-size: 12px; padding: 5px; border: 2px solid #4472c4; border-radius: 4px;")
 
-    def on_new_data(self):
+    def update_upload_display(self):
+        sync = self.outbox_sync
+        text = f"DB: {sync.backlog} queued, {sync.drain_rate():.0f}/s"
+        color = {True: "#00aa00", False: "#ff0000"}.get(sync.reachable, "#888888")
+        self.upload_label.setText(text)
+        tooltip = f"Last error: {sync.last_error}" if sync.reachable is False \
+            else "Entries waiting for the database, and how fast they are being sent"
+        if sync.rejected:
+            tooltip += f"\n{sync.rejected} entries refused by the database, kept in the outbox's dead_letter table"
+        self.upload_label.setToolTip(tooltip)
+        self.upload_label.setStyleSheet(f"color: {color}; font-weight: bold; font-size: 12px; padding: 5px; border: 2px solid #4472c4; border-radius: 4px;")
+
+    def on_new_samples(self, batch):
         """
-        This slot is called every time a new CAN data packet is received.
-        It formats the latest values as a CSV row (prefixed with a rounded timestamp)
-        and appends it to the logging buffer.
+        This slot is called with every batch of new CAN data packets (a SampleBatch).
+        It formats each sample as a CSV row (prefixed with its rounded timestamp),
+        appends them to the logging buffer, queues them for the database and
+        requests a redraw. It reads only the batch, never the reader's state.
         """
-        timestamp = self.get_rounded_timestamp()
-        data_list = [str(self.serial_reader.latest_values.get(key, "")) for key in self.serial_reader.available_data]
-        csv_row = [timestamp] + data_list
-        self.log_buffer.append(csv_row)
-        insert_into_db(self.serial_reader.latest_values)
+        for sample in batch.samples:
+            # Aligned with available_data; values flagged invalid are left blank
+            invalid = sample.invalid
+            data_list = [str(value) for value in sample.row] if not invalid else \
+                ["" if invalid >> i & 1 else str(value) for i, value in enumerate(sample.row)]
+            self.log_buffer.append([self.get_rounded_timestamp(sample.timestamp)] + data_list)
+        self.outbox.append_samples(batch.samples)
         self.update_all_graphs()
 
-    def flush_log_buffer(self):
-        """Write the contents of the log buffer to the CSV file and clear the buffer."""
-        if not self.log_buffer:
-            return
-        try:
-            with open(self.log_filename, "a", newline="") as f:
-                writer = csv.writer(f)
-                writer.writerows(self.log_buffer)
-        except Exception as e:
-            print(f"[DEBUG] Error writing to log file: {e}")
-        self.log_buffer.clear()
+    def on_alert(self, event):
+        """
+        This slot is called for every alert raised or cleared by the ingest thread.
+        It shows the alert in the message box, buffers it for the alert log
+        and stores it in the database.
+        """
+        self.text_box.append(event.message)
+        timestamp = datetime.datetime.fromtimestamp(event.timestamp).replace(microsecond=0).isoformat()
+        self.alert_buffer.append([timestamp, event.rule, event.channel, f"{event.value:.2f}", event.state, event.severity])
+        if not isinstance(self.serial_reader, MockSerialReader):
+            self.outbox.append_alert(event)
 
-    def recover_csv_data(self):
-        """Read only the *last* max_samples lines and fill history."""
-        if not os.path.exists(self.log_filename):
-            return
+    def flush_log_buffer(self):
+        """Write the contents of the log, alert, link and lap buffers to their CSV files and clear the buffers."""
+        link_rows = [minute.as_row() for minute in self.serial_reader.link.drain_minutes()]
+        laps = self.serial_reader.lap_tracker.laps[:]
+        lap_rows = [lap.as_row() for lap in laps[self.laps_logged:]]
+        self.laps_logged = len(laps)
+        for filename, buffer in ((self.log_filename, self.log_buffer), (self.alert_log_filename, self.alert_buffer),
+                                 (self.link_log_filename, link_rows), (self.lap_log_filename, lap_rows)):
+            if not buffer:
+                continue
+            try:
+                with open(filename, "a", newline="") as f:
+                    writer = csv.writer(f)
+                    writer.writerows(buffer)
+            except Exception as e:
+                print(f"[DEBUG] Error writing to log file: {e}")
+            buffer.clear()
+
+    def read_csv_tail(self):
+        """
+        Read only the *last* max_samples lines of the CSV log (without reading
+        the rest of the file). Returns (rows aligned with available_data, timestamps).
+        """
+        if not os.path.exists(self.recover_filename):
+            return [], []
 
         try:
-            with open(self.log_filename, "r", newline="") as f:
-                reader = csv.reader(f)
-                rows = list(reader)
+            with open(self.recover_filename, "rb") as f:
+                header = f.readline()
+                # Read backwards from the end until enough lines are in
+                f.seek(0, os.SEEK_END)
+                end = position = f.tell()
+                tail = b""
+                while position > len(header) and tail.count(b"\n") <= self.max_samples:
+                    position = max(len(header), position - 65536)
+                    f.seek(position)
+                    tail = f.read(end - position)
+            lines = tail.decode("utf-8", "replace").splitlines()
+            if position > len(header):
+                lines = lines[1:]  # the first line read may be cut off
+            rows = list(csv.reader([header.decode("utf-8", "replace")] + lines))
         except Exception as e:
             print(f"[DEBUG] Error reading CSV file: {e}")
-            return
+            return [], []
 
-        # Drop header
-        if rows and rows[0][0].lower() == "timestamp":
+        # Map columns by header name, so logs from an older channel list still load
+        columns = {key: 1 + j for j, key in enumerate(self.serial_reader.available_data)}
+        if rows and rows[0] and rows[0][0].lower() == "timestamp":
+            columns = {key: j for j, key in enumerate(rows[0])}
             rows = rows[1:]
 
         # Take only the tail
-        recent = rows[-self.max_samples:]
-        start = self.max_samples - len(recent)
+        recent = [row for row in rows if row][-self.max_samples:]
 
-        # Prepare empty buffers
-        recovered = {key: [0.0] * self.max_samples for key in self.serial_reader.available_data}
-
-        for idx, row in enumerate(recent):
+        recovered = []
+        timestamps = []
+        measured = set(self.serial_reader.faults.measured_keys)
+        for row in recent:
             # Fill each variable
-            for j, var in enumerate(self.serial_reader.available_data):
+            values = []
+            for var in self.serial_reader.available_data:
                 try:
-                    val = float(row[1+j])
-                except (ValueError, IndexError):
-                    val = 0.0
-                recovered[var][start+idx] = val
-
-        # Commit back into reader
-        for var in self.serial_reader.available_data:
-            self.serial_reader.history[var] = recovered[var].copy()
-            # latest_values should reflect the last recovered sample
-            self.serial_reader.latest_values[var] = recovered[var][-1]
-
-        print("[DEBUG] CSV data recovery complete.")
+                    val = float(row[columns[var]])
+                except (ValueError, IndexError, KeyError):
+                    # A measured value is flagged as missing when loaded; a computed one starts from zero
+                    val = math.nan if var in measured else 0.0
+                values.append(val)
+            try:
+                timestamp = datetime.datetime.fromisoformat(row[0]).timestamp()
+            except (ValueError, IndexError):
+                timestamp = 0.0
+            recovered.append(values)
+            timestamps.append(timestamp)
+        return recovered, timestamps
 
     def start_loading(self):
         self.loading_label.setVisible(True)
@@ -1003,83 +1038,3 @@ class PlotApp(QMainWindow):
         self.stop_loading()
         if not success:
             print(f"[DEBUG] Failed to open port {self.serial_reader.selected_port}")
-
-    def add_graph(self):
-        if len(self.graph_dropdowns) >= MAX_GRAPHS:
-            return
-
-        # Create a container for this graph and its dropdown
-        graph_container = QWidget()
-        graph_container.setObjectName("graph_container")
-        container_layout = QVBoxLayout(graph_container)
-        container_layout.setContentsMargins(10, 10, 10, 10)
-        container_layout.setSpacing(5)
-
-        # Create dropdown selector for this graph
-        dropdown_layout = QHBoxLayout()
-        dropdown_layout.setContentsMargins(0, 0, 0, 0)
-        dropdown_layout.setSpacing(10)
-        
-        graph_label = QLabel(f"Graph {len(self.graph_dropdowns) + 1}:")
-        graph_label.setStyleSheet("font-weight: bold;")
-        
-        graph_dropdown = QComboBox()
-        graph_dropdown.addItems(GRAPH_TYPES)
-        graph_dropdown.setCurrentText("Velocity")
-        graph_dropdown.currentTextChanged.connect(lambda _, id=len(self.graph_dropdowns) + 1: self.update_graph(id))
-        
-        dropdown_layout.addWidget(graph_label)
-        dropdown_layout.addWidget(graph_dropdown)
-        dropdown_layout.addStretch()  # Push dropdown to the left
-        
-        container_layout.addLayout(dropdown_layout)
-
-        # Create the figure and canvas
-        figure, ax = plt.subplots()
-        plot_style = self.get_plot_style()
-        figure.patch.set_facecolor(plot_style['figure_bg'])
-        canvas = FigureCanvas(figure)
-        
-        container_layout.addWidget(canvas)
-
-        # Store references
-        self.graph_containers.append(graph_container)
-        self.graph_dropdowns.append(graph_dropdown)
-        self.figures.append(figure)
-        self.axes.append(ax)
-        self.canvases.append(canvas)
-
-        # Add the container to the main layout
-        self.left_layout.addWidget(graph_container)
-
-        # Update all graphs to reflect the changes
-        self.update_all_graphs()
-
-        # Update buttons
-        self.remove_graph_button.setDisabled(False)
-        if len(self.graph_dropdowns) >= MAX_GRAPHS:
-            self.add_graph_button.setDisabled(True)
-
-    def remove_graph(self):
-        if len(self.graph_dropdowns) <= 1:
-            return
-
-        # Remove the last graph container and all its components
-        graph_container = self.graph_containers.pop()
-        graph_dropdown = self.graph_dropdowns.pop()
-        figure = self.figures.pop()
-        ax = self.axes.pop()
-        canvas = self.canvases.pop()
-
-        # Remove the container from the layout
-        self.left_layout.removeWidget(graph_container)
-        graph_container.deleteLater()
-
-        # Update all graphs to reflect the changes
-        self.update_all_graphs()
-
-        # Update buttons
-        self.add_graph_button.setDisabled(False)
-        if len(self.graph_dropdowns) <= 1:
-            self.remove_graph_button.setDisabled(True)
-
@@ -0,0 +1,69 @@
+import glob
+import os
+import threading
+import serial.tools.list_ports
+from PyQt5.QtCore import QObject, pyqtSignal
+
+##############################
+# Serial Port Monitor
+##############################
+# Watches for serial devices being plugged in and removed. Enumerating ports
+# can take a noticeable time (especially on Windows), so it runs in a
+# background thread and only reports changes; the GUI never enumerates ports
+# itself. pyserial has no portable hotplug events, so the list is polled.
+
+POLL_INTERVAL = 1.0  # s
+# Extra device paths to watch, as glob patterns separated by os.pathsep (e.g.
+# symlinks to pty test devices, which the OS port enumeration does not list)
+EXTRA_PORTS = os.environ.get("HUST_EXTRA_PORTS", "")
+
+
+def list_serial_ports(extra_patterns=EXTRA_PORTS):
+    """Device names of the serial ports present now."""
+    ports = [port.device for port in serial.tools.list_ports.comports()]
+    for pattern in filter(None, extra_patterns.split(os.pathsep)):
+        ports.extend(sorted(glob.glob(pattern)))
+    return list(dict.fromkeys(ports))
+
+
+class PortMonitor(QObject):
+    portsChanged = pyqtSignal(list)  # every port present, after any change (and after the first scan)
+    portAdded = pyqtSignal(str)
+    portRemoved = pyqtSignal(str)
+
+    def __init__(self, interval=POLL_INTERVAL, enumerate_ports=list_serial_ports):
+        super().__init__()
+        self.interval = interval
+        self.enumerate_ports = enumerate_ports
+        self.ports = None  # unknown until the first scan
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join()
+
+    def _run(self):
+        while not self.stopping.is_set():
+            try:
+                ports = self.enumerate_ports()
+            except Exception as e:
+                print(f"[DEBUG] Error listing serial ports: {e}")
+                ports = self.ports or []
+            if ports != self.ports:
+                if self.ports is not None:
+                    for port in ports:
+                        if port not in self.ports:
+                            self.portAdded.emit(port)
+                    for port in self.ports:
+                        if port not in ports:
+                            self.portRemoved.emit(port)
+                self.ports = ports
+                self.portsChanged.emit(ports)
+            self.stopping.wait(self.interval)
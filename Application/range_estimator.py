@@ -0,0 +1,240 @@
+import math
+import os
+import threading
+import time
+import numpy as np
+from history_store import SnapshotExpired
+
+##############################
+# Range Estimation
+##############################
+# How far and how long the car can still drive on what is left in the pack.
+# ConsumptionModel learns, one sample at a time and in constant time, what
+# driving costs:
+#   - the energy the car uses while moving (battery power plus the solar power
+#     feeding the bus, so sun and cloud do not change the consumption) per
+#     distance, in speed bands of BAND_KMH, each forgetting exponentially over
+#     the last WINDOW_KM driven (lazily: a band is only decayed when touched)
+#   - the same over all speeds, for the "recent consumption" channel
+#   - the cruise speed (EWMA while moving) and the solar input (EWMA)
+#   - the share of time spent moving and the standstill draw (battery plus
+#     solar power while stopped: electronics, cooling, pit stops), both EWMAs
+# RangeRefit fits power as a function of speed, P(v) = c0 + c1 v + c3 v^3
+# (rolling resistance and drivetrain losses, aerodynamic drag), to the recent
+# history in a background thread every REFIT_INTERVAL, weighting recent
+# samples more. The fit covers the speed bands with too little recent distance
+# to be trusted on their own.
+#
+# The prediction assumes the car goes on as recently: moving at its cruise
+# speed for the recent share of the time and standing for the rest. The
+# battery drains at the consumption at the cruise speed times the speed while
+# moving, at the standstill draw while stopped, less the solar input, and the
+# remaining energy (derived_metrics.RemainingEnergy) lasts that long; the
+# range is that time at the average speed, stops included. The energy is
+# counted down from a state of charge read off the resting cell voltage
+# (OPEN_CIRCUIT), re-read whenever the pack rests, with the pack's nominal
+# energy from HUST_PACK_WH.
+
+PACK_WH = float(os.environ.get("HUST_PACK_WH", "5000"))  # usable pack energy when full
+# Li-ion open-circuit cell voltage (V) against state of charge (0-1)
+OPEN_CIRCUIT = np.array([[3.00, 3.30, 3.50, 3.60, 3.70, 3.80, 3.90, 4.00, 4.10, 4.20],
+                         [0.00, 0.05, 0.15, 0.30, 0.50, 0.65, 0.75, 0.85, 0.94, 1.00]])
+MIN_CELL_VOLT = 2.5      # lower readings are not a cell voltage (nothing received yet)
+REST_CURRENT = 2.0       # A, below this the pack is resting and its voltage is near open circuit
+REST_SECONDS = 60.0      # rest needed before the state of charge is read again
+
+BAND_KMH = 10.0          # width of a speed band
+BANDS = 16               # bands up to 160 km/h; faster samples count in the last one
+WINDOW_KM = 20.0         # distance over which the consumption is forgotten
+MIN_BAND_KM = 1.0        # recent distance a band needs before it is used on its own
+MIN_KM = 0.2             # recent distance needed before any consumption is known
+MOVING_KMH = 5.0         # slower counts as standing still
+CRUISE_SECONDS = 300.0   # time constant of the cruise speed
+SOLAR_SECONDS = 3600.0   # time constant of the solar input (predictions span hours; passing cloud averages out)
+MOVING_SECONDS = 3600.0  # time constant of the share of time moving (long enough to span pit stops)
+IDLE_SECONDS = 300.0     # time constant, in time stopped, of the standstill draw
+MAX_HOURS = 24.0         # predictions are capped here (the sun may cover the load)
+
+REFIT_INTERVAL = 30.0    # s between fits
+REFIT_SAMPLES = 3600     # newest samples used by a fit (an hour at the send interval, within HISTORY_CAPACITY)
+REFIT_SECONDS = 1800.0   # age at which a sample's weight in the fit has fallen to 1/e
+MIN_FIT_SAMPLES = 60     # moving samples needed for a fit
+STOP_TIMEOUT = 5.0
+
+
+class ConsumptionModel:
+    """Rolling energy per distance by speed band, cruise speed, time moving, standstill draw and solar input."""
+
+    def __init__(self, band_kmh=BAND_KMH, bands=BANDS, window_km=WINDOW_KM):
+        self.band_kmh = band_kmh
+        self.bands = bands
+        self.window_km = window_km
+        self.fit = None  # (c0, c1, c3) of P(v) in W, v in km/h; replaced as a whole by RangeRefit
+        # Drain (NaN while unknown) and average speed per sample of the last batch, for the channels after it
+        self.batch_drain = self.batch_pace = None
+        self.reset()
+
+    def reset(self):
+        self.odometer = 0.0                   # km driven since the start (distance decreases ignored)
+        self.last_distance = None
+        self.band_energy = [0.0] * self.bands  # decayed Wh per band
+        self.band_km = [0.0] * self.bands      # decayed km per band
+        self.band_at = [0.0] * self.bands      # odometer when each band was last decayed
+        self.energy = 0.0                      # decayed Wh and km over all speeds
+        self.km = 0.0
+        self.cruise = 0.0                      # km/h
+        self.solar = 0.0                       # W
+        self.solar_known = False
+        self.moving_share = 1.0                # share of the time moving
+        self.idle = 0.0                        # W used by the whole car while stopped
+        self.idle_known = False
+
+    def update(self, velocity, distance, power, solar, dt):
+        """Add one sample: speed (km/h), odometer (km), battery and solar power (W), seconds since the last one."""
+        moved = 0.0 if self.last_distance is None else distance - self.last_distance
+        self.last_distance = distance
+        weight = 1.0 - math.exp(-dt / SOLAR_SECONDS)
+        if self.solar_known:
+            self.solar += weight * (solar - self.solar)
+        else:
+            self.solar, self.solar_known = solar, True
+        stopped = velocity < MOVING_KMH
+        self.moving_share += (1.0 - math.exp(-dt / MOVING_SECONDS)) * ((not stopped) - self.moving_share)
+        if stopped:
+            if self.idle_known:
+                self.idle += (1.0 - math.exp(-dt / IDLE_SECONDS)) * (power + solar - self.idle)
+            else:
+                self.idle, self.idle_known = power + solar, True
+            return
+        if moved <= 0.0:
+            return
+        self.odometer += moved
+        used = (power + solar) * dt / 3600.0  # Wh for the whole car
+        keep = math.exp(-moved / self.window_km)
+        self.energy = self.energy * keep + used
+        self.km = self.km * keep + moved
+        band = min(int(velocity / self.band_kmh), self.bands - 1)
+        keep = math.exp((self.band_at[band] - self.odometer) / self.window_km)
+        self.band_energy[band] = self.band_energy[band] * keep + used
+        self.band_km[band] = self.band_km[band] * keep + moved
+        self.band_at[band] = self.odometer
+        if self.cruise:
+            self.cruise += (1.0 - math.exp(-dt / CRUISE_SECONDS)) * (velocity - self.cruise)
+        else:
+            self.cruise = velocity
+
+    def recent_per_km(self):
+        """Wh/km over the recent distance at any speed (0 until MIN_KM has been driven)."""
+        return self.energy / self.km if self.km >= MIN_KM else 0.0
+
+    def per_km(self, velocity):
+        """
+        Expected Wh/km at `velocity`: the band's recent consumption if it has
+        enough recent distance, else the fitted power curve, else the recent
+        consumption at any speed. None while nothing is known.
+        """
+        band = min(int(velocity / self.band_kmh), self.bands - 1)
+        km = self.band_km[band] * math.exp((self.band_at[band] - self.odometer) / self.window_km)
+        if km >= MIN_BAND_KM:
+            return self.band_energy[band] / self.band_km[band]  # both decay alike
+        fit = self.fit
+        if fit is not None and velocity >= MOVING_KMH:
+            c0, c1, c3 = fit
+            return max(0.0, (c0 + c1 * velocity + c3 * velocity ** 3) / velocity)
+        return self.energy / self.km if self.km >= MIN_KM else None
+
+    def drain(self):
+        """
+        Average battery power (W): the power at the cruise speed and the
+        standstill draw, weighted by the share of time moving, less the solar
+        input. None while nothing is known.
+        """
+        per_km = self.per_km(self.cruise) if self.cruise >= MOVING_KMH else None
+        if per_km is None:
+            return None
+        share = self.moving_share
+        return share * per_km * self.cruise + (1.0 - share) * self.idle - self.solar
+
+    def pace(self):
+        """Average speed (km/h), stops included: the cruise speed over the share of time moving."""
+        return self.cruise * self.moving_share
+
+
+def hours_left(energy, drain):
+    """Hours `energy` (Wh) lasts at `drain` (W), capped at MAX_HOURS; 0 without energy or a drain (None)."""
+    if drain is None or energy <= 0.0:
+        return 0.0
+    if drain <= energy / MAX_HOURS:
+        return MAX_HOURS
+    return energy / drain
+
+
+def state_of_charge(cell_volt):
+    """State of charge (0-1) of a cell resting at `cell_volt`."""
+    return float(np.interp(cell_volt, OPEN_CIRCUIT[0], OPEN_CIRCUIT[1]))
+
+
+def fit_power_curve(velocity, power, timestamps, tau=REFIT_SECONDS):
+    """
+    Weighted least-squares fit of P(v) = c0 + c1 v + c3 v^3 to the moving
+    samples, weights falling off with age as exp(-age / tau). Returns
+    (c0, c1, c3), or None with too few samples.
+    """
+    ok = np.isfinite(velocity) & np.isfinite(power) & (velocity >= MOVING_KMH)
+    if ok.sum() < MIN_FIT_SAMPLES:
+        return None
+    v, p, t = velocity[ok], power[ok], timestamps[ok]
+    if v.max() - v.min() < BAND_KMH:
+        # One speed: fit a constant consumption per distance instead of extrapolating a curve
+        weight = np.exp((t - t[-1]) / tau)
+        return (0.0, float(np.sum(weight * p) / np.sum(weight * v)), 0.0)
+    root = np.sqrt(np.exp((t - t[-1]) / tau))
+    design = np.column_stack([np.ones_like(v), v, v ** 3]) * root[:, None]
+    coefficients = np.linalg.lstsq(design, p * root, rcond=None)[0]
+    return tuple(float(c) for c in coefficients)
+
+
+class RangeRefit:
+    """Refits a ConsumptionModel's power curve from the history store in a background thread."""
+
+    def __init__(self, store, model, interval=REFIT_INTERVAL, samples=REFIT_SAMPLES):
+        self.store = store
+        self.model = model
+        self.interval = interval
+        self.samples = samples
+        self.duration = 0.0  # s taken by the last fit
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def start(self):
+        self.stopping.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout=STOP_TIMEOUT):
+        self.stopping.set()
+        if self.thread:
+            self.thread.join(timeout)
+
+    def refit(self):
+        """Fit the newest samples and publish the coefficients (unchanged if there are too few)."""
+        began = time.perf_counter()
+        snapshot = self.store.snapshot()
+        n = min(self.samples, snapshot.count - snapshot.first())
+        if n <= 0:
+            return None
+        rows = snapshot.window(n, ["velocity", "battery_power", "MPPT_total_watt"], gaps=True)
+        fit = fit_power_curve(rows[:, 0], rows[:, 1] + rows[:, 2], snapshot.timestamps(n))
+        if fit is not None:
+            self.model.fit = fit
+        self.duration = time.perf_counter() - began
+        return fit
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            try:
+                self.refit()
+            except SnapshotExpired as e:
+                print(f"[DEBUG] Skipping range model refit: {e}")
+            except Exception as e:
+                print(f"[DEBUG] Range model refit failed: {e}")
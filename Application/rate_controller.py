@@ -0,0 +1,155 @@
+import math
+from collections import deque
+from lora_link import SETTINGS, DEFAULT_SETTING, SNR_LIMIT, noise_floor, packet_rate
+from link_analytics import SEND_INTERVAL, LOSS_WINDOW
+
+##############################
+# LoRa Data-Rate Controller
+##############################
+# Chooses the spreading factor and bandwidth from what the receiver measures.
+# The link margin of every candidate setting is predicted from the smoothed
+# SNR of the current one (a narrower bandwidth lets in less noise, a higher
+# spreading factor decodes further below the noise), and the controller picks
+# the setting with the highest packet rate whose margin clears a safety margin.
+# The safety margin itself is closed-loop: packet loss is measured as the
+# achieved packet rate against the rate the setting allows, and the margin
+# grows while loss is above the target and shrinks slowly while it is well
+# below. A change that silences the link (the downlink was lost, so the car
+# never switched) is reverted and that setting avoided for a while.
+#
+# Commands are sent to the receiver as "PARAM <sf> <bw>"; the receiver
+# forwards them to the car over LoRa and then switches its own radio.
+
+SNR_SMOOTHING = 0.2       # EWMA weight of a new SNR reading
+SNR_SATURATION = 5.0      # dB; above this the radio's SNR reading is unreliable, RSSI is used instead
+MIN_MARGIN = 4.0          # dB
+MAX_MARGIN = 16.0         # dB
+MIN_PACKETS = 10          # expected packets on a setting before judging it
+MIN_LOST = 3              # lost packets before loss counts as above target (one or two can be bad luck)
+AVOID_TIME = 120.0        # s a setting that silenced the link is not tried again
+
+
+def format_command(setting):
+    sf, bw = setting
+    return f"PARAM {sf} {bw}"
+
+
+class RateController:
+    """Picks the fastest SF/BW that keeps packet loss under `loss_target` percent."""
+
+    def __init__(self, loss_target=5.0, margin_db=8.0, hold_time=30.0, revert_timeout=10.0,
+                 send_interval=SEND_INTERVAL, setting=DEFAULT_SETTING, settings=SETTINGS):
+        self.loss_target = loss_target
+        self.margin_db = margin_db
+        self.hold_time = hold_time          # s before speeding up again, so each change can be judged
+        self.revert_timeout = revert_timeout
+        self.send_interval = send_interval
+        self.settings = list(settings)
+        self.setting = setting
+        self.previous = None
+        self.changed_at = 0.0
+        self.avoid = {}       # setting -> time until which it is not tried
+        self.enabled = True
+        self.snr = None       # smoothed, for the current setting
+        self.arrivals = deque()  # packet times on the current setting, within LOSS_WINDOW
+
+    def on_packet(self, timestamp, rssi, snr):
+        """Feed one received packet's measurements."""
+        if self.snr is None:
+            self.changed_at = timestamp  # measure loss from the first packet on
+        if snr > SNR_SATURATION:
+            snr = max(snr, rssi - noise_floor(self.setting[1]))
+        self.snr = snr if self.snr is None else self.snr + SNR_SMOOTHING * (snr - self.snr)
+        self.arrivals.append(timestamp)
+
+    def expected_packets(self, now):
+        """Packets the current setting should have delivered over the loss window."""
+        return math.floor(min(now - self.changed_at, LOSS_WINDOW) * packet_rate(*self.setting, self.send_interval))
+
+    def achieved_rate(self, now):
+        """Packets per second received over the loss window (on the current setting)."""
+        self._expire(now)
+        span = min(now - self.changed_at, LOSS_WINDOW)
+        return len(self.arrivals) / span if span > 0 else 0.0
+
+    def loss_pct(self, now):
+        """Loss on the current setting: the achieved packet rate against the rate the setting allows."""
+        self._expire(now)
+        expected = self.expected_packets(now)
+        if expected <= 0:
+            return 0.0
+        return max(0.0, 100.0 * (1.0 - len(self.arrivals) / expected))
+
+    def _expire(self, now):
+        while self.arrivals and now - self.arrivals[0] > LOSS_WINDOW:
+            self.arrivals.popleft()
+
+    def predicted_margin(self, setting):
+        """Margin (dB) above the demodulation limit that `setting` would have at the current signal level."""
+        sf, bw = setting
+        snr = self.snr + 10.0 * math.log10(self.setting[1] / bw)
+        return snr - SNR_LIMIT[sf]
+
+    def candidates(self, now):
+        return [s for s in self.settings if self.avoid.get(s, 0.0) <= now or s == self.setting]
+
+    def choose(self, settings):
+        """The best of `settings` for the current signal: fastest with enough margin, most margin among equals."""
+        feasible = [s for s in settings if self.predicted_margin(s) >= self.margin_db]
+        if not feasible:
+            return max(settings, key=self.predicted_margin)
+        return max(feasible, key=lambda s: (round(packet_rate(*s, self.send_interval), 3), self.predicted_margin(s)))
+
+    def poll(self, now):
+        """Decide whether to change setting. Returns the new (sf, bw) to command, or None."""
+        if not self.enabled:
+            return None
+        elapsed = now - self.changed_at
+        expected = self.expected_packets(now)
+
+        # Nothing heard since the last change: the car most likely never switched.
+        if (self.previous is not None and not self.arrivals and elapsed >= self.revert_timeout
+                and expected >= 3):
+            print(f"[DEBUG] No packets on {format_command(self.setting)}, reverting")
+            self.avoid[self.setting] = now + AVOID_TIME
+            return self._switch(self.previous, now, revert=True)
+
+        current_rate = packet_rate(*self.setting, self.send_interval)
+        # Slow settings fit only a few packets in the loss window
+        if self.snr is None or expected < min(MIN_PACKETS, 0.5 * LOSS_WINDOW * current_rate):
+            return None
+
+        loss = self.loss_pct(now)
+        lost = expected - len(self.arrivals)
+        if loss > self.loss_target and lost >= MIN_LOST:
+            # Close the loop on the margin, and never speed up while losing packets
+            self.margin_db = min(MAX_MARGIN, self.margin_db + 1.0)
+            slower = [s for s in self.candidates(now)
+                      if packet_rate(*s, self.send_interval) <= current_rate and s != self.setting]
+            if not slower:
+                return None
+            best = self.choose(slower)
+        elif self.predicted_margin(self.setting) < self.margin_db:
+            best = self.choose(self.candidates(now))
+        else:
+            # The current setting is fine; only move for a real throughput gain, and not too often
+            if elapsed < self.hold_time:
+                return None
+            if loss < 0.5 * self.loss_target:
+                self.margin_db = max(MIN_MARGIN, self.margin_db - 0.5)
+            best = self.choose(self.candidates(now))
+            if packet_rate(*best, self.send_interval) <= 1.05 * current_rate:
+                return None
+        if best == self.setting:
+            return None
+        return self._switch(best, now)
+
+    def _switch(self, setting, now, revert=False):
+        if self.snr is not None:
+            # Carry the SNR estimate over to the new bandwidth
+            self.snr += 10.0 * math.log10(self.setting[1] / setting[1])
+        self.previous = None if revert else self.setting
+        self.setting = setting
+        self.changed_at = now
+        self.arrivals.clear()
+        return setting
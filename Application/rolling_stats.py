@@ -0,0 +1,184 @@
+import time
+from collections import deque, namedtuple
+from channel_schema import SCHEMA
+from sample import Sample
+
+##############################
+# Rolling Statistics
+##############################
+# Min, max, mean and variance per channel over sliding windows, maintained as
+# samples arrive so nothing ever has to rescan the history:
+# - min/max use monotonic deques (each sample is pushed and popped at most once)
+# - mean/variance use running sums, shifted by the first sample for precision
+# A window is bounded by time (seconds), by sample count, by both, or by
+# neither (the whole session, which then keeps no per-sample state at all).
+# Values the fault detector flagged invalid are not counted.
+#
+# The windows belong to the thread calling update(). After each sample it
+# publishes the WindowStats of the watched windows (the ones a display shows)
+# as one new, never modified dict, which get() reads, so other threads (the
+# GUI) see the statistics of one sample and never the windows mid-update.
+
+WindowStats = namedtuple("WindowStats", ["min", "max", "mean", "variance", "count"])
+EMPTY_STATS = WindowStats(None, None, None, None, 0)
+
+# Windows offered in the UI, name -> (seconds, samples)
+DEFAULT_WINDOWS = {
+    "10 s": (10.0, None),
+    "1 min": (60.0, None),
+    "10 min": (600.0, None),
+    "Session": (None, None),
+}
+
+
+class RollingWindow:
+    """Statistics of one channel over the most recent samples."""
+
+    def __init__(self, seconds=None, samples=None):
+        self.seconds = seconds
+        self.samples = samples
+        self.bounded = seconds is not None or samples is not None
+        self.reset()
+
+    def reset(self):
+        self.window = deque()     # (seq, timestamp, value) of samples inside the window
+        self.min_deque = deque()  # (seq, value), values increasing
+        self.max_deque = deque()  # (seq, value), values decreasing
+        self.seq = 0
+        self.count = 0
+        self.shift = None
+        self.sum = 0.0
+        self.sum_sq = 0.0
+        self.session_min = None
+        self.session_max = None
+
+    def push(self, timestamp, value):
+        if self.shift is None:
+            self.shift = value
+        d = value - self.shift
+        self.sum += d
+        self.sum_sq += d * d
+        self.count += 1
+
+        if not self.bounded:
+            if self.session_min is None or value < self.session_min:
+                self.session_min = value
+            if self.session_max is None or value > self.session_max:
+                self.session_max = value
+            return
+
+        seq = self.seq
+        self.seq += 1
+        self.window.append((seq, timestamp, value))
+        while self.min_deque and self.min_deque[-1][1] >= value:
+            self.min_deque.pop()
+        self.min_deque.append((seq, value))
+        while self.max_deque and self.max_deque[-1][1] <= value:
+            self.max_deque.pop()
+        self.max_deque.append((seq, value))
+        self._evict(timestamp)
+
+    def _evict(self, now):
+        window = self.window
+        while window and (
+            (self.samples is not None and len(window) > self.samples)
+            or (self.seconds is not None and now - window[0][1] > self.seconds)
+        ):
+            seq, _, value = window.popleft()
+            d = value - self.shift
+            self.sum -= d
+            self.sum_sq -= d * d
+            self.count -= 1
+            if self.min_deque[0][0] == seq:
+                self.min_deque.popleft()
+            if self.max_deque[0][0] == seq:
+                self.max_deque.popleft()
+
+    @property
+    def min(self):
+        if not self.bounded:
+            return self.session_min
+        return self.min_deque[0][1] if self.min_deque else None
+
+    @property
+    def max(self):
+        if not self.bounded:
+            return self.session_max
+        return self.max_deque[0][1] if self.max_deque else None
+
+    def stats(self):
+        n = self.count
+        if n == 0:
+            return EMPTY_STATS
+        mean = self.sum / n
+        variance = max(0.0, self.sum_sq / n - mean * mean)
+        return WindowStats(self.min, self.max, self.shift + mean, variance, n)
+
+
+class RollingStatistics:
+    """Rolling windows for every channel, updated once per sample."""
+
+    def __init__(self, keys, windows=None):
+        self.keys = list(keys)
+        self.aligned = self.keys == SCHEMA.keys  # a Sample's row then lines up with the windows
+        self.windows = {}
+        self.watched = ()    # window names published after each sample
+        self.published = {}  # window name -> {key: WindowStats}, replaced as a whole after each sample
+        for name, (seconds, samples) in (DEFAULT_WINDOWS if windows is None else windows).items():
+            self.add_window(name, seconds, samples)
+
+    def add_window(self, name, seconds=None, samples=None):
+        self.windows[name] = {key: RollingWindow(seconds, samples) for key in self.keys}
+
+    def window_names(self):
+        return list(self.windows.keys())
+
+    def update(self, values, timestamp=None, publish=True):
+        """Add one sample (a Sample, or a dict of every key) and, unless `publish` is False, publish the statistics."""
+        if timestamp is None:
+            timestamp = time.time()
+        if self.aligned and isinstance(values, Sample):
+            row, invalid = values.row, values.invalid
+        else:
+            row, invalid = [values[key] for key in self.keys], 0
+        if invalid:
+            # Values flagged by the fault detector are left out
+            pushed = [i for i in range(len(row)) if not invalid >> i & 1]
+            for channels in self.windows.values():
+                windows = list(channels.values())
+                for i in pushed:
+                    windows[i].push(timestamp, row[i])
+        else:
+            for channels in self.windows.values():
+                for window, value in zip(channels.values(), row):
+                    window.push(timestamp, value)
+        if publish:
+            self.publish()
+
+    def watch(self, window_names):
+        """Publish these windows from the next sample on (and no others)."""
+        self.watched = tuple(name for name in window_names if name in self.windows)
+
+    def publish(self):
+        """Replace the published statistics with the watched windows' current ones."""
+        self.published = {name: dict(zip(self.keys, [window.stats() for window in self.windows[name].values()]))
+                          for name in self.watched}
+
+    def get(self, key, window_name):
+        """
+        WindowStats for a channel over a watched window as of the last sample
+        (all fields None when empty, or until the window is first published).
+        """
+        return self.published.get(window_name, {}).get(key, EMPTY_STATS)
+
+    def max(self, key, window_name):
+        return self.get(key, window_name).max
+
+    def min(self, key, window_name):
+        return self.get(key, window_name).min
+
+    def reset(self):
+        for channels in self.windows.values():
+            for window in channels.values():
+                window.reset()
+        self.published = {}
@@ -0,0 +1,76 @@
+from collections.abc import MutableMapping
+from operator import attrgetter
+from channel_schema import SCHEMA
+
+##############################
+# Sample Record
+##############################
+# One sample of every channel is a single list aligned with SCHEMA.keys (the
+# same layout as a history store row), wrapped in a slotted record that reads
+# and writes by channel key like a dict. The ingest path copies the previous
+# sample's row once, fills in what arrived, computes the derived channels in
+# place and hands the same object to statistics, laps, history and alerts;
+# the GUI gets it as `latest_values` without anything being rebuilt.
+#
+# `invalid` is the sample's validity bitmask (bit i set: channel i was flagged
+# by the fault detector), stored with the row in the history.
+
+INDEX = SCHEMA.index
+MEASURED_INDEX = [SCHEMA.index[key] for key in SCHEMA.measured_keys]
+# Reads the measured channels from an object's attributes, in measured_keys order
+read_measured = attrgetter(*SCHEMA.measured_keys)
+
+
+class Sample(MutableMapping):
+    """Every channel's value at one time, as `row` (aligned with SCHEMA.keys); also a key -> value mapping."""
+    __slots__ = ("row", "timestamp", "invalid")
+
+    def __init__(self, row, timestamp=0.0, invalid=0):
+        self.row = row
+        self.timestamp = timestamp
+        self.invalid = invalid
+
+    @classmethod
+    def zeros(cls):
+        return cls([0.0] * len(SCHEMA.keys))
+
+    def copy(self):
+        return Sample(self.row[:], self.timestamp, self.invalid)
+
+    def assign(self, values):
+        """Set channels from a dict, or from a sequence aligned with SCHEMA.measured_keys."""
+        row = self.row
+        if isinstance(values, dict):
+            for key, value in values.items():
+                row[INDEX[key]] = value
+        else:
+            for i, value in zip(MEASURED_INDEX, values):
+                row[i] = value
+
+    def is_valid(self, key):
+        return not self.invalid >> INDEX[key] & 1
+
+    def __getitem__(self, key):
+        return self.row[INDEX[key]]
+
+    def __setitem__(self, key, value):
+        self.row[INDEX[key]] = value
+
+    def __delitem__(self, key):
+        raise TypeError("a sample always has every channel")
+
+    def get(self, key, default=None):
+        i = INDEX.get(key)
+        return default if i is None else self.row[i]
+
+    def __contains__(self, key):
+        return key in INDEX
+
+    def __iter__(self):
+        return iter(SCHEMA.keys)
+
+    def __len__(self):
+        return len(self.row)
+
+    def __repr__(self):
+        return f"Sample({dict(self)!r})"
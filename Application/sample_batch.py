@@ -0,0 +1,72 @@
+import time
+from dataclasses import dataclass
+
+##############################
+# Sample Batches
+##############################
+# The reader hands new samples to the GUI thread as immutable batches carried
+# by the signal itself, so a slot never reads the reader's state (which the
+# reader thread keeps changing) and a burst of packets costs the GUI one
+# queued event instead of one per packet.
+#
+# SampleBatcher throttles the signal rather than delaying it: a sample
+# arriving when nothing was sent for INTERVAL goes out at once, alone, so a
+# slow link sees no added latency; while packets come faster, they are
+# collected and sent at most once per INTERVAL, or as soon as MAX_SAMPLES are
+# waiting. The reader calls poll() while idle so the last samples of a burst
+# do not wait for the next packet.
+#
+# The samples in a batch are the ones the reader published as latest_values,
+# which are replaced, never modified, once published.
+
+MAX_SAMPLES = 64   # samples per batch at most
+INTERVAL = 0.05    # s, the shortest time between two batches (20 per second)
+
+
+@dataclass(frozen=True)
+class SampleBatch:
+    samples: tuple   # Samples, oldest first
+    emitted: float   # epoch seconds when the batch was sent
+
+    @property
+    def latest(self):
+        return self.samples[-1]
+
+
+class SampleBatcher:
+    """Collects samples in the reader thread and passes them to `emit(batch)` as SampleBatches."""
+
+    def __init__(self, emit, max_samples=MAX_SAMPLES, interval=INTERVAL):
+        self.emit = emit
+        self.max_samples = max_samples
+        self.interval = interval
+        self.pending = []
+        self.last_emit = 0.0
+        self.batches = 0  # sent this session
+        self.samples = 0
+
+    def add(self, sample, now=None):
+        """Queue a published sample; sends the batch if it is full or the last one went out INTERVAL ago."""
+        now = time.time() if now is None else now
+        self.pending.append(sample)
+        if len(self.pending) >= self.max_samples or now - self.last_emit >= self.interval:
+            self.flush(now)
+
+    def poll(self, now=None):
+        """Send the waiting samples once INTERVAL has passed since the last batch."""
+        if self.pending:
+            now = time.time() if now is None else now
+            if now - self.last_emit >= self.interval:
+                self.flush(now)
+
+    def flush(self, now=None):
+        """Send the waiting samples now, if any."""
+        if not self.pending:
+            return
+        now = time.time() if now is None else now
+        batch = SampleBatch(tuple(self.pending), now)
+        self.pending = []
+        self.last_emit = now
+        self.batches += 1
+        self.samples += len(batch.samples)
+        self.emit(batch)
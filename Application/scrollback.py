@@ -0,0 +1,177 @@
+import datetime
+import math
+import queue
+import threading
+import warnings
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Optional
+import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal
+from history_store import SnapshotExpired
+
+##############################
+# Graph Scrollback
+##############################
+# A graph that is zoomed or panned away from the live view shows a time range
+# read from the history store instead of the live window. The time axis is cut
+# into windows whose size is the power of two (in seconds) at or above the
+# visible span, so zooming by small steps and panning hit the same windows.
+# Each window is read once in a background thread, reduced to about as many
+# points as the canvas has pixels (minimum and maximum of each bucket, so
+# spikes survive), and cached. The windows either side of the visible ones are
+# prefetched, so panning finds them ready. The GUI thread never reads the
+# store for a scrolled graph; it draws what is cached and redraws when
+# windowReady fires.
+
+DEFAULT_SPAN = 200.0   # s shown when leaving the live view
+MIN_SPAN = 10.0        # s, most zoomed in
+MAX_SPAN = 7 * 86400.0
+CACHE_WINDOWS = 64
+ZOOM_STEP = 1.25
+
+
+@dataclass
+class GraphView:
+    """What one graph shows: the live window, or a fixed time range."""
+    follow_live: bool = True
+    end: float = 0.0               # epoch seconds at the right edge
+    span: float = DEFAULT_SPAN     # seconds
+    drag_x: Optional[float] = None  # pixel where a pan started
+    drag_end: float = 0.0
+
+    @property
+    def start(self):
+        return self.end - self.span
+
+    def zoom(self, factor, center):
+        """Scale the span by `factor`, keeping the time at `center` where it is."""
+        span = min(max(self.span * factor, MIN_SPAN), MAX_SPAN)
+        fraction = (center - self.start) / self.span if self.span else 1.0
+        self.end = center + (1.0 - fraction) * span
+        self.span = span
+
+
+def window_size(span):
+    return 2.0 ** math.ceil(math.log2(max(span, 1.0)))
+
+
+def to_plot_time(timestamps):
+    """Matplotlib date numbers in local time for epoch seconds."""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if not len(timestamps):
+        return timestamps
+    offset = datetime.datetime.fromtimestamp(timestamps[0]).astimezone().utcoffset().total_seconds()
+    return (timestamps + offset) / 86400.0
+
+
+def from_plot_time(x, reference):
+    """Epoch seconds for a matplotlib date number, using the UTC offset at `reference`."""
+    offset = datetime.datetime.fromtimestamp(reference).astimezone().utcoffset().total_seconds()
+    return x * 86400.0 - offset
+
+
+def decimate(timestamps, rows, points):
+    """Reduce to about `points` buckets, keeping each bucket's minimum and maximum (per column, ignoring NaN)."""
+    n = len(timestamps)
+    if n <= 2 * points:
+        return timestamps, rows
+    bucket = math.ceil(n / points)
+    m = n // bucket * bucket
+    times = timestamps[:m].reshape(-1, bucket).mean(axis=1)
+    grouped = rows[:m].reshape(-1, bucket, rows.shape[1])
+    envelope = np.empty((2 * len(times), rows.shape[1]))
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)  # a bucket of only gaps stays a gap
+        envelope[0::2] = np.nanmin(grouped, axis=1)
+        envelope[1::2] = np.nanmax(grouped, axis=1)
+    return (np.concatenate([np.repeat(times, 2), timestamps[m:]]),
+            np.concatenate([envelope, rows[m:]]))
+
+
+class HistoryLoader(QObject):
+    """Reads time windows of the history store in a background thread, with caching and prefetch."""
+    windowReady = pyqtSignal()  # a window asked for by a visible graph has been loaded
+
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+        self.cache = OrderedDict()  # (keys, size, index, points) -> (timestamps, rows, count when read, complete)
+        self.lock = threading.Lock()
+        self.queued = set()
+        self.jobs = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def request(self, keys, start, end, points):
+        """
+        Cached data for `keys` between `start` and `end` (epoch seconds), as
+        (timestamps, rows); loads what is missing, and the neighbouring
+        windows, in the background.
+        """
+        keys = tuple(keys)
+        size = window_size(end - start)
+        points = max(64, int(points) // 64 * 64)
+        first, last = math.floor(start / size), math.floor(end / size)
+        parts = []
+        count = self.store.count
+        for index in range(first - 1, last + 2):
+            key = (keys, size, index, points)
+            with self.lock:
+                entry = self.cache.get(key)
+                if entry is not None:
+                    self.cache.move_to_end(key)
+            visible = first <= index <= last
+            # The window at the live edge is read again once new samples have arrived
+            stale = entry is None or (not entry[3] and entry[2] < count)
+            if stale:
+                self._queue(key, visible)
+            if visible and entry is not None:
+                parts.append(entry)
+        if not parts:
+            return np.zeros(0), np.zeros((0, len(keys)))
+        timestamps = np.concatenate([part[0] for part in parts])
+        rows = np.concatenate([part[1] for part in parts])
+        inside = (timestamps >= start) & (timestamps <= end)
+        return timestamps[inside], rows[inside]
+
+    def clear(self):
+        with self.lock:
+            self.cache.clear()
+
+    def _queue(self, key, visible):
+        with self.lock:
+            if key in self.queued:
+                return
+            self.queued.add(key)
+        self.jobs.put((key, visible))
+
+    def _run(self):
+        while True:
+            key, visible = self.jobs.get()
+            try:
+                entry = self._load(*key)
+            except SnapshotExpired as e:
+                print(f"[DEBUG] Scrollback window no longer held: {e}")
+                entry = None
+            except Exception as e:
+                print(f"[DEBUG] Error loading scrollback window: {e}")
+                entry = None
+            with self.lock:
+                self.queued.discard(key)
+                if entry is not None:
+                    self.cache[key] = entry
+                    while len(self.cache) > CACHE_WINDOWS:
+                        self.cache.popitem(last=False)
+            if entry is not None and visible:
+                self.windowReady.emit()
+
+    def _load(self, keys, size, index, points):
+        snapshot = self.store.snapshot()
+        start, end = index * size, (index + 1) * size
+        first, last = snapshot.search(start), snapshot.search(end)
+        timestamps, rows = snapshot.range(first, last, list(keys), gaps=True)
+        timestamps, rows = decimate(timestamps, rows, points)
+        # Complete once a later sample exists; otherwise new ones may still fall in the window
+        complete = last < snapshot.count
+        return timestamps, rows, snapshot.count, complete
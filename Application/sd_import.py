@@ -0,0 +1,184 @@
+"""
+Import the car's SD-card logs into the dashboard's CSV layout, and optionally
+the database.
+
+The car appends one line per send interval to /log_<n>.txt (a new file every
+power-up): the payload channels as space-separated values, without
+timestamps. Files are imported in parallel, one per worker process; each one
+is a session, so its derived channels (power, energy) start from zero.
+
+Timestamps are rebuilt from the send interval: by default a file is taken to
+end at its modification time; with --start the files are laid end to end
+(in log number order, --gap seconds apart) from the given time instead, for
+cards whose clock was never set.
+
+Usage (from the Application folder):
+    python sd_import.py E:/ --out imported
+    python sd_import.py sd_backup/ --start 2025-06-01T09:00:00 --workers 8 --db
+"""
+import argparse
+import datetime
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from channel_schema import SCHEMA
+from derived_metrics import DerivedMetricsEngine
+from link_analytics import SEND_INTERVAL
+
+LOG_PATTERN = re.compile(r"^log_(\d+)\.txt$")
+DB_BATCH_SIZE = 5000
+
+
+def find_log_files(directory):
+    """The SD-card log files in `directory`, in log number order."""
+    logs = []
+    for name in os.listdir(directory):
+        match = LOG_PATTERN.match(name)
+        if match:
+            logs.append((int(match.group(1)), os.path.join(directory, name)))
+    return [path for _, path in sorted(logs)]
+
+
+def parse_log(data):
+    """
+    Split a log file's bytes into the lines holding a complete payload (lines
+    cut off by a power loss, or otherwise malformed, are skipped). Returns
+    (values array with one row per line, the lines' value tokens, skipped count).
+    """
+    count = SCHEMA.payload_count
+    lines = [line.split() for line in data.splitlines()]
+    good = [parts for parts in lines if len(parts) == count]
+    try:
+        values = np.array(good, dtype=np.float64).reshape(len(good), count)
+    except ValueError:
+        # A non-numeric token somewhere: check the lines one by one
+        valid = []
+        for parts in good:
+            try:
+                [float(p) for p in parts]
+                valid.append(parts)
+            except ValueError:
+                pass
+        good = valid
+        values = np.array(good, dtype=np.float64).reshape(len(good), count)
+    skipped = sum(1 for parts in lines if parts) - len(good)
+    if SCHEMA.payload_scaled:
+        values *= np.array(SCHEMA.payload_scales)
+    return values, good, skipped
+
+
+def local_timestamps(timestamps):
+    """ISO local-time strings (to the second) for an array of epoch seconds, as the app writes them."""
+    if not len(timestamps):
+        return []
+    offset = datetime.datetime.fromtimestamp(timestamps[0]).astimezone().utcoffset()
+    seconds = np.floor(timestamps + offset.total_seconds()).astype(np.int64).astype("datetime64[s]")
+    return np.datetime_as_string(seconds).tolist()
+
+
+def count_lines(path):
+    with open(path, "rb") as f:
+        return sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+
+
+def import_file(path, out_path, start=None, interval=SEND_INTERVAL, db=False):
+    """Import one log file (runs in a worker process). Returns a summary dict."""
+    derived_start = len(SCHEMA.keys) - len(SCHEMA.derived_keys)
+    if SCHEMA.keys[:SCHEMA.payload_count] != SCHEMA.payload_keys or SCHEMA.keys[derived_start:] != SCHEMA.derived_keys:
+        raise ValueError("sd_import expects payload channels first and derived channels last in channels.json")
+    began = time.perf_counter()
+    with open(path, "rb") as f:
+        data = f.read()
+    values, tokens, skipped = parse_log(data)
+    n = len(values)
+    if start is None:
+        start = os.path.getmtime(path) - (n - 1) * interval
+    timestamps = start + interval * np.arange(n)
+
+    # Derived channels for the whole file at once
+    columns = {key: values[:, i] for i, key in enumerate(SCHEMA.payload_keys)}
+    DerivedMetricsEngine().update_batch(columns, timestamps)
+
+    # CSV rows in schema order: the payload as written on the card (unless it
+    # needs scaling), receiver/link channels blank, derived channels formatted
+    if SCHEMA.payload_scaled:
+        payloads = [",".join(f"{value:g}" for value in row).encode() for row in values.tolist()]
+    else:
+        payloads = [b",".join(parts) for parts in tokens]
+    derived = np.column_stack([columns[key] for key in SCHEMA.derived_keys]).tolist() if n else []
+    blanks = b"," * (len(SCHEMA.keys) - SCHEMA.payload_count - len(SCHEMA.derived_keys))
+    lines = [b"timestamp," + ",".join(SCHEMA.keys).encode()]
+    for timestamp, payload, row in zip(local_timestamps(timestamps), payloads, derived):
+        lines.append(timestamp.encode() + b"," + payload + blanks + b","
+                     + ",".join(f"{value:.6g}" for value in row).encode())
+    with open(out_path, "wb") as f:
+        f.write(b"\n".join(lines) + b"\n")
+
+    inserted = 0
+    if db and n:
+        from network import bulk_insert_into_db
+        full = np.zeros((n, len(SCHEMA.keys)))
+        for key, column in columns.items():
+            full[:, SCHEMA.index[key]] = column
+        inserted = bulk_insert_into_db(full.tolist(), timestamps.tolist(), DB_BATCH_SIZE)
+
+    return {
+        "path": path,
+        "rows": n,
+        "skipped": skipped,
+        "bytes": len(data),
+        "start": float(timestamps[0]) if n else start,
+        "end": float(timestamps[-1]) if n else start,
+        "inserted": inserted,
+        "seconds": time.perf_counter() - began,
+    }
+
+
+def import_directory(directory, out_dir, workers=None, start=None, gap=60.0, interval=SEND_INTERVAL, db=False):
+    """Import every log file in `directory` into `out_dir` using `workers` processes. Returns the file summaries."""
+    paths = find_log_files(directory)
+    os.makedirs(out_dir, exist_ok=True)
+    starts = [None] * len(paths)
+    if start is not None:
+        # Lay the files end to end; needs each file's length up front
+        t = start
+        for i, path in enumerate(paths):
+            starts[i] = t
+            t += count_lines(path) * interval + gap
+    out_paths = [os.path.join(out_dir, os.path.splitext(os.path.basename(path))[0] + ".csv") for path in paths]
+
+    if workers == 1:
+        return [import_file(p, o, s, interval, db) for p, o, s in zip(paths, out_paths, starts)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [pool.submit(import_file, p, o, s, interval, db) for p, o, s in zip(paths, out_paths, starts)]
+        return [future.result() for future in futures]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import SD-card telemetry logs.")
+    parser.add_argument("directory", help="folder containing log_<n>.txt files (e.g. the SD card)")
+    parser.add_argument("--out", default="imported", help="output folder for the CSV files (default: imported)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="worker processes (default: all cores)")
+    parser.add_argument("--start", help="start time of the first file (ISO format); files are laid end to end")
+    parser.add_argument("--gap", type=float, default=60.0, help="seconds between files with --start (default: 60)")
+    parser.add_argument("--interval", type=float, default=SEND_INTERVAL, help="seconds between lines (default: 1)")
+    parser.add_argument("--db", action="store_true", help="also insert the samples into the database")
+    args = parser.parse_args()
+    start = datetime.datetime.fromisoformat(args.start).timestamp() if args.start else None
+
+    began = time.perf_counter()
+    results = import_directory(args.directory, args.out, args.workers, start, args.gap, args.interval, args.db)
+    elapsed = time.perf_counter() - began
+
+    for result in results:
+        first = datetime.datetime.fromtimestamp(result["start"]).replace(microsecond=0)
+        print(f"{os.path.basename(result['path'])}: {result['rows']} rows from {first.isoformat()}"
+              + (f", {result['skipped']} bad lines skipped" if result["skipped"] else "")
+              + (f", {result['inserted']} inserted" if args.db else ""))
+    rows = sum(result["rows"] for result in results)
+    megabytes = sum(result["bytes"] for result in results) / 1e6
+    if elapsed > 0:
+        print(f"{len(results)} files, {rows} rows, {megabytes:.1f} MB in {elapsed:.2f} s with {args.workers} workers: "
+              f"{len(results) / elapsed:.1f} files/s, {rows / elapsed:.0f} rows/s, {megabytes / elapsed:.1f} MB/s")
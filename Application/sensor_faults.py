@@ -0,0 +1,218 @@
+import math
+from operator import itemgetter
+import numpy as np
+from channel_schema import SCHEMA, SOURCE_PAYLOAD, SOURCE_RECEIVER
+from history_store import MASK_BITS
+from alerts import AlertEvent
+
+##############################
+# Sensor Fault Detection
+##############################
+# Every measured channel (payload and receiver) of every sample is checked as
+# it arrives, vectorized over channels like the alert engine, with a fixed
+# handful of numbers of state per channel:
+#   missing   no value arrived (the reader passes NaN for a value that was
+#             cut off or could not be parsed)
+#   zero pad  the payload ends in a run of exact zeros where the channels had
+#             non-zero values: a short payload padded out (older logs and
+#             firmware)
+#   jump      the value moved further from the last valid one than the
+#             channel's "max_rate" (units per second, channels.json) allows
+#   outlier   the change since the last valid value is more than "z" standard
+#             deviations from what the channel usually does (EWMA mean and
+#             variance of the change, after a warm-up)
+#   stuck     the value has not changed at all for the channel's "stuck"
+#             seconds
+# A flagged value is replaced by the channel's last valid value, so derived
+# channels, laps and alerts never see it, and its bit is set in the sample's
+# validity mask: graphs draw a gap there, statistics skip it and it is sent
+# to the database as NULL.
+#
+# A jump, outlier or zero run that persists for ACCEPT_AFTER samples is a new
+# level rather than a fault: it is accepted and the channel re-learns its
+# noise. A fault lasting EVENT_AFTER samples is reported like an alert, and
+# cleared when the channel is valid again.
+
+KINDS = ["missing", "zero pad", "jump", "outlier", "stuck"]  # in order of precedence
+MISSING, ZERO_PAD, JUMP, OUTLIER, STUCK = range(len(KINDS))
+
+DEFAULT_Z = 8.0           # outlier limit in standard deviations of the change (0 disables)
+ALPHA = 0.05              # EWMA weight of each new change
+WARMUP = 30               # valid samples before outliers are judged
+NOISE_FLOOR = 0.002       # minimum standard deviation of the change, as a fraction of max_expected
+ZERO_RUN = 2              # trailing payload zeros that count as padding
+ACCEPT_AFTER = 3          # consecutive suspect samples accepted as a new level
+STUCK_MIN_SAMPLES = 10    # identical samples needed (as well as the time) before a channel is stuck
+EVENT_AFTER = 3           # consecutive invalid samples before a fault is reported
+MIN_INTERVAL = 0.1        # s, lower bound of the time between samples used for max_rate
+
+
+class FaultDetector:
+    """Flags implausible values of the measured channels, one sample at a time."""
+
+    def __init__(self, keys=SCHEMA.keys, channels=SCHEMA.by_key):
+        self.keys = list(keys)
+        measured = [i for i, key in enumerate(self.keys)
+                    if channels[key].source in (SOURCE_PAYLOAD, SOURCE_RECEIVER)]
+        if any(i >= MASK_BITS for i in measured):
+            print(f"[DEBUG] Only the first {MASK_BITS} channels can be flagged; the rest are not checked.")
+            measured = [i for i in measured if i < MASK_BITS]
+        self.index = measured
+        self.measured_keys = [self.keys[i] for i in measured]
+        self.names = [channels[key].display_name for key in self.measured_keys]
+        self.read = itemgetter(*measured)  # the measured values of a row, as a tuple
+        self.bits = [1 << i for i in measured]
+        # Positions (in the measured channels) of the payload, in payload order, for padding runs
+        self.payload = np.array([j for j, i in enumerate(measured) if channels[self.keys[i]].source == SOURCE_PAYLOAD],
+                                dtype=np.intp)
+
+        infos = [channels[key] for key in self.measured_keys]
+        faults = [info.faults or {} for info in infos]
+        self.max_rate = np.array([f.get("max_rate", math.inf) for f in faults], dtype=float)
+        self.stuck_seconds = np.array([f.get("stuck", math.inf) for f in faults], dtype=float)
+        # Outliers are meaningless for counts and IDs, so integer channels are only checked if asked to
+        z_limit = np.array([f.get("z", DEFAULT_Z if info.type == "float" else 0.0)
+                            for f, info in zip(faults, infos)], dtype=float)
+        self.z_sq = np.where(z_limit > 0, z_limit * z_limit, np.inf)
+        floor = np.maximum(np.array([10.0 ** -info.decimals for info in infos]),
+                           NOISE_FLOOR * np.array([info.max_expected for info in infos]))
+        self.floor_sq = floor * floor
+        self.reset()
+
+    def reset(self):
+        n = len(self.index)
+        self.last = np.full(n, np.nan)     # last valid value
+        self.last_time = np.zeros(n)
+        self.valid_count = np.zeros(n, dtype=np.int64)  # since the start or the last accepted level change
+        self.change_mean = np.zeros(n)
+        self.change_var = np.zeros(n)
+        self.suspect_run = np.zeros(n, dtype=np.int64)
+        self.same_value = np.full(n, np.nan)
+        self.same_since = np.zeros(n)
+        self.same_count = np.zeros(n, dtype=np.int64)
+        self.invalid_run = np.zeros(n, dtype=np.int64)
+        self.kind = np.full(n, -1, dtype=np.int64)      # kind of each channel's latest fault
+        self.reported = np.full(n, -1, dtype=np.int64)  # kind of the fault reported per channel, -1 for none
+        self.suspecting = False  # any suspect run in progress
+        self.warming = True      # any channel without a valid value yet
+        self.reporting = False   # any fault reported and not yet cleared
+        self.counts = np.zeros((len(KINDS), n), dtype=np.int64)  # flagged values per kind and channel
+        self.checked = 0
+
+    def check(self, sample, timestamp):
+        """
+        Check one Sample in place: set its `invalid` mask, replace flagged
+        values with the last valid ones, and return the fault AlertEvents
+        (raised or cleared) it caused.
+        """
+        row = sample.row
+        x = np.array(self.read(row), dtype=float)
+        missing = np.isnan(x)
+        # NaN compares false, so a missing value (or one without a valid value before it) is neither jump nor outlier
+        change = x - self.last
+        deviation = change - self.change_mean
+        with np.errstate(invalid="ignore"):
+            jump = np.abs(change) > self.max_rate * np.maximum(timestamp - self.last_time, MIN_INTERVAL)
+            outlier = deviation * deviation > self.z_sq * (self.change_var + self.floor_sq)
+        outlier &= self.valid_count >= WARMUP
+        suspect = jump | outlier
+        padded = None
+        if self.payload.size and not x[self.payload[-ZERO_RUN:]].any():
+            padded = np.zeros(len(x), dtype=bool)
+            tail = x[self.payload] == 0.0
+            nonzero = np.flatnonzero(~tail)
+            padded[self.payload[nonzero[-1] + 1 if nonzero.size else 0:]] = True
+            padded &= (self.last != 0.0) & ~np.isnan(self.last)
+            suspect |= padded
+
+        accepted = None
+        if suspect.any():
+            self.suspect_run += suspect
+            self.suspect_run[~suspect] = 0
+            accepted = self.suspect_run >= ACCEPT_AFTER
+            if accepted.any():
+                suspect &= ~accepted
+                self.suspect_run[accepted] = 0
+            else:
+                accepted = None
+            self.suspecting = True
+        elif self.suspecting:
+            self.suspect_run[:] = 0
+            self.suspecting = False
+
+        changed = x != self.same_value  # NaN counts as a change
+        self.same_value[changed] = x[changed]
+        self.same_since[changed] = timestamp
+        self.same_count += 1
+        self.same_count[changed] = 1
+        stuck = (self.same_count >= STUCK_MIN_SAMPLES) & (timestamp - self.same_since >= self.stuck_seconds)
+
+        invalid = missing | suspect | stuck
+        any_invalid = invalid.any()
+        # Learn from the valid values: EWMA of the change, where there was a previous value
+        if any_invalid or accepted is not None or self.warming:
+            learn = ~invalid & ~np.isnan(change)
+            if accepted is not None:
+                learn &= ~accepted
+                self.valid_count[accepted] = 0
+            deviation[~learn] = 0.0
+            self.change_mean += ALPHA * deviation
+            np.copyto(self.change_var, (1.0 - ALPHA) * (self.change_var + ALPHA * deviation * deviation), where=learn)
+            self.warming = np.isnan(self.last).any()
+        else:
+            self.change_mean += ALPHA * deviation
+            self.change_var += ALPHA * deviation * deviation
+            self.change_var *= 1.0 - ALPHA
+        if any_invalid:
+            valid = ~invalid
+            self.valid_count += valid
+            np.copyto(self.last, x, where=valid)
+            self.last_time[valid] = timestamp
+            self.invalid_run += invalid
+            self.invalid_run[valid] = 0
+        else:
+            self.valid_count += 1
+            self.last = x
+            self.last_time[:] = timestamp
+            if self.invalid_run.any():
+                self.invalid_run[:] = 0
+        self.checked += 1
+
+        mask = 0
+        if any_invalid:
+            kinds = [(missing, MISSING), (padded, ZERO_PAD), (stuck, STUCK), (jump, JUMP), (outlier, OUTLIER)]
+            for j in np.flatnonzero(invalid).tolist():
+                held = self.last[j]
+                row[self.index[j]] = 0.0 if held != held else float(held)
+                mask |= self.bits[j]
+                kind = next(kind for flags, kind in kinds if flags is not None and flags[j])
+                self.kind[j] = kind
+                self.counts[kind, j] += 1
+        sample.invalid = mask
+        return self._events(x, timestamp) if any_invalid or self.reporting else []
+
+    def _events(self, x, timestamp):
+        events = []
+        raised = np.flatnonzero((self.reported < 0) & (self.invalid_run >= EVENT_AFTER))
+        cleared = np.flatnonzero((self.reported >= 0) & (self.invalid_run == 0))
+        kind = self.kind
+        for j in raised.tolist():
+            self.reported[j] = kind[j]
+            name = self.names[j]
+            value = float(x[j])
+            detail = "no value" if kind[j] == MISSING else f"{value:g}"
+            events.append(AlertEvent(timestamp, f"sensor {KINDS[kind[j]]}", self.measured_keys[j],
+                                     0.0 if math.isnan(value) else value, "raised", "warning",
+                                     f"⚠️ {name} sensor fault ({KINDS[kind[j]]}): {detail}"))
+        for j in cleared.tolist():
+            name = self.names[j]
+            events.append(AlertEvent(timestamp, f"sensor {KINDS[self.reported[j]]}", self.measured_keys[j],
+                                     float(x[j]), "cleared", "warning", f"✔ {name} sensor fault cleared: {x[j]:.2f}"))
+            self.reported[j] = -1
+        self.reporting = (self.reported >= 0).any()
+        return events
+
+    def summary(self):
+        """Flagged value counts as {channel: {kind: count}}, for channels with any."""
+        return {key: {KINDS[k]: int(self.counts[k, j]) for k in range(len(KINDS)) if self.counts[k, j]}
+                for j, key in enumerate(self.measured_keys) if self.counts[:, j].any()}
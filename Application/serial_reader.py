@@ -2,19 +2,51 @@ import serial
 import threading
 import serial.tools.list_ports
 import re
+import time
 from PyQt5.QtCore import pyqtSignal, QObject
 from base_serial_reader import BaseSerialReader
+from channel_schema import SCHEMA
+from lora_link import packet_rate
+from rate_controller import RateController, format_command
+from sample_batch import SampleBatch, SampleBatcher
+
+# Seconds to wait for a packet's RSSI/SNR lines before storing it without them
+PACKET_TIMEOUT = 0.5
+# Reopening a lost port: first retry after RECONNECT_DELAY, doubling up to RECONNECT_MAX_DELAY
+RECONNECT_DELAY = 0.5
+RECONNECT_MAX_DELAY = 10.0
+# A payload value float() accepts (the payload is already limited to digits, minus, dot and spaces)
+NUMBER = re.compile(r'-?(\d+\.?\d*|\.\d+)')
 
 class SerialReader(QObject, BaseSerialReader):
-    dataReceived = pyqtSignal()
+    samplesReceived = pyqtSignal(SampleBatch)  # new samples, oldest first
+    alertRaised = pyqtSignal(object)  # AlertEvent, raised or cleared
+    connectionChanged = pyqtSignal(bool)  # port lost (False) or reopened (True) while running
 
     def __init__(self):
         QObject.__init__(self)
         BaseSerialReader.__init__(self)
         self.ser = None
         self.thread = None
+        # Reconnect state: the history, statistics and logs carry on across reconnects
+        self.port_lost = False         # set when the port monitor no longer sees the port
+        self.wake = threading.Event()  # cuts a reconnect wait short (port back, or stopping)
+        self.reconnects = 0
+        self.downtime = 0.0            # s without the port, over the session
+        # Closed-loop SF/BW control; off until enabled, as it needs the sender
+        # firmware to accept PARAM downlinks.
+        self.rate_controller = RateController()
+        self.rate_controller.enabled = False
+        # New samples go to the GUI in batches (one queued event per burst)
+        self.batcher = SampleBatcher(self.samplesReceived.emit)
+
+    def on_alert(self, event):
+        self.alertRaised.emit(event)
 
     def start(self):
+        # Switching ports: stop reading the old one first
+        if self.running:
+            self.stop()
         # Auto-select the only available COM port if none explicitly chosen
         if not self.selected_port:
             ports = [p.device for p in serial.tools.list_ports.comports()]
@@ -25,7 +57,7 @@ class SerialReader(QObject, BaseSerialReader):
                 print("[DEBUG] No COM port selected or multiple ports available, please select one.")
                 return
         try:
-            self.ser = serial.Serial(self.selected_port, 9600)
+            self.open_port()
             self.running = True
             self.thread = threading.Thread(target=self.read_serial_data, daemon=True)
             self.thread.start()
@@ -35,81 +67,168 @@ class SerialReader(QObject, BaseSerialReader):
 
     def stop(self):
         self.running = False
+        self.wake.set()
         if self.thread:
             self.thread.join()
-        if self.ser and self.ser.is_open:
-            self.ser.close()
+        self.close_port()
         print("[DEBUG] Serial reader stopped.")
 
+    def open_port(self):
+        self.ser = serial.Serial(self.selected_port, 9600)
+        self.port_lost = False
+
+    def close_port(self):
+        if self.ser and self.ser.is_open:
+            try:
+                self.ser.close()
+            except (serial.SerialException, OSError):
+                pass
+
+    def on_ports_changed(self, ports):
+        """Called with the ports present whenever the port monitor sees a change."""
+        if self.selected_port in ports:
+            self.wake.set()  # reconnect now rather than after the backoff
+        elif self.running:
+            self.port_lost = True
+
     def read_serial_data(self):
         print("[DEBUG] Serial reading thread running.")
+        # The receiver prints one packet over several lines: the payload, then
+        # "RSSI: x", "SNR: x" and finally "Kalman RSSI: x". The packet is stored
+        # once its last line arrives (or the next payload starts, or the line
+        # stays quiet), stamped with the time its payload arrived.
+        self.pending = None
+        self.pending_time = 0.0
         while self.running:
-            if self.ser and self.ser.in_waiting > 0:
-                line = self.ser.readline().decode('utf-8', errors='ignore').strip()
-                print(f"[DEBUG] Raw line read: '{line}'")
-
-                # Determine payload: check for 'LoRa data:' or quoted payload
-                if 'LoRa data:' in line:
-                    data_string = line.split('LoRa data:')[1].strip()
-                else:
-                    start = line.find("'")
-                    end = line.find("'", start + 1)
-                    if start == -1 or end == -1:
-                        print(f"[DEBUG] No payload marker found in line: {line}")
-                        continue
-                    data_string = line[start+1:end]
-
-                # Allow only digits, minus, dot and spaces
-                if not re.fullmatch(r'[-0-9. ]+', data_string):
-                    print(f"[DEBUG] Invalid characters in payload, skipping: {data_string}")
-                    continue
-
-                parts = data_string.split()
-                # Truncate or pad to exactly 20 items
-                if len(parts) > 20:
-                    parts = parts[:20]
-                elif len(parts) < 20:
-                    parts += ['0.0'] * (20 - len(parts))
-
-                # Convert to floats
-                try:
-                    values = [float(p) for p in parts]
-                except ValueError as e:
-                    print(f"[DEBUG] Conversion error: {e}, using zeros")
-                    values = [0.0] * 20
-
-                # Unpack values into attributes
-                (
-                    self.velocity,
-                    self.distance_travelled,
-                    self.battery_volt,
-                    self.battery_current,
-                    self.battery_cell_LOW_volt,
-                    self.battery_cell_HIGH_volt,
-                    self.battery_cell_AVG_volt,
-                    self.battery_cell_LOW_temp,
-                    self.battery_cell_HIGH_temp,
-                    self.battery_cell_AVG_temp,
-                    self.battery_cell_ID_HIGH_temp,
-                    self.battery_cell_ID_LOW_temp,
-                    self.BMS_temp,
-                    self.motor_current,
-                    self.motor_temp,
-                    self.motor_controller_temp,
-                    self.MPPT1_watt,
-                    self.MPPT2_watt,
-                    self.MPPT3_watt,
-                    self.MPPT_total_watt
-                ) = values
-
-                # Update latest values
-                for var in self.available_data:
-                    self.latest_values[var] = getattr(self, var)
-
-                # Update history
-                for key in self.available_data:
-                    self.history[key].pop(0)
-                    self.history[key].append(getattr(self, key))
-
-                # Emit signal
-                self.dataReceived.emit()
\ No newline at end of file
+            try:
+                self.poll_serial()
+            except (serial.SerialException, OSError) as e:
+                # The receiver was unplugged or glitched: keep everything and reopen the port
+                self.reconnect(e)
+        self.batcher.flush()
+
+    def poll_serial(self):
+        """Handle one line from the receiver, or wait a moment if there is none."""
+        if self.port_lost:
+            raise serial.SerialException(f"{self.selected_port} removed")
+        if self.ser and self.ser.in_waiting > 0:
+            line = self.ser.readline().decode('utf-8', errors='ignore').strip()
+            print(f"[DEBUG] Raw line read: '{line}'")
+
+            if line.startswith('Kalman RSSI:'):
+                self.commit_pending()
+                return
+            if line.startswith('RSSI:') or line.startswith('SNR:'):
+                key, _, value = line.partition(':')
+                if self.pending is not None:
+                    try:
+                        self.pending[key.lower()] = float(value)
+                    except ValueError:
+                        print(f"[DEBUG] Invalid {key} value: {value}")
+                return
+            if line == 'Message received!':
+                return
+
+            # Determine payload: check for 'LoRa data:' or quoted payload
+            if 'LoRa data:' in line:
+                data_string = line.split('LoRa data:')[1].strip()
+            else:
+                start = line.find("'")
+                end = line.find("'", start + 1)
+                if start == -1 or end == -1:
+                    print(f"[DEBUG] No payload marker found in line: {line}")
+                    return
+                data_string = line[start+1:end]
+
+            # Allow only digits, minus, dot and spaces
+            if not re.fullmatch(r'[-0-9. ]+', data_string):
+                print(f"[DEBUG] Invalid characters in payload, skipping: {data_string}")
+                return
+
+            parts = data_string.split()
+            # Truncate or pad to exactly the number of payload channels. Values
+            # cut off are NaN, which the fault detector flags as missing.
+            count = SCHEMA.payload_count
+            if len(parts) > count:
+                parts = parts[:count]
+            elif len(parts) < count:
+                parts += ['nan'] * (count - len(parts))
+
+            # Convert to floats
+            try:
+                values = SCHEMA.parse_payload(parts)
+            except ValueError as e:
+                # Only the values that do not parse (e.g. "1.2.3") are missing, not the whole packet
+                print(f"[DEBUG] Conversion error: {e}, marking those values missing")
+                values = SCHEMA.parse_payload([part if NUMBER.fullmatch(part) else 'nan' for part in parts])
+
+            # A new payload ends the previous packet, even if its RSSI lines went missing
+            self.commit_pending()
+            self.pending = dict(zip(SCHEMA.payload_keys, values))
+            self.pending_time = time.time()
+        else:
+            now = time.time()
+            if self.pending is not None and now - self.pending_time > PACKET_TIMEOUT:
+                self.commit_pending()
+            else:
+                # Lets a change that silenced the link be reverted
+                self.adapt_data_rate(now)
+            self.batcher.poll(now)
+            time.sleep(0.01)
+
+    def reconnect(self, error):
+        """Reopen the lost port, retrying with exponential backoff until it opens or the reader stops."""
+        print(f"[DEBUG] Lost serial port {self.selected_port}: {error}")
+        self.commit_pending()
+        self.batcher.flush()
+        self.close_port()
+        lost_at = time.time()
+        self.connectionChanged.emit(False)
+        delay = RECONNECT_DELAY
+        while self.running:
+            self.wake.wait(delay)
+            self.wake.clear()
+            if not self.running:
+                return
+            try:
+                self.open_port()
+            except (serial.SerialException, OSError) as e:
+                print(f"[DEBUG] Reconnect to {self.selected_port} failed, retrying in {delay:.1f} s: {e}")
+                delay = min(delay * 2, RECONNECT_MAX_DELAY)
+                continue
+            self.reconnects += 1
+            self.downtime += time.time() - lost_at
+            print(f"[DEBUG] Reconnected to {self.selected_port} after {time.time() - lost_at:.1f} s.")
+            self.connectionChanged.emit(True)
+            return
+
+    def commit_pending(self):
+        """Store the packet being assembled, if any, and queue it for the GUI."""
+        if self.pending is None:
+            return
+        values, self.pending = self.pending, None
+        # Update latest values, link statistics, derived channels and history
+        self.store_sample(values, self.pending_time)
+        latest = self.latest_values
+        self.batcher.add(latest)
+        self.rate_controller.on_packet(self.pending_time, latest["rssi"], latest["snr"])
+        # Right after a packet the sender is listening, so this is the time for a downlink
+        self.adapt_data_rate(time.time())
+
+    def adapt_data_rate(self, now):
+        """Let the rate controller decide, and send its new SF/BW to the receiver."""
+        setting = self.rate_controller.poll(now)
+        if setting is None:
+            return
+        if self.send_command(format_command(setting)):
+            self.link.expected_interval = 1.0 / packet_rate(*setting)
+
+    def send_command(self, command):
+        """Write one command line to the receiver. Returns True if it was written."""
+        try:
+            self.ser.write((command + "\n").encode("ascii"))
+            print(f"[DEBUG] Sent command: {command}")
+            return True
+        except (serial.SerialException, AttributeError) as e:
+            print(f"[DEBUG] Failed to send command {command}: {e}")
+            return False
@@ -0,0 +1,325 @@
+"""
+Compact binary encoding of telemetry samples, for log segments and streams.
+
+Usage (from the Application folder):
+    python telemetry_codec.py pack can_data_log.csv             # writes can_data_log.htl
+    python telemetry_codec.py unpack can_data_log.htl out.csv
+"""
+import argparse
+import datetime
+import json
+import os
+import struct
+import numpy as np
+from channel_schema import SCHEMA
+
+##############################
+# Telemetry Codec
+##############################
+# The firmware sends and logs every channel at a fixed number of decimals, so
+# a channel is really a series of integers. Each block of samples is stored
+# as, per channel: the values scaled to integers, then their first difference
+# (slowly changing channels) or second difference (steadily rising ones, like
+# distance and timestamps), whichever packs smaller, zigzag-mapped and
+# bit-packed at the width of the largest residual in the block. Blocks are
+# independent, so a stream can start at any block and a spike only widens the
+# block it is in.
+#
+# Missing values (NaN) are recorded in a bitmap and decode as NaN again; every
+# other value decodes to exactly what it was at its declared precision.
+#
+# A log file or stream is a header (the channel keys and decimals) followed by
+# length-prefixed blocks.
+#
+# Against zlib on the CSV text: on a session whose channels move (random walks
+# at the declared precision, `benchmarks.py codec`), the codec packs 6.3x to
+# zlib's 2.8x and encodes about 20 times faster, because it stores residuals
+# of a few bits instead of matching digit strings. zlib wins only where there
+# is nothing to encode: the shipped can_data_log.csv is a bench recording in
+# which every channel reads 0.0, and zlib packs it 32.9x to the codec's 27.9x,
+# as each block still carries a fixed 19-byte header per channel. The codec
+# also keeps what zlib does not give: blocks that decode on their own, so a
+# stream can join mid-session, and exact values at the declared precision.
+
+MAGIC = b"HUSTLOG1"
+BLOCK_ROWS = 4096
+TIME_DECIMALS = 3     # timestamps are kept to the millisecond
+DEFAULT_DECIMALS = 2  # for columns not in the schema
+
+_HEADER_SIZE = struct.Struct("<I")
+_BLOCK = struct.Struct("<IH")        # rows, channels
+_SERIES = struct.Struct("<BBBqq")    # order, width, flags, first value, first difference
+_FRAME = struct.Struct("<I")         # block length
+_HAS_MISSING = 1
+
+
+def declared_decimals(key):
+    channel = SCHEMA.by_key.get(key)
+    return channel.decimals if channel else DEFAULT_DECIMALS
+
+
+def _zigzag(values):
+    return ((values << 1) ^ (values >> 63)).view(np.uint64)
+
+
+def _unzigzag(values):
+    return (values >> np.uint64(1)).view(np.int64) ^ -(values & np.uint64(1)).view(np.int64)
+
+
+def _pack_bits(values, width):
+    if not width or not len(values):
+        return b""
+    bits = ((values[:, None] >> np.arange(width, dtype=np.uint64)) & np.uint64(1)).astype(np.uint8)
+    return np.packbits(bits, axis=None, bitorder="little").tobytes()
+
+
+def _unpack_bits(data, count, width):
+    if not width or not count:
+        return np.zeros(count, dtype=np.uint64)
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=count * width, bitorder="little")
+    bits = bits.reshape(count, width).astype(np.uint64)
+    return (bits << np.arange(width, dtype=np.uint64)).sum(axis=1, dtype=np.uint64)
+
+
+def _width(residuals):
+    return int(residuals.max()).bit_length() if len(residuals) else 0
+
+
+def encode_series(values, missing=None):
+    """Encode one integer series (int64), with an optional mask of missing entries."""
+    flags = 0
+    bitmap = b""
+    if missing is not None and missing.any():
+        flags |= _HAS_MISSING
+        bitmap = np.packbits(missing, bitorder="little").tobytes()
+    first = int(values[0]) if len(values) else 0
+    deltas = np.diff(values)
+    first_delta = int(deltas[0]) if len(deltas) else 0
+    # Residuals after the first value and first difference, either way the same count
+    first_order = _zigzag(deltas[1:])
+    second_order = _zigzag(np.diff(deltas))
+    order, residuals = 1, first_order
+    if _width(second_order) < _width(first_order):
+        order, residuals = 2, second_order
+    width = _width(residuals)
+    return _SERIES.pack(order, width, flags, first, first_delta) + _pack_bits(residuals, width) + bitmap
+
+
+def decode_series(data, offset, count):
+    """Decode one series at `offset`; returns (int64 values, missing mask or None, offset after it)."""
+    order, width, flags, first, first_delta = _SERIES.unpack_from(data, offset)
+    offset += _SERIES.size
+    residual_count = max(count - 2, 0)
+    size = (residual_count * width + 7) // 8
+    residuals = _unzigzag(_unpack_bits(data[offset:offset + size], residual_count, width))
+    offset += size
+    deltas = np.empty(max(count - 1, 0), dtype=np.int64)
+    if len(deltas):
+        deltas[0] = first_delta
+        if order == 1:
+            deltas[1:] = residuals
+        else:
+            deltas[1:] = first_delta + np.cumsum(residuals)
+    values = np.empty(count, dtype=np.int64)
+    if count:
+        values[0] = first
+        values[1:] = first + np.cumsum(deltas)
+    missing = None
+    if flags & _HAS_MISSING:
+        size = (count + 7) // 8
+        missing = np.unpackbits(np.frombuffer(data[offset:offset + size], dtype=np.uint8),
+                                count=count, bitorder="little").astype(bool)
+        offset += size
+    return values, missing, offset
+
+
+class Codec:
+    """Encodes blocks of samples for a fixed list of channels, each at its declared number of decimals."""
+
+    def __init__(self, keys, decimals=None):
+        self.keys = list(keys)
+        self.decimals = list(decimals) if decimals is not None else [declared_decimals(key) for key in self.keys]
+        self.scales = 10.0 ** np.array(self.decimals, dtype=np.float64)
+
+    def header(self):
+        """Bytes that start a log file or stream: the channel keys and their decimals."""
+        header = json.dumps({"keys": self.keys, "decimals": self.decimals}).encode()
+        return MAGIC + _HEADER_SIZE.pack(len(header)) + header
+
+    @classmethod
+    def read_header(cls, f):
+        """Read a header from a binary file object and return the Codec it describes."""
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError("not a telemetry log")
+        size, = _HEADER_SIZE.unpack(f.read(_HEADER_SIZE.size))
+        header = json.loads(f.read(size))
+        return cls(header["keys"], header["decimals"])
+
+    def encode_block(self, timestamps, rows):
+        """Encode epoch timestamps and rows (one column per key; NaN for missing) into one block."""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, len(self.keys))
+        count = len(rows)
+        parts = [_BLOCK.pack(count, len(self.keys)),
+                 encode_series(np.rint(np.asarray(timestamps, dtype=np.float64) * 10.0 ** TIME_DECIMALS).astype(np.int64))]
+        scaled = rows * self.scales
+        missing = ~np.isfinite(scaled)
+        if missing.any():
+            # Repeat the last value over gaps, so they cost nothing in the differences
+            index = np.where(missing, 0, np.arange(count)[:, None])
+            np.maximum.accumulate(index, axis=0, out=index)
+            scaled = np.take_along_axis(scaled, index, axis=0)
+            scaled[~np.isfinite(scaled)] = 0.0
+        columns = np.ascontiguousarray(np.rint(scaled).astype(np.int64).T)
+        column_missing = missing.any(axis=0)
+        for column in range(len(self.keys)):
+            parts.append(encode_series(columns[column], missing[:, column] if column_missing[column] else None))
+        return b"".join(parts)
+
+    def decode_block(self, data):
+        """Decode a block into (timestamps, rows)."""
+        count, channels = _BLOCK.unpack_from(data, 0)
+        if channels != len(self.keys):
+            raise ValueError(f"block has {channels} channels, expected {len(self.keys)}")
+        times, _, offset = decode_series(data, _BLOCK.size, count)
+        rows = np.empty((count, channels), dtype=np.float64)
+        for column in range(channels):
+            values, missing, offset = decode_series(data, offset, count)
+            rows[:, column] = values / self.scales[column]
+            if missing is not None:
+                rows[missing, column] = np.nan
+        return times / 10.0 ** TIME_DECIMALS, rows
+
+
+def write_frame(f, block):
+    f.write(_FRAME.pack(len(block)))
+    f.write(block)
+
+
+def read_frames(f):
+    """The blocks of a log file or stream, after its header."""
+    while True:
+        prefix = f.read(_FRAME.size)
+        if len(prefix) < _FRAME.size:
+            return
+        size, = _FRAME.unpack(prefix)
+        block = f.read(size)
+        if len(block) < size:
+            return  # cut off mid-block (e.g. the writer was killed)
+        yield block
+
+
+class LogWriter:
+    """Appends samples to a compressed log file, one block per BLOCK_ROWS samples."""
+
+    def __init__(self, path, codec, block_rows=BLOCK_ROWS):
+        self.codec = codec
+        self.block_rows = block_rows
+        self.timestamps = []
+        self.rows = []
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, "ab")
+        if new:
+            self.file.write(codec.header())
+
+    def append(self, timestamp, row):
+        self.timestamps.append(timestamp)
+        self.rows.append(row)
+        if len(self.rows) >= self.block_rows:
+            self.flush()
+
+    def write(self, timestamps, rows):
+        if self.rows:
+            self.flush()
+        for start in range(0, len(rows), self.block_rows):
+            write_frame(self.file, self.codec.encode_block(timestamps[start:start + self.block_rows],
+                                                           rows[start:start + self.block_rows]))
+
+    def flush(self):
+        if self.rows:
+            write_frame(self.file, self.codec.encode_block(self.timestamps, self.rows))
+            self.timestamps, self.rows = [], []
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def read_log(path):
+    """Read a whole compressed log; returns (codec, timestamps, rows)."""
+    with open(path, "rb") as f:
+        codec = Codec.read_header(f)
+        blocks = [codec.decode_block(block) for block in read_frames(f)]
+    if not blocks:
+        return codec, np.zeros(0), np.zeros((0, len(codec.keys)))
+    return codec, np.concatenate([b[0] for b in blocks]), np.concatenate([b[1] for b in blocks])
+
+
+##############################
+# CSV conversion
+##############################
+# The CSV log has local wall-clock times; .htl files hold epoch seconds, like
+# the history store and exporter.py.
+
+def local_to_epoch(wall_clock):
+    """Epoch seconds of local wall-clock times given as if they were UTC (as parse_chunk reads them)."""
+    def offset(seconds):
+        naive = datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).replace(tzinfo=None)
+        return seconds - naive.timestamp()  # naive datetimes are taken as local time
+
+    if not len(wall_clock):
+        return wall_clock
+    first, last = offset(wall_clock[0]), offset(wall_clock[-1])
+    if first == last:
+        return wall_clock - first
+    # The UTC offset changes within the log (daylight saving time)
+    return np.array([seconds - offset(seconds) for seconds in wall_clock.tolist()])
+
+
+def read_csv_log(path):
+    """An app-layout CSV log as (keys, epoch timestamps, rows)."""
+    from log_analytics import parse_chunk
+    with open(path, "rb") as f:
+        keys = f.readline().decode().strip().split(",")[1:]
+        data = f.read()
+    timestamps, rows = parse_chunk(data, len(keys))
+    return keys, local_to_epoch(timestamps), rows
+
+
+def write_csv_log(path, keys, timestamps, rows):
+    """Write epoch-stamped rows in the app's CSV layout, in local time like the application's own log."""
+    with open(path, "w", newline="") as f:
+        f.write(",".join(["timestamp"] + keys) + "\n")
+        for timestamp, row in zip(timestamps, rows):
+            time_text = datetime.datetime.fromtimestamp(timestamp).strftime("%Y-%m-%dT%H:%M:%S")
+            f.write(",".join([time_text] + ["" if np.isnan(value) else repr(float(value)) for value in row]) + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert telemetry logs between CSV and the compressed format.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack = commands.add_parser("pack", help="compress a CSV log")
+    pack.add_argument("csv")
+    pack.add_argument("out", nargs="?", help="default: the CSV path with .htl")
+    unpack = commands.add_parser("unpack", help="expand a compressed log to CSV")
+    unpack.add_argument("log")
+    unpack.add_argument("out", nargs="?", help="default: the log path with .csv")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        out = args.out or os.path.splitext(args.csv)[0] + ".htl"
+        keys, timestamps, rows = read_csv_log(args.csv)
+        writer = LogWriter(out, Codec(keys))
+        writer.write(timestamps, rows)
+        writer.close()
+        print(f"{len(rows)} samples: {os.path.getsize(args.csv)} -> {os.path.getsize(out)} bytes "
+              f"({os.path.getsize(args.csv) / max(os.path.getsize(out), 1):.1f}x)")
+    else:
+        out = args.out or os.path.splitext(args.log)[0] + ".csv"
+        codec, timestamps, rows = read_log(args.log)
+        write_csv_log(out, codec.keys, timestamps, rows)
+        print(f"{len(rows)} samples written to {out}")
+
+
+if __name__ == "__main__":
+    main()
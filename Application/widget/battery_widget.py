@@ -5,12 +5,11 @@ from PyQt5.QtCore import Qt
 class BatteryWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)
-        self.voltage = 140.0
-        self.max_voltage = 140.0  # Set the maximum voltage for the battery
+        self.level = 0.0  # State of charge, 0-1
         self.setFixedSize(70, 220)  # Set the size of the battery widget
 
-    def setVoltage(self, voltage):
-        self.voltage = voltage
+    def setLevel(self, level):
+        self.level = level
         self.update()
 
     def paintEvent(self, event):
@@ -23,14 +22,14 @@ class BatteryWidget(QWidget):
         painter.drawRect(10, 10, 50, 200)  # Battery body
         painter.drawRect(25, 2, 20, 8) # Battery cap
 
-        # Calculate the fill level based on the voltage
-        fill_level = max(0, min(1, self.voltage / self.max_voltage))
+        # Calculate the fill level based on the state of charge
+        fill_level = max(0, min(1, self.level))
         fill = int(fill_level * 200)
 
         # Draw the battery fill
-        if (self.voltage > 0.5 * self.max_voltage):
+        if (fill_level > 0.5):
             painter.setBrush(QColor(0, 255, 0))  # Green color for the fill
-        elif(self.voltage > 0.2 * self.max_voltage):
+        elif(fill_level > 0.2):
             painter.setBrush(QColor(250, 250, 0)) # Yellow when in middle  
         else: 
             painter.setBrush(QColor(250, 0, 0)) # Red color when low
@@ -53,12 +52,23 @@ class VerticalBatteryWidget(QWidget):
         layout.setAlignment(Qt.AlignBottom)
         self.setLayout(layout)
 
+        self.energy = 0.0
+        self.capacity = 1.0
+        self.range_km = 0.0
+        self.hours = 0.0
         self.updatePercentageLabel()
 
-    def setVoltage(self, voltage):
-        self.battery_widget.setVoltage(voltage)
+    def setCharge(self, energy, capacity, range_km, hours):
+        """Energy left and pack capacity (Wh), with the predicted range (km) and time (h) left."""
+        self.energy = energy
+        self.capacity = capacity
+        self.range_km = range_km
+        self.hours = hours
+        self.battery_widget.setLevel(energy / capacity)
         self.updatePercentageLabel()
 
     def updatePercentageLabel(self):
-        percentage = (self.battery_widget.voltage / self.battery_widget.max_voltage) * 100
-        self.percentage_label.setText(f"{percentage:.1f} %")
+        percentage = self.battery_widget.level * 100
+        self.percentage_label.setText(f"{percentage:.1f} %\n{self.range_km:.0f} km")
+        self.percentage_label.setToolTip(f"{self.energy:.0f} of {self.capacity:.0f} Wh left\n"
+                                         f"{self.range_km:.0f} km / {self.hours:.1f} h at the cruise speed")
@@ -0,0 +1,135 @@
+import datetime
+import os
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QGridLayout, QLabel, QPushButton, QComboBox, QDateTimeEdit, QListWidget,
+    QListWidgetItem, QProgressBar, QFileDialog
+)
+from PyQt5.QtCore import Qt, QDateTime
+from exporter import FORMATS
+
+
+class ExportDialog(QDialog):
+    """Time range, channel and format selection for an Exporter, with progress and cancel."""
+
+    def __init__(self, exporter, data_manager, channels, parent=None):
+        super().__init__(parent)
+        self.exporter = exporter
+        self.setWindowTitle("Export data")
+        self.resize(520, 560)
+        layout = QVBoxLayout(self)
+
+        range_layout = QGridLayout()
+        self.start_edit = QDateTimeEdit()
+        self.end_edit = QDateTimeEdit()
+        for row, (label, edit) in enumerate([("From:", self.start_edit), ("To:", self.end_edit)]):
+            edit.setDisplayFormat("yyyy-MM-dd HH:mm:ss")
+            edit.setCalendarPopup(True)
+            range_layout.addWidget(QLabel(label), row, 0)
+            range_layout.addWidget(edit, row, 1)
+        session_button = QPushButton("Whole session")
+        session_button.clicked.connect(self.select_session)
+        recent_button = QPushButton("Last 10 min")
+        recent_button.clicked.connect(lambda: self.select_recent(600))
+        range_layout.addWidget(session_button, 0, 2)
+        range_layout.addWidget(recent_button, 1, 2)
+        layout.addLayout(range_layout)
+
+        self.channel_list = QListWidget()
+        for key in channels:
+            item = QListWidgetItem(data_manager.get_display_name(key))
+            item.setData(Qt.UserRole, key)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked)
+            self.channel_list.addItem(item)
+        select_layout = QHBoxLayout()
+        select_layout.addWidget(QLabel("Channels:"))
+        select_layout.addStretch()
+        for text, state in [("All", Qt.Checked), ("None", Qt.Unchecked)]:
+            button = QPushButton(text)
+            button.clicked.connect(lambda _, state=state: self.check_all(state))
+            select_layout.addWidget(button)
+        layout.addLayout(select_layout)
+        layout.addWidget(self.channel_list)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Format:"))
+        self.format_dropdown = QComboBox()
+        self.format_dropdown.addItems(list(FORMATS))
+        controls.addWidget(self.format_dropdown)
+        controls.addStretch()
+        self.export_button = QPushButton("Export...")
+        self.export_button.clicked.connect(self.export)
+        self.cancel_button = QPushButton("Cancel export")
+        self.cancel_button.clicked.connect(exporter.cancel)
+        self.cancel_button.setEnabled(False)
+        controls.addWidget(self.export_button)
+        controls.addWidget(self.cancel_button)
+        layout.addLayout(controls)
+
+        self.progress_bar = QProgressBar()
+        layout.addWidget(self.progress_bar)
+        self.status_label = QLabel("")
+        self.status_label.setWordWrap(True)
+        layout.addWidget(self.status_label)
+
+        exporter.progress.connect(self.on_progress)
+        exporter.finished.connect(self.on_done)
+        exporter.failed.connect(self.on_done)
+        self.select_session()
+
+    def select_session(self):
+        snapshot = self.exporter.store.snapshot()
+        now = datetime.datetime.now().timestamp()
+        first, last = now, now
+        if snapshot.count:
+            first = snapshot.range(snapshot.first(), snapshot.first() + 1, snapshot.keys[:1])[0][0]
+            last = snapshot.timestamps(1)[0]
+        self.set_range(first, last)
+
+    def select_recent(self, seconds):
+        snapshot = self.exporter.store.snapshot()
+        last = snapshot.timestamps(1)[0] if snapshot.count else datetime.datetime.now().timestamp()
+        self.set_range(last - seconds, last)
+
+    def set_range(self, start, end):
+        # Whole seconds on screen; the end is rounded up so the newest sample is included
+        self.start_edit.setDateTime(QDateTime.fromSecsSinceEpoch(int(start)))
+        self.end_edit.setDateTime(QDateTime.fromSecsSinceEpoch(int(end) + 1))
+
+    def check_all(self, state):
+        for row in range(self.channel_list.count()):
+            self.channel_list.item(row).setCheckState(state)
+
+    def selected_keys(self):
+        items = [self.channel_list.item(row) for row in range(self.channel_list.count())]
+        return [item.data(Qt.UserRole) for item in items if item.checkState() == Qt.Checked]
+
+    def export(self):
+        keys = self.selected_keys()
+        if not keys:
+            self.status_label.setText("Select at least one channel.")
+            return
+        extension = FORMATS[self.format_dropdown.currentText()]
+        name = f"export_{datetime.datetime.now():%Y%m%d_%H%M%S}{extension}"
+        path, _ = QFileDialog.getSaveFileName(self, "Export data", name,
+                                              f"{self.format_dropdown.currentText()} (*{extension})")
+        if not path:
+            return
+        if os.path.splitext(path)[1].lower() != extension:
+            path += extension
+        start = self.start_edit.dateTime().toSecsSinceEpoch()
+        end = self.end_edit.dateTime().toSecsSinceEpoch()
+        if self.exporter.start(keys, start, end, path):
+            self.export_button.setEnabled(False)
+            self.cancel_button.setEnabled(True)
+            self.progress_bar.setValue(0)
+            self.status_label.setText(f"Exporting to {os.path.basename(path)}...")
+
+    def on_progress(self, done, total):
+        self.progress_bar.setMaximum(max(total, 1))
+        self.progress_bar.setValue(done)
+
+    def on_done(self, message):
+        self.export_button.setEnabled(True)
+        self.cancel_button.setEnabled(False)
+        self.status_label.setText(message)
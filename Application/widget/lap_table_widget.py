@@ -0,0 +1,92 @@
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QDoubleSpinBox, QTableWidget, QTableWidgetItem,
+    QHeaderView, QFileDialog
+)
+from PyQt5.QtCore import Qt, QTimer
+from lap_tracker import write_laps
+
+COLUMNS = ["Lap", "Stint", "Time", "km", "Avg km/h", "Max km/h", "Wh out", "Wh in", "Solar Wh", "Peak temp °C"]
+
+
+def format_lap_time(seconds):
+    minutes, seconds = divmod(seconds, 60)
+    return f"{int(minutes)}:{seconds:04.1f}"
+
+
+class LapTableWidget(QDialog):
+    """Per-lap table of a LapTracker, refreshed while shown, with lap length, marker and export controls."""
+
+    def __init__(self, tracker, parent=None):
+        super().__init__(parent)
+        self.tracker = tracker
+        self.setWindowTitle("Laps")
+        self.resize(760, 420)
+        layout = QVBoxLayout(self)
+
+        controls = QHBoxLayout()
+        controls.addWidget(QLabel("Lap length:"))
+        self.lap_length_box = QDoubleSpinBox()
+        self.lap_length_box.setRange(0.0, 100.0)
+        self.lap_length_box.setDecimals(3)
+        self.lap_length_box.setSuffix(" km")
+        self.lap_length_box.setSpecialValueText("markers only")
+        self.lap_length_box.setValue(tracker.lap_length)
+        self.lap_length_box.valueChanged.connect(self.set_lap_length)
+        controls.addWidget(self.lap_length_box)
+        self.mark_button = QPushButton("Mark lap (L)")
+        self.mark_button.clicked.connect(tracker.mark)
+        controls.addWidget(self.mark_button)
+        controls.addStretch()
+        self.export_button = QPushButton("Export CSV")
+        self.export_button.clicked.connect(self.export)
+        controls.addWidget(self.export_button)
+        layout.addLayout(controls)
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.verticalHeader().setVisible(False)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeToContents)
+        layout.addWidget(self.table)
+        self.stint_label = QLabel()
+        layout.addWidget(self.stint_label)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.refresh)
+        self.timer.start(1000)
+        self.refresh()
+
+    def set_lap_length(self, value):
+        self.tracker.lap_length = value
+
+    def refresh(self):
+        if not self.isVisible():
+            return
+        laps = self.tracker.laps[:]
+        current = self.tracker.current_lap()
+        rows = laps + ([current] if current is not None else [])
+        self.table.setRowCount(len(rows))
+        # Newest lap on top
+        for row, lap in enumerate(reversed(rows)):
+            peak = max(lap.peak_temps.values(), default=0.0)
+            number = str(lap.number) if lap.ended_by else f"{lap.number} (now)"
+            cells = [number, str(lap.stint), format_lap_time(lap.time), f"{lap.distance:.3f}",
+                     f"{lap.avg_speed:.1f}", f"{lap.max_speed:.1f}", f"{lap.energy_out:.1f}",
+                     f"{lap.energy_in:.1f}", f"{lap.solar:.1f}", f"{peak:.1f}"]
+            for column, text in enumerate(cells):
+                item = QTableWidgetItem(text)
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                self.table.setItem(row, column, item)
+        if laps:
+            best = min(laps, key=lambda lap: lap.time)
+            self.stint_label.setText(f"Stints: {len(self.tracker.stints) + (1 if self.tracker.stint else 0)}    "
+                                     f"Best lap: {best.number} ({format_lap_time(best.time)})")
+
+    def export(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export laps", "laps.csv", "CSV files (*.csv)")
+        if not path:
+            return
+        try:
+            write_laps(path, self.tracker.laps)
+        except OSError as e:
+            print(f"[DEBUG] Error exporting laps: {e}")
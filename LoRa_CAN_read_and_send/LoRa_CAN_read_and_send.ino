@@ -109,26 +109,27 @@ void loop() {
     }
   }
 
-  // Check for incoming parameters from receiver
-  /*
+  // Check for incoming parameters from receiver ("PARAM <sf> <sbw>", sent by the pit's data-rate controller)
   int packetSize = LoRa.parsePacket();
   if (packetSize) {
     char receivedParams[packetSize + 1];
     int index = 0;
-    while (LoRa.available()) {
+    while (LoRa.available() && index < packetSize) {
       receivedParams[index++] = (char)LoRa.read();
     }
     receivedParams[index] = '\0';
 
-    if (strncmp(receivedParams, "PARAM", 5) == 0) {
-      int sf = 0, sbw = 0;
-      sscanf(receivedParams, "PARAM %d %d", &sf, &sbw);
-
+    int newSf = 0;
+    long newSbw = 0;
+    if (sscanf(receivedParams, "PARAM %d %ld", &newSf, &newSbw) == 2
+        && newSf >= 7 && newSf <= 12 && newSbw > 0
+        && (newSf != sf || newSbw != sbw)) {
+      sf = newSf;
+      sbw = newSbw;
       LoRa.setSpreadingFactor(sf);
       LoRa.setSignalBandwidth(sbw);
 
       Serial.printf("Updated SF: %d, SBW: %ld\n", sf, sbw);
     }
   }
-  */
 }
@@ -75,4 +75,23 @@ void adjustParameters(float distance) {
     LoRa.setSpreadingFactor(sf);
     sendParameters();
   }
+}
+
+// Forward new parameters to the sender on the current ones (repeated, since a
+// lost downlink leaves the two radios on different settings), then switch.
+void applyParameters(int requestedSf, long requestedSbw) {
+  for (int i = 0; i < DOWNLINK_REPEATS; i++) {
+    LoRa.beginPacket();
+    LoRa.print("PARAM ");
+    LoRa.print(requestedSf);
+    LoRa.print(" ");
+    LoRa.print(requestedSbw);
+    LoRa.endPacket();
+    delay(20);
+  }
+  sf = requestedSf;
+  sbw = requestedSbw;
+  LoRa.setSignalBandwidth(sbw);
+  LoRa.setSpreadingFactor(sf);
+  Serial.printf("Switched to SF: %d, SBW: %ld\n", sf, sbw);
 }
\ No newline at end of file
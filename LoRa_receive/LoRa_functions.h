@@ -9,6 +9,9 @@
 #define RST 14
 #define DIO0 2
 
+// Times each parameter change is sent to the sender
+#define DOWNLINK_REPEATS 3
+
 // Variables
 extern long sbw; 
 extern int sf;
@@ -19,5 +22,6 @@ extern int newSf;
 void setupLoRa();
 void adjustParameters(float distance);
 void sendParameters();
+void applyParameters(int requestedSf, long requestedSbw);
 
 #endif
\ No newline at end of file
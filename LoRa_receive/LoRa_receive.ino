@@ -40,6 +40,16 @@ float kalmanFilter(float measurement) {
 
 void loop() {
 
+  // Data-rate commands from the Python app: "PARAM <sf> <sbw>"
+  if (Serial.available()) {
+    String command = Serial.readStringUntil('\n');
+    int requestedSf = 0;
+    long requestedSbw = 0;
+    if (sscanf(command.c_str(), "PARAM %d %ld", &requestedSf, &requestedSbw) == 2) {
+      applyParameters(requestedSf, requestedSbw);
+    }
+  }
+
   // Try to parse packet
   int packetSize = LoRa.parsePacket();
 
@@ -66,6 +76,7 @@ void loop() {
     // RSSI of packet
     packetRSSI = LoRa.packetRssi();
     Serial.printf("RSSI: %.4f\n", packetRSSI);
+    Serial.printf("SNR: %.2f\n", LoRa.packetSnr());
 
     // Apply Kalman Filter
     estimatedRSSI = kalmanFilter(packetRSSI);